@@ -0,0 +1,441 @@
+import os
+import socket
+import struct
+import subprocess
+import threading
+import time
+from typing import NamedTuple
+
+from loguru import logger
+
+from metrics import ADB_COMMAND_SECONDS
+
+# Default location of the adb server started by `adb start-server`
+ADB_SERVER_HOST = "127.0.0.1"
+ADB_SERVER_PORT = int(os.getenv("ADB_SERVER_PORT", "5037"))
+# After the server refuses a connection, go through the executable (which
+# starts the server again) for this long before retrying it, doubling up to
+# the maximum while it stays down
+ADB_SERVER_RETRY_SECONDS = 1.0
+ADB_SERVER_RETRY_MAX_SECONDS = 30.0
+
+
+class AdbError(Exception):
+    """Raised when the adb server rejects a request or the device goes away."""
+
+
+class FileStat(NamedTuple):
+    name: str
+    size: int       # bytes
+    mtime: int      # seconds since the epoch
+
+
+# One line per file: "<size> <mtime> <path>" (toybox stat, Android 6+)
+STAT_FORMAT = "%s %Y %n"
+
+
+def stat_command(folder):
+    """Device shell command printing a STAT_FORMAT line for every file in `folder`."""
+    # An empty (or missing) folder leaves the glob unexpanded; that is not an error
+    return f"stat -c '{STAT_FORMAT}' '{folder}'/* 2>/dev/null || true"
+
+
+def parse_stat_line(line):
+    """Parse one STAT_FORMAT line into a FileStat (name without its folder), or None."""
+    parts = line.rstrip("\r").split(" ", 2)
+    if len(parts) != 3 or not parts[0].isdigit() or not parts[1].isdigit():
+        return None
+    return FileStat(parts[2].rsplit("/", 1)[-1], int(parts[0]), int(parts[1]))
+
+
+class AdbClient:
+    """
+    Long-lived ADB client shared by the monitor scripts.
+
+    The device serial is resolved once and cached. It is only looked up again
+    after a command fails (device unplugged, adb server restarted, ...).
+    Shell commands and file pulls are sent straight to the running adb server
+    over its local socket, so the poll loop does not fork an `adb` process per
+    call. If the server cannot be reached the client falls back to running the
+    `adb` executable, and tries the server again after a backoff.
+
+    Parameters
+    ----------
+    adb_path : str
+        Path to the adb executable, used for `adb devices`, to start the server
+        and as a fallback transport.
+    serial : str, optional
+        Pin the client to one device. If None, the first attached device is used.
+    use_server : bool, default=True
+        Talk to the adb server socket directly instead of spawning `adb`.
+    """
+
+    def __init__(self, adb_path, serial=None, use_server=True,
+                 host=ADB_SERVER_HOST, port=ADB_SERVER_PORT):
+        self.adb_path = adb_path
+        self.pinned_serial = serial
+        self.use_server = use_server
+        self.host = host
+        self.port = port
+        self._serial = serial
+        self._lock = threading.Lock()
+        self._server_retry_at = 0.0
+        self._server_backoff = ADB_SERVER_RETRY_SECONDS
+
+    # ------------------------------------------------------------------
+    # Device discovery
+    # ------------------------------------------------------------------
+    def list_devices(self):
+        """Return the serials of all attached devices in the `device` state."""
+        output = None
+        if self._server_available():
+            try:
+                output = self._host_request("host:devices").decode(errors="replace")
+            except ConnectionRefusedError:
+                self._server_refused()
+            except (OSError, AdbError) as e:
+                logger.warning(f"adb server could not list devices, using the adb executable: {e}")
+        if output is None:
+            try:
+                result = subprocess.run([self.adb_path, "devices"], capture_output=True, text=True, check=True)
+            except (OSError, subprocess.CalledProcessError) as e:
+                logger.error(f"Failed to get device ID: {e}")
+                return []
+            # Remove the first line which is "List of devices attached"
+            output = "\n".join(result.stdout.split('\n')[1:])
+
+        devices = []
+        for line in output.split('\n'):
+            fields = line.split()
+            # Format: "RF8M12WQKYJ device" (skip "offline"/"unauthorized")
+            if len(fields) >= 2 and fields[1] == "device":
+                devices.append(fields[0])
+        return devices
+
+    def get_device_id(self, refresh=False):
+        """Return the cached device serial, resolving it on first use or when asked to refresh."""
+        with self._lock:
+            if self._serial and not refresh:
+                return self._serial
+
+            devices = self.list_devices()
+            if self.pinned_serial:
+                self._serial = self.pinned_serial if self.pinned_serial in devices else None
+            elif not devices:
+                self._serial = None
+            else:
+                if len(devices) > 1:
+                    logger.warning("Multiple devices found. Using the first one.")
+                self._serial = devices[0]
+
+            if not self._serial:
+                logger.error("No devices found")
+            return self._serial
+
+    def connect(self, address):
+        """Connect a network device ("ip" or "ip:port", port 5555 by default). Returns True on success."""
+        if ":" not in address:
+            address = f"{address}:5555"
+        output = None
+        if self._server_available():
+            try:
+                output = self._host_request(f"host:connect:{address}").decode(errors="replace")
+            except ConnectionRefusedError:
+                self._server_refused()
+            except (AdbError, OSError):
+                output = None
+        if output is None:
+            try:
+                result = subprocess.run([self.adb_path, "connect", address], capture_output=True, text=True, check=True)
+                output = result.stdout
+            except (OSError, subprocess.CalledProcessError) as e:
+                logger.error(f"Failed to connect to device: {e}")
+                return False
+
+        if "connected" in output.lower() and "cannot" not in output.lower():
+            logger.info(f"Successfully connected to device at {address}")
+            return True
+        logger.warning(f"Connection attempt to {address} failed: {output.strip()}")
+        return False
+
+    def invalidate(self):
+        """Forget the cached serial so the next command re-resolves it."""
+        with self._lock:
+            self._serial = self.pinned_serial
+
+    # ------------------------------------------------------------------
+    # Commands
+    # ------------------------------------------------------------------
+    def run(self, command):
+        """
+        Run an adb command (e.g. ["shell", "ls /sdcard"] or ["pull", src, dst])
+        against the cached device.
+
+        Returns the stripped stdout, or None if the command failed. On failure
+        the serial is re-resolved and the command is retried once.
+        """
+        for attempt in range(2):
+            device_id = self.get_device_id(refresh=attempt > 0)
+            if not device_id:
+                return None
+            try:
+                with ADB_COMMAND_SECONDS.labels(command[0] if command else "").time():
+                    return self._execute(device_id, command)
+            except (AdbError, OSError, subprocess.CalledProcessError) as e:
+                if attempt == 0:
+                    logger.warning(f"ADB command failed, refreshing device: {e}")
+                    continue
+                logger.error(f"ADB command failed: {e}")
+                if isinstance(e, subprocess.CalledProcessError):
+                    logger.error(f"Command output: {e.output}")
+                    logger.error(f"Command stderr: {e.stderr}")
+        return None
+
+    def shell(self, cmd):
+        return self.run(["shell", cmd])
+
+    def stat_files(self, folder):
+        """
+        List `folder` with sizes and modification times in one round trip.
+
+        Returns {name: FileStat}, or None if the device could not be reached.
+        Nothing is transferred besides the listing, so callers can tell
+        whether a file changed before pulling or tailing it.
+        """
+        output = self.shell(stat_command(folder))
+        if output is None:
+            return None
+        files = {}
+        for line in output.splitlines():
+            stat = parse_stat_line(line)
+            if stat is not None:
+                files[stat.name] = stat
+        return files
+
+    def pull(self, remote_path, local_path):
+        return self.run(["pull", remote_path, local_path])
+
+    def exec_out(self, cmd):
+        """
+        Run a device command and return its raw stdout as bytes (like `adb exec-out`).
+
+        Returns None if the command could not be run.
+        """
+        for attempt in range(2):
+            device_id = self.get_device_id(refresh=attempt > 0)
+            if not device_id:
+                return None
+            try:
+                with ADB_COMMAND_SECONDS.labels("exec-out").time():
+                    if self._server_available():
+                        try:
+                            return self._service(device_id, "exec:" + cmd)
+                        except ConnectionRefusedError:
+                            self._server_refused()
+                    result = subprocess.run([self.adb_path, "-s", device_id, "exec-out", cmd], capture_output=True, check=True)
+                    return result.stdout
+            except (AdbError, OSError, subprocess.CalledProcessError) as e:
+                if attempt == 0:
+                    logger.warning(f"ADB command failed, refreshing device: {e}")
+                    continue
+                logger.error(f"ADB command failed: {e}")
+        return None
+
+    def open_shell(self, cmd):
+        """
+        Start a long-running device command and return an AdbStream over its output.
+
+        Unlike shell(), the output is not collected until the command exits:
+        lines can be read as the device prints them. Returns None if the
+        command could not be started.
+        """
+        device_id = self.get_device_id()
+        if not device_id:
+            return None
+        try:
+            if self._server_available():
+                try:
+                    sock = self._open_transport(device_id)
+                except ConnectionRefusedError:
+                    self._server_refused()
+                else:
+                    try:
+                        self._send_request(sock, "shell:" + cmd)
+                    except Exception:
+                        sock.close()
+                        raise
+                    # The command may stay quiet for a long time
+                    sock.settimeout(None)
+                    return AdbStream(sock=sock)
+            process = subprocess.Popen([self.adb_path, "-s", device_id, "shell", cmd],
+                                       stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            return AdbStream(process=process)
+        except (AdbError, OSError) as e:
+            logger.error(f"Failed to start device command: {e}")
+            self.invalidate()
+            return None
+
+    def read_from(self, remote_path, offset):
+        """Return the bytes of `remote_path` starting at byte `offset` (tail -c +N is 1-based)."""
+        return self.exec_out(f"tail -c +{offset + 1} '{remote_path}' 2>/dev/null")
+
+    def _execute(self, device_id, command):
+        if command and self._server_available():
+            try:
+                if command[0] == "shell" and len(command) > 1:
+                    data = self._service(device_id, "shell:" + " ".join(command[1:]))
+                    return data.decode(errors="replace").strip()
+                if command[0] == "pull" and len(command) == 3:
+                    self._sync_pull(device_id, command[1], command[2])
+                    return ""
+            except ConnectionRefusedError:
+                # No adb server listening yet, let the executable start one
+                self._server_refused()
+
+        result = subprocess.run([self.adb_path, "-s", device_id] + command, capture_output=True, text=True, check=True)
+        return result.stdout.strip()
+
+    # ------------------------------------------------------------------
+    # adb server wire protocol (see adb's SERVICES.TXT / SYNC.TXT)
+    # ------------------------------------------------------------------
+    def _server_available(self):
+        return self.use_server and time.monotonic() >= self._server_retry_at
+
+    def _server_refused(self):
+        logger.info(f"adb server not reachable, using the adb executable for the next {self._server_backoff:g}s")
+        self._server_retry_at = time.monotonic() + self._server_backoff
+        self._server_backoff = min(self._server_backoff * 2, ADB_SERVER_RETRY_MAX_SECONDS)
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=10)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # The server is back: the next outage starts from the shortest backoff again
+        self._server_backoff = ADB_SERVER_RETRY_SECONDS
+        return sock
+
+    @staticmethod
+    def _send_request(sock, request):
+        payload = request.encode()
+        sock.sendall(b"%04x" % len(payload) + payload)
+        status = _recv_exact(sock, 4)
+        if status != b"OKAY":
+            length = int(_recv_exact(sock, 4), 16)
+            raise AdbError(_recv_exact(sock, length).decode(errors="replace"))
+
+    def _host_request(self, request):
+        with self._connect() as sock:
+            self._send_request(sock, request)
+            length = int(_recv_exact(sock, 4), 16)
+            return _recv_exact(sock, length)
+
+    def _open_transport(self, device_id):
+        sock = self._connect()
+        try:
+            self._send_request(sock, f"host:transport:{device_id}")
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    def _service(self, device_id, service):
+        """Open a device service (e.g. "shell:ls") and return everything it writes."""
+        with self._open_transport(device_id) as sock:
+            self._send_request(sock, service)
+            chunks = []
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            return b"".join(chunks)
+
+    def _sync_pull(self, device_id, remote_path, local_path):
+        if os.path.isdir(local_path):
+            local_path = os.path.join(local_path, os.path.basename(remote_path))
+        path = remote_path.encode()
+        with self._open_transport(device_id) as sock:
+            self._send_request(sock, "sync:")
+            sock.sendall(b"RECV" + struct.pack("<I", len(path)) + path)
+            tmp_path = local_path + ".part"
+            with open(tmp_path, "wb") as out:
+                while True:
+                    header = _recv_exact(sock, 8)
+                    tag, length = header[:4], struct.unpack("<I", header[4:])[0]
+                    if tag == b"DATA":
+                        out.write(_recv_exact(sock, length))
+                    elif tag == b"DONE":
+                        break
+                    elif tag == b"FAIL":
+                        message = _recv_exact(sock, length).decode(errors="replace")
+                        out.close()
+                        os.remove(tmp_path)
+                        raise AdbError(f"{remote_path}: {message}")
+                    else:
+                        raise AdbError(f"Unexpected sync response {tag!r}")
+            sock.sendall(b"QUIT" + struct.pack("<I", 0))
+            os.replace(tmp_path, local_path)
+
+
+class AdbStream:
+    """
+    Output of a device command started with AdbClient.open_shell, read line by line.
+
+    close() may be called from another thread to stop the command; a blocked
+    readline() then returns None.
+    """
+
+    def __init__(self, sock=None, process=None):
+        self._sock = sock
+        self._process = process
+        self._file = sock.makefile("rb") if sock is not None else process.stdout
+        self.closed = False
+
+    def readline(self):
+        """Next line without its line ending, or None once the command has exited."""
+        try:
+            line = self._file.readline()
+        except (OSError, ValueError):
+            line = b""
+        if not line:
+            self._file.close()
+            return None
+        return line.rstrip(b"\r\n").decode("utf-8", errors="replace")
+
+    def __iter__(self):
+        while True:
+            line = self.readline()
+            if line is None:
+                return
+            yield line
+
+    def close(self):
+        # The reader gets EOF and closes the file itself; closing it here
+        # could block on a readline() running in another thread
+        if self.closed:
+            return
+        self.closed = True
+        if self._sock is not None:
+            try:
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._sock.close()
+        elif self._process.poll() is None:
+            self._process.kill()
+            self._process.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _recv_exact(sock, size):
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise AdbError("Connection closed by adb server")
+        buf.extend(chunk)
+    return bytes(buf)
@@ -0,0 +1,154 @@
+import importlib
+import os
+import queue
+import threading
+
+from loguru import logger
+
+# Alert backends by method name, as "module:factory". Only the backend of the
+# configured method is imported, when the first alert is sent, so the Outlook,
+# O365 and HTTP client libraries cost nothing at startup and nothing at all
+# when another method is used. ALERT_PLUGINS adds or overrides entries
+# ("name=module:factory,..."). A factory is called as
+# factory(use_banana_style=...) and returns an object with
+# send_mail(to_email, subject, body, method=None) and close().
+ALERT_BACKENDS = {
+    "outlook": "mail_sender:MailSender",
+    "smtp": "mail_sender:MailSender",
+    "o365": "mail_sender:MailSender",
+    "token": "mail_sender:MailSender",
+    "log": "alert_dispatcher:LogSender",
+}
+ALERT_BACKENDS.update(
+    entry.strip().split("=", 1) for entry in os.getenv("ALERT_PLUGINS", "").split(",") if "=" in entry
+)
+
+# Method used when the dispatcher is not given one (unset: outlook or o365, see AlertDispatcher)
+ALERT_METHOD = os.getenv("ALERT_METHOD") or None
+
+
+def load_backend(method):
+    """Import the backend registered for `method` and return its factory."""
+    try:
+        target = ALERT_BACKENDS[method]
+    except KeyError:
+        raise ValueError(f"No alert backend for method '{method}' (known: {', '.join(sorted(ALERT_BACKENDS))})")
+    module_name, _, attr = target.partition(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+class LogSender:
+    """Alert backend that only logs the alerts, for running without a mail account."""
+
+    def __init__(self, use_banana_style=True):
+        pass
+
+    def send_mail(self, to_email, subject, body, method=None):
+        logger.warning(f"Alert for {to_email}: {subject}: {body}")
+        return "Alert logged."
+
+    def close(self):
+        pass
+
+
+class AlertDispatcher:
+    """
+    Long-lived alert sender with one warmed transport per method.
+
+    Alerts are queued by send() and delivered by a single worker thread that
+    owns one MailSender for its whole life. That means COM is initialised and
+    Outlook dispatched once, O365 authenticates once, and the SMTP connection
+    stays open between alerts (reconnecting if it drops). A burst of alerts
+    therefore costs one connection setup instead of one per alert.
+
+    Parameters
+    ----------
+    to_email : str, optional
+        Recipient. Defaults to the DEFAULT_FROM environment variable.
+    method : str, optional
+        Backend method: 'outlook', 'smtp', 'o365', 'token', 'log' or one added
+        through ALERT_PLUGINS. Defaults to ALERT_METHOD, then to MailSender's
+        own default for `use_banana_style`.
+    use_banana_style : bool, default=True
+        Passed to the backend factory.
+    max_queue : int, default=100
+        Alerts beyond this many pending ones are dropped (and logged).
+    """
+
+    def __init__(self, to_email=None, method=None, use_banana_style=True, max_queue=100):
+        self.to_email = to_email
+        self.method = method or ALERT_METHOD
+        self.use_banana_style = use_banana_style
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._worker = None
+        self._lock = threading.Lock()
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def send(self, subject, body):
+        """Queue an alert. Returns immediately; False if the queue is full."""
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((subject, body))
+            return True
+        except queue.Full:
+            logger.error(f"Alert queue full, dropping alert: {subject}")
+            return False
+
+    def close(self, timeout=10):
+        """Deliver the queued alerts, then stop the worker and close the transport."""
+        with self._lock:
+            worker = self._worker
+            self._worker = None
+        if worker is not None:
+            self._queue.put(None)
+            worker.join(timeout)
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="alert-dispatcher", daemon=True)
+                self._worker.start()
+
+    def _method(self):
+        if self.method:
+            return self.method
+        return "outlook" if self.use_banana_style else "o365"
+
+    def _run(self):
+        sender = None
+        com_initialized = False
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                subject, body = item
+
+                if sender is None:
+                    # Set the transport up on first use (and again after a failed setup)
+                    try:
+                        if self._method() == "outlook" and not com_initialized:
+                            # COM has to be initialised on the thread that uses Outlook
+                            import pythoncom
+                            pythoncom.CoInitialize()
+                            com_initialized = True
+                        sender = load_backend(self._method())(use_banana_style=self.use_banana_style)
+                    except Exception as e:
+                        logger.error(f"Failed to set up alert transport, dropping alert '{subject}': {e}")
+                        continue
+
+                try:
+                    to_email = self.to_email or os.getenv("DEFAULT_FROM")
+                    result = sender.send_mail(to_email, subject, body, method=self.method)
+                    logger.debug(f"Alert '{subject}': {result}")
+                except Exception as e:
+                    logger.error(f"Error sending email: {e}")
+        finally:
+            if sender is not None:
+                sender.close()
+            if com_initialized:
+                import pythoncom
+                pythoncom.CoUninitialize()
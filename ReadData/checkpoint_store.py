@@ -0,0 +1,173 @@
+"""
+Durable ingestion checkpoints, so a restarted monitor resumes where it stopped.
+
+For every recording the store keeps how far it was read (byte offset of the
+last complete line and the row count) and where the segment windows stand
+(end of the last complete window, and a byte offset at or before the first
+row of the window still pending). On restart the tailer resumes at the byte
+offset, and only the rows of the pending window are read again, from the
+local copy, to rebuild that window.
+
+Checkpoints are kept in a SQLite table. update() only records the latest
+values in memory; a background thread writes them every `flush_interval`
+seconds in one transaction, so the poll loops never wait on the disk.
+"""
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from typing import NamedTuple, Optional
+
+from loguru import logger
+
+from recording_store import timestamp_to_us
+from row_parser import is_header, parse_row
+
+CHECKPOINT_DB = os.getenv("CHECKPOINT_DB", "ingest_checkpoints.sqlite3")
+
+
+class Checkpoint(NamedTuple):
+    byte_offset: int = 0                # end of the last line handed to the pipeline
+    rows: int = 0                       # rows ingested up to byte_offset
+    window_offset: int = 0              # rows of the pending window start at or after this offset
+    window_end: Optional[int] = None    # end of the last complete window (epoch us)
+    done: bool = False                  # the recording was read to the end
+
+
+class CheckpointStore:
+    """
+    Per-file checkpoints in SQLite, written in batches.
+
+    Parameters
+    ----------
+    path : str
+        Database file. Created if missing.
+    flush_interval : float, default=2.0
+        Seconds between batched writes. A crash loses at most this much
+        progress, which is then ingested again.
+    """
+
+    def __init__(self, path=CHECKPOINT_DB, flush_interval=2.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db = None
+        self._flusher = None
+        self._closed = False
+        atexit.register(self.close)
+
+    def get(self, key):
+        """Latest Checkpoint for `key`, or None if the file was never ingested."""
+        with self._lock:
+            checkpoint = self._pending.get(key)
+        if checkpoint is not None:
+            return checkpoint
+        with self._db_lock:
+            row = self._connect().execute(
+                "SELECT byte_offset, rows, window_offset, window_end, done FROM checkpoints WHERE key = ?",
+                (key,)).fetchone()
+        if row is None:
+            return None
+        return Checkpoint(row[0], row[1], row[2], row[3], bool(row[4]))
+
+    def update(self, key, checkpoint):
+        """Record the latest checkpoint for `key`; it is written on the next flush."""
+        with self._lock:
+            self._pending[key] = checkpoint
+        self._ensure_flusher()
+
+    def flush(self):
+        # The batch stays in _pending until it is committed, so get() never falls
+        # through to an older row in the database while it is being written.
+        # Holding the database lock from the snapshot on keeps flushes in order.
+        with self._db_lock:
+            with self._lock:
+                pending = dict(self._pending)
+            if not pending:
+                return
+            db = self._connect()
+            with db:
+                db.executemany(
+                    "INSERT OR REPLACE INTO checkpoints "
+                    "(key, byte_offset, rows, window_offset, window_end, done, updated) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(key, *checkpoint[:4], int(checkpoint.done), time.time())
+                     for key, checkpoint in pending.items()])
+            # Written: forget the ones that were not replaced by newer values meanwhile
+            with self._lock:
+                for key, checkpoint in pending.items():
+                    if self._pending.get(key) is checkpoint:
+                        del self._pending[key]
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self.flush()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to write checkpoints: {e}")
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _connect(self):
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS checkpoints ("
+                "key TEXT PRIMARY KEY, byte_offset INTEGER NOT NULL, rows INTEGER NOT NULL, "
+                "window_offset INTEGER NOT NULL, window_end INTEGER, done INTEGER NOT NULL DEFAULT 0, "
+                "updated REAL NOT NULL)")
+        return self._db
+
+    def _ensure_flusher(self):
+        if self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="checkpoint-flush", daemon=True)
+                self._flusher.start()
+
+    def _flush_loop(self):
+        while not self._closed:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                logger.error(f"Failed to write checkpoints: {e}")
+
+
+def replay_rows(local_path, checkpoint):
+    """
+    Parse the rows of the pending window back from the local copy of a recording.
+
+    Reads bytes [window_offset, byte_offset) of `local_path` and returns the
+    parsed rows at or after the checkpoint's window_end, i.e. the rows that
+    were ingested but not yet written out in a complete window.
+    """
+    if checkpoint.byte_offset <= checkpoint.window_offset:
+        return []
+    with open(local_path, "rb") as f:
+        f.seek(checkpoint.window_offset)
+        data = f.read(checkpoint.byte_offset - checkpoint.window_offset)
+    rows = []
+    for line in data.decode("utf-8", errors="replace").splitlines():
+        if not line.strip() or is_header(line):
+            continue
+        try:
+            row = parse_row(line)
+        except ValueError:
+            continue
+        if checkpoint.window_end is None or timestamp_to_us(row.timestamp) >= checkpoint.window_end:
+            rows.append(row)
+    return rows
@@ -0,0 +1,337 @@
+"""
+Declarative detector rules, compiled once into vectorized window checks.
+
+Rules live in a JSON file (detector_rules.json next to this module, or the
+file named by DETECTOR_RULES) as named rule sets:
+
+    {
+      "default": [
+        {"name": "noise", "signal": "perfusion", "statistic": "q3",
+         "op": ">", "threshold": 6, "min_count": 61},
+        ...
+      ]
+    }
+
+Every rule reduces its signal to one value per row (`statistic`), compares
+it with `threshold` (`op`) to flag rows, and fires when at least `min_count`
+rows of the window are flagged. `window` (seconds, optional) limits the rule
+to the most recent part of the window. `alert` (default true) says whether
+the monitor sends an alert when the rule fires; `subject` and `body` give
+the alert text for rules the monitor has no text for.
+
+compile_rules() turns the specs into a RuleSet. A statistic shared by
+several rules is computed once per window, over the whole (rows, samples)
+matrix in one NumPy call, so adding a rule adds no per-row Python work.
+New statistics are added to STATISTICS, new operators to OPERATORS.
+"""
+import hashlib
+import json
+import os
+import sys
+import time
+import warnings
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from recording_store import timestamp_to_us
+
+RULES_FILE = os.getenv("DETECTOR_RULES", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                      "detector_rules.json"))
+DEFAULT_RULE_SET = "default"
+
+# The original check was `'1' in str(spo2_status)`, i.e. a status code counts
+# as a drop when its decimal text contains a 1 (1, 10, 16, ...). Precompute it
+# for every code the oximeter reports so the check becomes a table lookup.
+_STATUS_HAS_ONE = np.array(['1' in str(code) for code in range(256)])
+
+
+def stack_rows(arrays, dtype=np.float64, fill=np.nan):
+    """
+    Pack a sequence of per-row 1-D arrays into one (N, width) matrix.
+
+    Rows are normally all 100 samples wide and are stacked directly; ragged
+    rows are padded with `fill`.
+    """
+    arrays = list(arrays)
+    if not arrays:
+        return np.empty((0, 0), dtype=dtype)
+    width = len(arrays[0])
+    if all(len(a) == width for a in arrays):
+        return np.stack(arrays).astype(dtype, copy=False)
+
+    width = max(len(a) for a in arrays)
+    out = np.full((len(arrays), width), fill, dtype=dtype)
+    for i, a in enumerate(arrays):
+        out[i, :len(a)] = a
+    return out
+
+
+def drop_flags(status):
+    """Return a bool per row telling whether any spo2_status code in the row is a drop."""
+    status = np.asarray(status)
+    if status.size == 0:
+        return np.zeros(len(status), dtype=bool)
+    if status.min() >= 0 and status.max() < _STATUS_HAS_ONE.size:
+        hits = _STATUS_HAS_ONE[status]
+    else:
+        hits = np.char.find(status.astype(str), '1') >= 0
+    return hits.any(axis=1)
+
+
+# Signals a rule can read: one value per row, or an array of samples per row
+SCALAR_SIGNALS = ("battery", "hr", "o2")
+ARRAY_SIGNALS = ("spo2_status", "pleth", "red", "ir", "perfusion")
+
+
+def _nan_aware(reduce, nan_reduce):
+    """Per-row reduction over an (N, width) matrix; the NaN variant only when rows were padded."""
+    def statistic(values):
+        if values.ndim != 2 or values.shape[1] == 0:
+            return np.full(len(values), np.nan)
+        if values.dtype.kind == "f" and np.isnan(values).any():
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)
+                return nan_reduce(values, axis=1)
+        return reduce(values, axis=1)
+    return statistic
+
+
+def _quantile(q):
+    return _nan_aware(lambda values, axis: np.quantile(values, q, axis=axis),
+                      lambda values, axis: np.nanquantile(values, q, axis=axis))
+
+
+# statistic -> (signal kind, function of the signal's values returning one value per row)
+STATISTICS = {
+    "value": ("scalar", lambda values: values),
+    "min": ("array", _nan_aware(np.min, np.nanmin)),
+    "max": ("array", _nan_aware(np.max, np.nanmax)),
+    "mean": ("array", _nan_aware(np.mean, np.nanmean)),
+    "std": ("array", _nan_aware(np.std, np.nanstd)),
+    "median": ("array", _quantile(0.5)),
+    "q1": ("array", _quantile(0.25)),
+    "q3": ("array", _quantile(0.75)),
+    "range": ("array", _nan_aware(np.ptp, lambda values, axis: np.nanmax(values, axis) - np.nanmin(values, axis))),
+    # Status codes whose decimal text contains a 1 (the oximeter's drop codes), as 0 or 1 per row
+    "drop_code": ("array", lambda values: drop_flags(values).astype(np.int8)),
+}
+
+# op -> function(values, threshold) returning a bool per row; rows without a value (NaN) are never flagged
+OPERATORS = {
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+    "==": np.equal,
+    "!=": lambda values, threshold: np.not_equal(values, threshold) & ~np.isnan(values),
+    "outside": lambda values, bounds: (values < bounds[0]) | (values > bounds[1]),
+    "inside": lambda values, bounds: (values >= bounds[0]) & (values <= bounds[1]),
+}
+
+
+class Rule(NamedTuple):
+    name: str
+    signal: str
+    statistic: str
+    op: str
+    threshold: object                   # a number, or [low, high] for outside/inside
+    min_count: int = 1                  # flagged rows needed for the rule to fire
+    window: Optional[float] = None      # only the last this many seconds of the window count
+    alert: bool = True
+    subject: Optional[str] = None
+    body: Optional[str] = None
+
+
+class RuleResult(NamedTuple):
+    rows: np.ndarray    # bool per row
+    count: int
+    fired: bool
+
+
+class RuleVerdict:
+    """Results of a RuleSet over one window, by rule name."""
+
+    def __init__(self, rules, results):
+        self.rules = rules
+        self.results = results
+
+    def __getitem__(self, name):
+        return self.results[name]
+
+    def count(self, name):
+        result = self.results.get(name)
+        return result.count if result is not None else 0
+
+    @property
+    def fired(self):
+        """Rules that fired, in rule set order."""
+        return [rule for rule in self.rules if self.results[rule.name].fired]
+
+    def summary(self):
+        """{rule name: flagged row count}"""
+        return {name: result.count for name, result in self.results.items()}
+
+
+class RuleSet:
+    """
+    Compiled rules, evaluated together over a window.
+
+    Parameters
+    ----------
+    rules : list of Rule
+        Checked by compile_rules(); names must be unique.
+    name : str, default="custom"
+        Rule set name, for messages.
+    """
+
+    def __init__(self, rules, name="custom"):
+        self.rules = list(rules)
+        self.name = name
+        # Each (signal, statistic) pair is computed once per window and shared
+        self._statistics = {}
+        self._checks = []
+        for rule in self.rules:
+            key = (rule.signal, rule.statistic)
+            self._statistics.setdefault(key, STATISTICS[rule.statistic][1])
+            self._checks.append((rule, key, OPERATORS[rule.op]))
+        self.signals = sorted({rule.signal for rule in self.rules})
+        self.needs_timestamps = any(rule.window for rule in self.rules)
+        self.alerting = [rule for rule in self.rules if rule.alert]
+        # Changes whenever a rule does, so stored results can tell which rules produced them
+        specs = json.dumps([rule._asdict() for rule in self.rules], sort_keys=True)
+        self.digest = hashlib.sha256(specs.encode()).hexdigest()[:16]
+
+    def __iter__(self):
+        return iter(self.rules)
+
+    def __len__(self):
+        return len(self.rules)
+
+    def evaluate(self, columns):
+        """
+        Run every rule over a window.
+
+        `columns` maps signal name to its values for the window's rows (a
+        Window's columns, for instance): (N,) for scalar signals, (N, width)
+        for array signals, plus "timestamp" in epoch microseconds when a rule
+        has a `window`.
+        """
+        values = {key: statistic(np.asarray(columns[key[0]])) for key, statistic in self._statistics.items()}
+        recent = {}
+        results = {}
+        for rule, key, compare in self._checks:
+            rows = compare(values[key], rule.threshold)
+            if rule.window:
+                if rule.window not in recent:
+                    timestamps = np.asarray(columns["timestamp"])
+                    recent[rule.window] = (timestamps > timestamps[-1] - rule.window * 1e6 if len(timestamps)
+                                           else np.zeros(0, dtype=bool))
+                rows = rows & recent[rule.window]
+            count = int(rows.sum())
+            results[rule.name] = RuleResult(rows, count, count >= rule.min_count)
+        return RuleVerdict(self.rules, results)
+
+    def evaluate_rows(self, rows):
+        """Run every rule over parsed SmartCareRow records, taken as one window."""
+        columns = {}
+        for signal in self.signals:
+            if signal in SCALAR_SIGNALS:
+                columns[signal] = np.fromiter((getattr(row, signal) for row in rows), dtype=np.float64,
+                                              count=len(rows))
+            elif signal == "spo2_status":
+                columns[signal] = stack_rows((row.spo2_status for row in rows), dtype=np.int64, fill=0)
+            else:
+                columns[signal] = stack_rows(getattr(row, signal) for row in rows)
+        if self.needs_timestamps:
+            columns["timestamp"] = np.fromiter((timestamp_to_us(row.timestamp) for row in rows), dtype=np.int64,
+                                               count=len(rows))
+        return self.evaluate(columns)
+
+
+def _check_rule(spec, names):
+    """Rule from one JSON spec, or ValueError saying what is wrong with it."""
+    name = spec.get("name")
+    if not name:
+        raise ValueError(f"Rule without a name: {spec}")
+    if name in names:
+        raise ValueError(f"Duplicate rule name: {name}")
+    unknown = set(spec) - set(Rule._fields)
+    if unknown:
+        raise ValueError(f"Rule {name}: unknown field(s) {', '.join(sorted(unknown))}")
+    try:
+        rule = Rule(**spec)
+    except TypeError as e:
+        raise ValueError(f"Rule {name}: {e}") from None
+
+    if rule.statistic not in STATISTICS:
+        raise ValueError(f"Rule {name}: unknown statistic {rule.statistic} (use {', '.join(STATISTICS)})")
+    kind = STATISTICS[rule.statistic][0]
+    signals = SCALAR_SIGNALS if kind == "scalar" else ARRAY_SIGNALS
+    if rule.signal not in signals:
+        raise ValueError(f"Rule {name}: statistic {rule.statistic} needs one of {', '.join(signals)}, "
+                         f"not {rule.signal}")
+    if rule.op not in OPERATORS:
+        raise ValueError(f"Rule {name}: unknown op {rule.op} (use {', '.join(OPERATORS)})")
+    if rule.op in ("outside", "inside"):
+        if not (isinstance(rule.threshold, (list, tuple)) and len(rule.threshold) == 2):
+            raise ValueError(f"Rule {name}: op {rule.op} needs a [low, high] threshold")
+        rule = rule._replace(threshold=tuple(float(t) for t in rule.threshold))
+    elif not isinstance(rule.threshold, (int, float)):
+        raise ValueError(f"Rule {name}: threshold must be a number")
+    if not isinstance(rule.min_count, int) or rule.min_count < 1:
+        raise ValueError(f"Rule {name}: min_count must be a positive integer")
+    if rule.window is not None and rule.window <= 0:
+        raise ValueError(f"Rule {name}: window must be a positive number of seconds")
+    return rule
+
+
+def compile_rules(specs, name="custom"):
+    """Check a list of rule specs (dicts as in the JSON file) and compile them into a RuleSet."""
+    rules = []
+    for spec in specs:
+        rules.append(_check_rule(spec, {rule.name for rule in rules}))
+    return RuleSet(rules, name)
+
+
+@lru_cache(maxsize=None)
+def load_rules(name=DEFAULT_RULE_SET, path=RULES_FILE):
+    """Compile the named rule set from a rules file (once per name and file)."""
+    with open(path, "r") as f:
+        rule_sets = json.load(f)
+    if name not in rule_sets:
+        raise ValueError(f"No rule set {name} in {path} (has {', '.join(rule_sets)})")
+    return compile_rules(rule_sets[name], name)
+
+
+if __name__ == "__main__":
+    rules = load_rules(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_RULE_SET)
+    rng = np.random.default_rng(0)
+    n = 180
+    columns = {
+        "timestamp": np.arange(n, dtype=np.int64) * 1_000_000,
+        "battery": np.full(n, 90), "hr": rng.integers(50, 160, n), "o2": rng.integers(85, 100, n),
+        "spo2_status": rng.choice([0, 0, 0, 0, 1, 8, 16], size=(n, 100)),
+        "pleth": rng.integers(0, 60000, size=(n, 100)), "red": rng.integers(0, 60000, size=(n, 100)),
+        "ir": rng.integers(0, 60000, size=(n, 100)), "perfusion": rng.uniform(0, 12, size=(n, 100)).round(1),
+    }
+
+    start = time.perf_counter()
+    for _ in range(100):
+        per_row = [('1' in str(list(r)), np.quantile(p, 0.75) > 6)
+                   for r, p in zip(columns["spo2_status"], columns["perfusion"])]
+    per_row_time = (time.perf_counter() - start) / 100
+
+    start = time.perf_counter()
+    for _ in range(100):
+        verdict = rules.evaluate(columns)
+    compiled_time = (time.perf_counter() - start) / 100
+
+    assert [d for d, _ in per_row] == verdict["drop"].rows.tolist()
+    assert [q for _, q in per_row] == verdict["noise"].rows.tolist()
+    for rule in rules:
+        result = verdict[rule.name]
+        print(f"{rule.name:16} {result.count:4} rows{'  fired' if result.fired else ''}")
+    print(f"{n}-row window: per-row drop/noise {per_row_time * 1e3:.2f} ms, "
+          f"{len(rules)} compiled rules {compiled_time * 1e3:.3f} ms")
@@ -0,0 +1,162 @@
+import threading
+import time
+
+from loguru import logger
+
+from adb_client import AdbClient
+
+
+class DeviceStats:
+    """Per-device counters for the ingestion pipeline."""
+
+    def __init__(self):
+        self.connected_at = time.time()
+        self.rows = 0
+        self.bytes = 0
+        self.files = 0
+        self._lock = threading.Lock()
+
+    def add_rows(self, count):
+        with self._lock:
+            self.rows += count
+
+    def add_bytes(self, count):
+        with self._lock:
+            self.bytes += count
+
+    def add_file(self):
+        with self._lock:
+            self.files += 1
+
+    def snapshot(self):
+        elapsed = max(time.time() - self.connected_at, 1e-9)
+        with self._lock:
+            return {
+                "rows": self.rows,
+                "bytes": self.bytes,
+                "files": self.files,
+                "uptime_seconds": round(elapsed, 1),
+                "rows_per_sec": round(self.rows / elapsed, 3),
+                "bytes_per_sec": round(self.bytes / elapsed, 1),
+            }
+
+
+class Device:
+    """One attached phone: its pinned ADB client, stop signal and stats."""
+
+    def __init__(self, client, serial=None):
+        self.client = client
+        self.serial = serial
+        self.stop_event = threading.Event()
+        self.stats = DeviceStats()
+        self.thread = None
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+
+class DeviceManager:
+    """
+    Run an independent monitor pipeline for every attached phone.
+
+    The manager polls the adb server for attached serials (reconnecting any
+    configured network devices first). A newly seen serial gets its own
+    AdbClient pinned to that serial and a thread running `pipeline(device)`.
+    When a serial disappears its stop event is set so the pipeline can wind
+    down, and it is restarted if the phone is plugged back in.
+
+    Parameters
+    ----------
+    adb_path : str
+        Path to the adb executable.
+    pipeline : callable
+        Called as pipeline(device) on a dedicated thread for each device.
+        It should return once device.stop_event is set.
+    network_devices : list of str, optional
+        Addresses ("ip" or "ip:port") to keep connected with `adb connect`.
+    poll_interval : float, default=5
+        Seconds between device scans.
+    stats_interval : float, default=60
+        Seconds between per-device throughput log lines.
+    """
+
+    def __init__(self, adb_path, pipeline, network_devices=(), poll_interval=5, stats_interval=60):
+        self.adb_path = adb_path
+        self.pipeline = pipeline
+        self.network_devices = list(network_devices)
+        self.poll_interval = poll_interval
+        self.stats_interval = stats_interval
+        self.devices = {}
+        self._discovery = AdbClient(adb_path)
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def scan(self):
+        """Start pipelines for new devices and stop the ones that went away."""
+        serials = self._discovery.list_devices()
+        for address in self.network_devices:
+            serial = address if ":" in address else f"{address}:5555"
+            if serial not in serials and self._discovery.connect(address):
+                serials.append(serial)
+
+        with self._lock:
+            for serial in serials:
+                device = self.devices.get(serial)
+                if device is None or not device.is_running():
+                    self._start(serial)
+
+            for serial, device in list(self.devices.items()):
+                if serial not in serials and not device.stop_event.is_set():
+                    logger.warning(f"Device {serial} disconnected, stopping its pipeline")
+                    device.stop_event.set()
+        return serials
+
+    def run(self):
+        """Scan for devices until stop() is called."""
+        logger.info("Waiting for devices...")
+        last_stats = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                if not self.scan():
+                    logger.debug("No devices attached")
+                if self.devices and time.monotonic() - last_stats >= self.stats_interval:
+                    for serial, stats in self.stats().items():
+                        logger.info(f"Device {serial}: {stats}")
+                    last_stats = time.monotonic()
+                self._stop.wait(self.poll_interval)
+        finally:
+            # Also on Ctrl+C: the pipelines' ingest workers only stop once told to
+            self.stop_all()
+
+    def stop(self):
+        self._stop.set()
+
+    def stop_all(self, timeout=None):
+        with self._lock:
+            devices = list(self.devices.values())
+        for device in devices:
+            device.stop_event.set()
+        for device in devices:
+            if device.thread is not None:
+                device.thread.join(timeout)
+
+    def stats(self):
+        """Return {serial: stats snapshot} for every known device."""
+        with self._lock:
+            return {serial: dict(device.stats.snapshot(), running=device.is_running())
+                    for serial, device in self.devices.items()}
+
+    def _start(self, serial):
+        device = Device(AdbClient(self.adb_path, serial=serial), serial)
+        device.thread = threading.Thread(target=self._run_pipeline, args=(device,), name=f"device-{serial}", daemon=True)
+        self.devices[serial] = device
+        logger.info(f"Starting pipeline for device {serial}")
+        device.thread.start()
+
+    def _run_pipeline(self, device):
+        try:
+            self.pipeline(device)
+        except Exception:
+            logger.exception(f"Pipeline for device {device.serial} crashed")
+        finally:
+            logger.info(f"Pipeline for device {device.serial} stopped: {device.stats.snapshot()}")
@@ -0,0 +1,164 @@
+import atexit
+import json
+import os
+import threading
+import time
+
+from loguru import logger
+
+
+class EventJournal:
+    """
+    Append-only JSON Lines journal for device events.
+
+    Each event is one line, so logging an event costs a buffered write instead
+    of re-reading and re-writing the whole history. Buffered lines are flushed
+    to the OS every `flush_interval` seconds, fsync'ed every `fsync_interval`
+    seconds, and the file is rotated once it grows past `max_bytes`
+    (device_events.jsonl -> device_events.jsonl.1 -> ...).
+
+    Parameters
+    ----------
+    path : str
+        Journal file.
+    max_bytes : int, default=10 MB
+        Rotate when the active file reaches this size. 0 disables rotation.
+    backup_count : int, default=5
+        Number of rotated files to keep.
+    flush_interval : float, default=1.0
+        Seconds between flushes of the write buffer.
+    fsync_interval : float, default=5.0
+        Seconds between fsyncs of the journal file.
+    """
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backup_count=5,
+                 flush_interval=1.0, fsync_interval=5.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self._file = None
+        self._size = 0
+        self._dirty = False
+        self._last_fsync = time.monotonic()
+        self._lock = threading.Lock()
+        self._flusher = None
+        atexit.register(self.close)
+
+    def append(self, entry):
+        line = json.dumps(entry, default=str) + "\n"
+        # Counted in bytes, like the tell() the size is reset from
+        size = len(line.encode("utf-8"))
+        with self._lock:
+            if self._file is None:
+                self._open()
+            elif self.max_bytes and self._size + size > self.max_bytes:
+                self._rotate()
+            self._file.write(line)
+            self._size += size
+            self._dirty = True
+        self._ensure_flusher()
+
+    def flush(self, fsync=False):
+        with self._lock:
+            self._flush_locked(fsync)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._flush_locked(fsync=True)
+                self._file.close()
+                self._file = None
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # newline="\n": no "\r\n" on Windows, so the written bytes are the counted ones
+        self._file = open(self.path, "a", encoding="utf-8", newline="\n")
+        self._size = self._file.tell()
+
+    def _flush_locked(self, fsync=False):
+        if self._file is None:
+            return
+        if self._dirty:
+            self._file.flush()
+            self._dirty = False
+        now = time.monotonic()
+        if fsync or now - self._last_fsync >= self.fsync_interval:
+            os.fsync(self._file.fileno())
+            self._last_fsync = now
+
+    def _rotate(self):
+        self._flush_locked(fsync=True)
+        self._file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+    def _ensure_flusher(self):
+        if self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="event-journal-flush", daemon=True)
+                self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Failed to flush event journal: {e}")
+
+
+def read_events(path, legacy_path=None):
+    """
+    Return all journaled events in the old device_events.json shape: {"events": [...]}.
+
+    Events from `legacy_path` (the pre-journal JSON file) come first, followed by
+    the rotated journal files from oldest to newest and then the active file.
+    A partially written last line (e.g. after a crash) is skipped.
+    """
+    events = []
+    if legacy_path and os.path.exists(legacy_path):
+        with open(legacy_path, "r", encoding="utf-8") as f:
+            try:
+                events.extend(json.load(f).get("events", []))
+            except json.JSONDecodeError:
+                logger.warning(f"Ignoring unreadable legacy event file {legacy_path}")
+
+    rotated = []
+    i = 1
+    while os.path.exists(f"{path}.{i}"):
+        rotated.append(f"{path}.{i}")
+        i += 1
+
+    for journal in rotated[::-1] + ([path] if os.path.exists(path) else []):
+        with open(journal, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping incomplete event line in {journal}")
+    return {"events": events}
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Print the old device_events.json view: python event_journal.py [journal] [legacy json]
+    journal_path = sys.argv[1] if len(sys.argv) > 1 else "device_events.jsonl"
+    legacy = sys.argv[2] if len(sys.argv) > 2 else "device_events.json"
+    print(json.dumps(read_events(journal_path, legacy), indent=4))
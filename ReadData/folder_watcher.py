@@ -0,0 +1,226 @@
+"""
+New-file discovery for the folders the monitor watches on the phone.
+
+Instead of running `adb shell ls` on every folder every few seconds, one
+persistent `adb shell` session streams the changes from the device:
+
+    inotify  `inotifyd - folder:ny ...` prints a line as soon as a file is
+             created in (or moved into) a watched folder
+    loop     a shell loop on the device lists the folders (with sizes and
+             mtimes) every `loop_interval` seconds and the host diffs them
+    poll     a stat listing from the host, every min_interval seconds while
+             recordings are active or something new turned up, backing off
+             to max_interval when idle
+
+In "auto" mode the watcher starts with inotify and moves down the list when
+a mode is not available on the device (its session exits straight away
+without printing anything usable).
+
+Environment:
+    DISCOVERY_MODE   auto (default), inotify, loop or poll
+"""
+import os
+import queue
+import shlex
+import threading
+import time
+
+from loguru import logger
+
+from adb_client import parse_stat_line, stat_command
+
+DISCOVERY_MODE = os.getenv("DISCOVERY_MODE", "auto")
+MODES = ("inotify", "loop", "poll")
+
+# A streaming session that exits sooner than this without any usable output
+# is taken to be unsupported on the device
+STREAM_MIN_SECONDS = 3.0
+
+# Marks the end of one pass of the device-side listing loop
+_PASS_END = "@@"
+
+
+class FolderWatcher:
+    """
+    Report the files that appear in a set of device folders.
+
+    Parameters
+    ----------
+    client : AdbClient
+        Client for the device.
+    folders : list of str
+        Device folders to watch.
+    mode : str, default=DISCOVERY_MODE
+        "auto", "inotify", "loop" or "poll" (see the module docstring).
+    min_interval : float, default=1.0
+        Poll interval while busy, and the pause before a streaming session
+        is restarted.
+    max_interval : float, default=10.0
+        Poll interval when idle.
+    loop_interval : float, default=1.0
+        Seconds between listings in the device-side loop.
+    resync_interval : float, default=60.0
+        In the streaming modes, re-list the folders from the host this often
+        in case an event was missed.
+    """
+
+    def __init__(self, client, folders, mode=DISCOVERY_MODE, min_interval=1.0, max_interval=10.0,
+                 loop_interval=1.0, resync_interval=60.0):
+        if mode != "auto" and mode not in MODES:
+            raise ValueError(f"Unknown discovery mode: {mode}")
+        self.client = client
+        self.folders = [folder.rstrip("/") for folder in folders]
+        self.modes = list(MODES) if mode == "auto" else [mode]
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.loop_interval = loop_interval
+        self.resync_interval = resync_interval
+        # {folder: {name: FileStat}}; None for files only known from an inotify event
+        self._files = {folder: {} for folder in self.folders}
+
+    @property
+    def mode(self):
+        """The discovery mode currently in use."""
+        return self.modes[0]
+
+    def watch(self, stop_event, busy=None):
+        """
+        Yield (folder, filename) for every file that appears in a watched folder.
+
+        The files already present are yielded first. `busy` is an optional
+        callable; while it returns something truthy (e.g. recordings are being
+        ingested) polling runs at min_interval. Returns once stop_event is set.
+        """
+        yield from self.rescan()
+        while not stop_event.is_set():
+            if self.mode == "poll":
+                yield from self._poll(stop_event, busy)
+            else:
+                yield from self._stream(stop_event)
+
+    def file_stat(self, folder, filename):
+        """Size and mtime of a file as of the last listing (adb_client.FileStat), or None."""
+        return self._files.get(folder.rstrip("/"), {}).get(filename)
+
+    def rescan(self):
+        """List every folder from the host and return the (folder, filename) pairs not seen before."""
+        found = []
+        for folder in self.folders:
+            files = self.client.stat_files(folder)
+            if files is None:
+                logger.warning(f"Failed to list {folder}")
+                continue
+            found.extend(self._update(folder, files))
+        return found
+
+    # ------------------------------------------------------------------
+    # Modes
+    # ------------------------------------------------------------------
+    def _poll(self, stop_event, busy):
+        interval = self.min_interval
+        while not stop_event.wait(interval):
+            found = self.rescan()
+            yield from found
+            if found or (busy is not None and busy()):
+                interval = self.min_interval
+            else:
+                interval = min(interval * 2, self.max_interval)
+
+    def _stream(self, stop_event):
+        mode = self.mode
+        stream = self.client.open_shell(self._command(mode))
+        if stream is None:
+            stop_event.wait(self.max_interval)
+            return
+
+        lines = queue.Queue()
+        threading.Thread(target=self._pump, args=(stream, lines), name=f"watch-{mode}", daemon=True).start()
+        started = last_sync = time.monotonic()
+        usable = False
+        pass_listing, current = {}, None
+        try:
+            while not stop_event.is_set():
+                try:
+                    line = lines.get(timeout=0.5)
+                except queue.Empty:
+                    if time.monotonic() - last_sync >= self.resync_interval:
+                        yield from self.rescan()
+                        last_sync = time.monotonic()
+                    continue
+                if line is None:
+                    break
+                if mode == "inotify":
+                    event = self._parse_event(line)
+                    if event is not None:
+                        usable = usable or self._started(mode)
+                        yield from self._update(event[0], {event[1]: None}, replace=False)
+                elif line == _PASS_END:
+                    usable = usable or self._started(mode)
+                    for folder, names in pass_listing.items():
+                        yield from self._update(folder, names)
+                    pass_listing, current = {}, None
+                elif line.startswith("@") and line[1:] in self._files:
+                    current = line[1:]
+                    pass_listing[current] = {}
+                elif current is not None:
+                    stat = parse_stat_line(line)
+                    if stat is not None:
+                        pass_listing[current][stat.name] = stat
+        finally:
+            stream.close()
+
+        if stop_event.is_set():
+            return
+        if not usable and time.monotonic() - started < STREAM_MIN_SECONDS:
+            fallback = self.modes[1] if len(self.modes) > 1 else None
+            if fallback is None:
+                logger.warning(f"{mode} discovery is not available on the device, retrying")
+                stop_event.wait(self.max_interval)
+                return
+            logger.info(f"{mode} discovery is not available on the device, falling back to {fallback}")
+            self.modes.pop(0)
+        else:
+            logger.warning(f"{mode} discovery session ended, restarting")
+            stop_event.wait(self.min_interval)
+        # Pick up whatever appeared while no session was running
+        yield from self.rescan()
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+    def _command(self, mode):
+        if mode == "inotify":
+            # n: created, y: moved into the folder
+            return "inotifyd - " + " ".join(shlex.quote(f"{folder}:ny") for folder in self.folders)
+        passes = "; ".join(f"echo {shlex.quote('@' + folder)}; {stat_command(folder)}" for folder in self.folders)
+        return f"while true; do {passes}; echo {_PASS_END}; sleep {self.loop_interval:g}; done"
+
+    def _started(self, mode):
+        logger.info(f"Watching {', '.join(self.folders)} for new files ({mode})")
+        return True
+
+    def _parse_event(self, line):
+        # inotifyd prints "<events>\t<watched path>\t<file name>"
+        parts = line.split("\t")
+        if len(parts) != 3:
+            return None
+        folder = parts[1].rstrip("/")
+        if folder not in self._files or not parts[2]:
+            return None
+        return folder, parts[2]
+
+    def _update(self, folder, files, replace=True):
+        known = self._files[folder]
+        found = [(folder, name) for name in files if name not in known]
+        if replace:
+            # A full listing: forget deleted files so they are reported again if they come back
+            self._files[folder] = dict(files)
+        else:
+            known.update((name, files[name]) for _, name in found)
+        return found
+
+    @staticmethod
+    def _pump(stream, lines):
+        for line in stream:
+            lines.put(line)
+        lines.put(None)
@@ -0,0 +1,63 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from loguru import logger
+
+
+class IngestScheduler:
+    """
+    Run one ingestion worker per active file on a bounded thread pool.
+
+    The folder scanner submits work and returns immediately, so it keeps
+    polling while recordings are being tailed. A file that already has a
+    worker is not submitted twice. When all `max_workers` slots are busy,
+    new files wait in the pool queue until a recording finishes.
+
+    The workers are threads: a live recording's worker spends nearly all its
+    time waiting for the next poll, so several recordings are followed with
+    no added delay between them. Parsing and detection hold the GIL, so a
+    backlog of finished files is not ingested any faster than by one worker
+    (benchmarks/run_benchmarks.py multi_file measures both).
+
+    With a `stop_event` (the one the workers watch), shutdown() sets it and
+    drops the files still queued, so the pool winds down within a poll
+    interval. Without one, shutdown() lets the queued work run to completion.
+    """
+
+    def __init__(self, max_workers=4, name="ingest", stop_event=None):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self.stop_event = stop_event
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, fn, *args, **kwargs):
+        """Schedule fn(*args, **kwargs) for `key`. Returns False if `key` is already being processed."""
+        with self._lock:
+            if key in self._active:
+                return False
+            future = self._executor.submit(fn, *args, **kwargs)
+            self._active[key] = future
+        future.add_done_callback(lambda f, key=key: self._finished(key, f))
+        return True
+
+    def is_active(self, key):
+        with self._lock:
+            return key in self._active
+
+    def active_keys(self):
+        with self._lock:
+            return list(self._active)
+
+    def shutdown(self, wait=True):
+        if self.stop_event is not None:
+            # Signal the running workers first, then drop what has not started
+            self.stop_event.set()
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+        else:
+            self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def _finished(self, key, future):
+        with self._lock:
+            self._active.pop(key, None)
+        if not future.cancelled() and future.exception() is not None:
+            logger.opt(exception=future.exception()).error(f"Ingestion worker for {key} failed")
@@ -0,0 +1,49 @@
+"""
+Logging setup shared by the monitor scripts.
+
+Both sinks (console and rotating file) are added with enqueue=True, so a log
+call only puts the record on a queue and loguru's writer thread does the
+formatting and I/O. Rows are not logged one by one: the scripts log one
+summary line per window (WindowSummary in window_stage.py) and, when
+LOG_ROW_SAMPLE is set to N, every Nth row at DEBUG level.
+
+Environment:
+    LOG_LEVEL        console level (default INFO); the file always gets DEBUG
+    LOG_ROW_SAMPLE   log every Nth row at DEBUG (default 0, off)
+"""
+import itertools
+import os
+import sys
+
+from loguru import logger
+
+CONSOLE_FORMAT = "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <level>{message}</level>"
+FILE_FORMAT = "{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {message}"
+
+LOG_ROW_SAMPLE = int(os.getenv("LOG_ROW_SAMPLE", "0") or 0)
+
+
+def configure_logging(log_file="file_watch.log", console_level=None):
+    """Replace loguru's default handler with enqueued console and file sinks."""
+    logger.remove()  # Remove default handler
+    logger.add(sys.stdout,
+               level=console_level or os.getenv("LOG_LEVEL", "INFO"),
+               format=CONSOLE_FORMAT,
+               colorize=True,
+               enqueue=True)
+    logger.add(log_file,
+               level="DEBUG",
+               rotation="10 MB",
+               format=FILE_FORMAT,
+               enqueue=True)
+
+
+class RowSampler:
+    """Say yes to one call in `every` (never when every is 0), for sampled per-row logging."""
+
+    def __init__(self, every=LOG_ROW_SAMPLE):
+        self.every = every
+        self._counter = itertools.count()
+
+    def __call__(self):
+        return self.every > 0 and next(self._counter) % self.every == 0
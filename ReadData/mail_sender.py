@@ -1,12 +1,12 @@
 import os
 import smtplib
-import requests
 import logging
-import win32com.client as win32
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from dotenv import load_dotenv
-from O365 import Account
+
+# win32com, O365 and requests are imported by the methods that use them, so
+# a sender only loads the client library of the method it actually sends with
 
 # Initialize dotenv to load environment variables
 load_dotenv()
@@ -34,9 +34,14 @@ class MailSender:
     def __init__(self, use_banana_style=True):
         self.use_banana_style = use_banana_style
         self.logger = logging.getLogger(self.__class__.__name__)
+        # Transports kept open between sends (see _get_outlook and _get_smtp)
+        self._outlook = None
+        self._smtp = None
 
         # Initialize O365 Account only if not using banana style
         if not self.use_banana_style:
+            from O365 import Account
+
             credentials = (os.getenv('GRAPH_CLIENT_ID'), os.getenv('GRAPH_CLIENT_SECRET'))
             self.account = Account(credentials, tenant_id=os.getenv('GRAPH_TENANT_ID'))
 
@@ -106,7 +111,7 @@ class MailSender:
             A message indicating the result of the email sending operation.
         """
         try:
-            outlook = win32.Dispatch('outlook.application')
+            outlook = self._get_outlook()
             mail = outlook.CreateItem(0)
             mail.To = to_email
             mail.Subject = subject
@@ -121,6 +126,8 @@ class MailSender:
             self.logger.info("Email sent successfully via Outlook.")
             return "Email sent successfully via Outlook."
         except Exception as e:
+            # Outlook may have been closed; dispatch it again on the next send
+            self._outlook = None
             self.logger.error(f"Failed to send email via Outlook: {str(e)}")
             return f"Failed to send email via Outlook: {str(e)}"
 
@@ -174,6 +181,8 @@ class MailSender:
         str
             A message indicating the result of the email sending operation.
         """
+        import requests
+
         token = self.account.connection.token_backend.get_token()  
 
         if not token:
@@ -236,16 +245,76 @@ class MailSender:
         msg['Subject'] = subject
         msg.attach(MIMEText(body, 'plain'))
 
-        try:
-            with smtplib.SMTP(os.getenv('SMTP_SERVER'), int(os.getenv('SMTP_PORT'))) as server:
-                server.starttls()
-                server.login(os.getenv('SMTP_USERNAME'), os.getenv('SMTP_PASSWORD'))
+        for attempt in range(2):
+            try:
+                server = self._get_smtp()
                 server.sendmail(msg['From'], msg['To'], msg.as_string())
                 self.logger.info("Email sent successfully via SMTP.")
                 return "Email sent successfully via SMTP."
-        except Exception as e:
-            self.logger.error(f"Failed to send email via SMTP: {str(e)}")
-            return f"Failed to send email via SMTP: {str(e)}"
+            except (smtplib.SMTPServerDisconnected, OSError) as e:
+                # The kept-alive connection may have timed out; reconnect once
+                self._close_smtp()
+                if attempt == 0:
+                    self.logger.info(f"SMTP connection lost ({e}), reconnecting...")
+                    continue
+                self.logger.error(f"Failed to send email via SMTP: {str(e)}")
+                return f"Failed to send email via SMTP: {str(e)}"
+            except Exception as e:
+                self.logger.error(f"Failed to send email via SMTP: {str(e)}")
+                return f"Failed to send email via SMTP: {str(e)}"
+
+    def _get_outlook(self):
+        """
+        Returns the Outlook application object, dispatching it on first use.
+
+        The COM object belongs to the calling thread, so a MailSender using the
+        Outlook method should only be used from the thread that created it.
+        """
+        if self._outlook is None:
+            import win32com.client as win32
+
+            self._outlook = win32.Dispatch('outlook.application')
+        return self._outlook
+
+    def _get_smtp(self):
+        """
+        Returns a logged-in SMTP connection, opening one if needed.
+
+        The connection is kept open so consecutive alerts do not repeat the
+        TCP, TLS and login handshakes.
+        """
+        if self._smtp is not None:
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._close_smtp()
+
+        server = smtplib.SMTP(os.getenv('SMTP_SERVER'), int(os.getenv('SMTP_PORT')))
+        try:
+            server.starttls()
+            server.login(os.getenv('SMTP_USERNAME'), os.getenv('SMTP_PASSWORD'))
+        except Exception:
+            server.close()
+            raise
+        self._smtp = server
+        return server
+
+    def _close_smtp(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                self._smtp.close()
+            self._smtp = None
+
+    def close(self):
+        """
+        Closes any transport kept open between sends.
+        """
+        self._close_smtp()
+        self._outlook = None
 
 # Main script (e.g., if this script is used as an entry point)
 if __name__ == "__main__":
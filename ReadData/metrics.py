@@ -0,0 +1,336 @@
+"""
+In-process metrics for the monitor.
+
+Counters, gauges and histograms are kept in memory and exposed in the
+Prometheus text format over a small local HTTP server (GET /metrics), or as a
+JSON document (GET /metrics.json, or written periodically to a file):
+
+    start_http_server(9108)              # http://127.0.0.1:9108/metrics
+    start_snapshot_writer("metrics.json", interval=60)
+
+Recording a value is a lock, an add and (for histograms) a bisect over the
+bucket bounds, so the hot paths can be instrumented freely. Label children
+should be looked up once (metric.labels(...)) and reused.
+"""
+import bisect
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from loguru import logger
+
+# Seconds; suits ADB round trips, per-row parsing and per-window detection alike
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0)
+
+
+class _Value:
+    def __init__(self):
+        self.value = 0.0
+        self.created = time.monotonic()
+        self._lock = threading.Lock()
+        self._function = None
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+    def set_function(self, function):
+        """Read the value from function() at collection time instead."""
+        self._function = function
+
+    def get(self):
+        if self._function is not None:
+            try:
+                return float(self._function())
+            except Exception:
+                return float("nan")
+        return self.value
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value, count=1):
+        """Record `count` observations of `value` (e.g. a batch average, once per batch)."""
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += count
+            self.sum += value * count
+            self.count += count
+
+    def time(self):
+        return _Timer(self)
+
+    def get(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+
+class _Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Metric:
+    """
+    A named metric with optional labels.
+
+    Parameters
+    ----------
+    name : str
+        Metric name, e.g. "monitor_rows_total".
+    documentation : str
+        Help text.
+    labelnames : tuple of str, optional
+        Label names. Use labels(...) to get the child for a set of values;
+        a metric without labels can be used directly.
+    registry : Registry, optional
+        Where the metric is registered. Defaults to REGISTRY.
+    """
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None, **kwargs):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._kwargs = kwargs
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            # A metric without labels is used directly: bind its only child's methods
+            child = self.labels()
+            for attr in ("inc", "dec", "set", "set_function", "observe", "time"):
+                if hasattr(child, attr):
+                    setattr(self, attr, getattr(child, attr))
+        (registry or REGISTRY).register(self)
+
+    def labels(self, *values, **kwvalues):
+        if kwvalues:
+            values = tuple(str(kwvalues[name]) for name in self.labelnames)
+        else:
+            values = tuple(str(v) for v in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def remove(self, *values):
+        with self._lock:
+            self._children.pop(tuple(str(v) for v in values), None)
+
+    def children(self):
+        with self._lock:
+            return list(self._children.items())
+
+    def _new_child(self):
+        return _Value()
+
+
+class Counter(Metric):
+    type = "counter"
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def _new_child(self):
+        return _HistogramValue(tuple(self._kwargs.get("buckets", DEFAULT_BUCKETS)))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def metrics(self):
+        with self._lock:
+            return list(self._metrics.values())
+
+    def exposition(self):
+        """Prometheus text format (version 0.0.4)."""
+        lines = []
+        for metric in self.metrics():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for values, child in metric.children():
+                if metric.type == "histogram":
+                    counts, total, count = child.get()
+                    cumulative = 0
+                    for bound, n in zip(list(child.buckets) + [float("inf")], counts):
+                        cumulative += n
+                        le = _format_labels(metric.labelnames, values, ("le", _format_value(bound)))
+                        lines.append(f"{metric.name}_bucket{le} {cumulative}")
+                    labels = _format_labels(metric.labelnames, values)
+                    lines.append(f"{metric.name}_sum{labels} {_format_value(total)}")
+                    lines.append(f"{metric.name}_count{labels} {count}")
+                else:
+                    lines.append(f"{metric.name}{_format_labels(metric.labelnames, values)} {_format_value(child.get())}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """{name: [{"labels": {...}, "value": ...} | histogram summary, ...]}"""
+        result = {"timestamp": time.time()}
+        for metric in self.metrics():
+            series = []
+            for values, child in metric.children():
+                entry = {"labels": dict(zip(metric.labelnames, values))}
+                if metric.type == "histogram":
+                    counts, total, count = child.get()
+                    entry.update(count=count, sum=total, mean=total / count if count else None,
+                                 buckets=dict(zip([str(b) for b in child.buckets] + ["+Inf"], counts)))
+                else:
+                    entry["value"] = child.get()
+                    if metric.type == "counter":
+                        # Average rate since the series was created
+                        entry["per_second"] = entry["value"] / max(time.monotonic() - child.created, 1e-9)
+                series.append(entry)
+            result[metric.name] = series
+        return result
+
+
+REGISTRY = Registry()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.startswith("/metrics.json"):
+            body = json.dumps(self.registry.snapshot()).encode()
+            content_type = "application/json"
+        elif self.path.startswith("/metrics"):
+            body = self.registry.exposition().encode()
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host="127.0.0.1", registry=REGISTRY):
+    """Serve /metrics and /metrics.json on a daemon thread. Returns the server, or None if the port is taken."""
+    handler = type("MetricsHandler", (_Handler,), {"registry": registry})
+    try:
+        server = ThreadingHTTPServer((host, port), handler)
+    except OSError as e:
+        logger.warning(f"Metrics endpoint not started on {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"Metrics available at http://{host}:{server.server_port}/metrics")
+    return server
+
+
+def write_snapshot(path, registry=REGISTRY):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(registry.snapshot(), f, indent=4)
+    os.replace(tmp_path, path)
+
+
+def start_snapshot_writer(path, interval=60, registry=REGISTRY):
+    """Write the JSON snapshot to `path` every `interval` seconds on a daemon thread."""
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                write_snapshot(path, registry)
+            except OSError as e:
+                logger.error(f"Failed to write metrics snapshot: {e}")
+
+    thread = threading.Thread(target=loop, name="metrics-snapshot", daemon=True)
+    thread.start()
+    return thread
+
+
+def serve_from_env(registry=REGISTRY):
+    """
+    Start the exporters configured in the environment:
+    METRICS_PORT (default 9108, 0 disables the HTTP endpoint) and
+    METRICS_SNAPSHOT (JSON file, written every METRICS_SNAPSHOT_INTERVAL seconds).
+    """
+    port = int(os.getenv("METRICS_PORT", "9108") or 0)
+    if port:
+        start_http_server(port, registry=registry)
+    snapshot_path = os.getenv("METRICS_SNAPSHOT")
+    if snapshot_path:
+        start_snapshot_writer(snapshot_path, float(os.getenv("METRICS_SNAPSHOT_INTERVAL", "60")), registry)
+
+
+# Metrics shared by the monitor modules
+ADB_COMMAND_SECONDS = Histogram("monitor_adb_command_seconds", "ADB command round trip time", ("command",))
+TAIL_BYTES = Histogram("monitor_tail_bytes_per_poll", "Bytes fetched per tail poll",
+                       buckets=(0, 256, 1024, 4096, 16384, 65536, 262144, 1048576))
+TAIL_BYTES_TOTAL = Counter("monitor_tail_bytes_total", "Bytes fetched by tail polls")
+# Per device, not per file: one series per recording would grow without bound
+ROWS_TOTAL = Counter("monitor_rows_total", "Rows ingested", ("device",))
+PARSE_SECONDS = Histogram("monitor_parse_seconds_per_row", "Time to split and parse one row")
+DETECT_SECONDS = Histogram("monitor_detect_seconds", "Drop/noise detector time per window or batch")
+DETECTION_LAG_SECONDS = Histogram("monitor_detection_lag_seconds",
+                                  "Wall-clock time from a row's timestamp to its detection")
+ALERT_QUEUE_DEPTH = Gauge("monitor_alert_queue_depth", "Alerts waiting to be sent")
+MODEL_LOG_QUEUE_DEPTH = Gauge("monitor_model_log_queue_depth", "Model logs waiting to be uploaded")
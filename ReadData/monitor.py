@@ -0,0 +1,717 @@
+"""
+SmartCare oximeter monitor, shared by the three monitor scripts.
+
+The pipeline is put together from the stage modules:
+
+    transport   adb_client.AdbClient, one per phone (device_manager.DeviceManager)
+    discovery   folder_watcher.FolderWatcher
+    tailer      tailer.FileTailer, resumed from checkpoint_store after a restart
+    parser      row_parser / row_stream
+    detector    detector.RuleSet (detector_rules.json), window_stage.WindowDetector
+    sinks       window_stage.SegmentWriter (csv or .rec segments)
+    alerts      Alerter below, sending through alert_dispatcher.AlertDispatcher
+
+and runs in one of three modes:
+
+    rows      tail each new recording and check every row as it arrives
+              (adb-monitor-script.py)
+    windows   tail each new recording into a ring buffer and check it in
+              10 second windows (adb-monitor-script_V2.py)
+    pull      pull recordings from OximeterData and StreamModel and check
+              StreamModel files as a whole (adb-monitor-script_V3.py)
+
+    python monitor.py --mode windows
+
+Environment:
+    MONITOR_MODE         rows (default), windows or pull
+    ADB_PATH             adb executable (benchmarks/adb for offline runs)
+    ADB_NETWORK_DEVICES  comma-separated "ip" or "ip:port" to keep connected
+    SEGMENT_FOLDER       where segment files go (default depends on the mode)
+    SEGMENT_FORMAT       csv (default) or npy
+    MODEL_LOG_ENABLED    1 to post model logs for flagged windows (windows mode)
+    DETECTOR_RULES       rules file (default detector_rules.json, see detector.py)
+
+Settings can also be put in a .env file in the working directory.
+"""
+import argparse
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+
+from dotenv import load_dotenv
+from loguru import logger
+
+# The modules below read their settings (ALERT_METHOD, DISCOVERY_MODE, ...) from
+# the environment when they are imported, so .env has to be loaded first
+load_dotenv()
+
+from adb_client import AdbClient
+from alert_dispatcher import AlertDispatcher
+from checkpoint_store import Checkpoint, CheckpointStore, replay_rows
+from detector import load_rules
+from device_manager import Device, DeviceManager
+from event_journal import EventJournal
+from folder_watcher import FolderWatcher
+from ingest_scheduler import IngestScheduler
+from log_setup import RowSampler, configure_logging
+from metrics import (ALERT_QUEUE_DEPTH, DETECT_SECONDS, DETECTION_LAG_SECONDS, PARSE_SECONDS, ROWS_TOTAL,
+                     serve_from_env)
+from pipeline_log import get_client, get_mode, get_patients
+from ring_buffer import SessionBuffer
+from row_parser import is_header, parse_row
+from row_stream import read_rows
+from tailer import FileTailer
+from window_stage import ModelLogWriter, SegmentWriter, WindowDetector, WindowStage, WindowSummary
+
+ADB_PATH = os.getenv("ADB_PATH", "./ReadData/platform-tools/adb.exe")  # benchmarks/adb for offline runs
+NETWORK_DEVICES = [ip.strip() for ip in os.getenv("ADB_NETWORK_DEVICES", "").split(",") if ip.strip()]
+
+# Folders on the phone
+PHONE_FOLDER = "/sdcard/Download/OximeterData"
+STREAM_MODEL_FOLDER = "/sdcard/Download/OximeterData/StreamModel"
+ANNOTATION_FOLDER = "/sdcard/Download/OximeterData/Annotation"
+
+# Local archive, organized as <study_code> <DDMMYYYY>/ (see organize_file_path)
+PC_FOLDER = "D:\\24EIc"
+
+# Segments are cut by the rows' own timestamps into windows of this many seconds
+SEGMENT_SECONDS = 180
+# "csv" (stringified lists) or "npy" (columnar .rec bundle)
+SEGMENT_FORMAT = os.getenv("SEGMENT_FORMAT", "csv")
+# Rows of waveform history kept per recording in windows mode (about 17 minutes at one row per second)
+SESSION_HISTORY_ROWS = 1024
+# Recordings tailed (or files pulled) at the same time
+MAX_INGEST_WORKERS = 4
+# A recording is finished (and a file to pull has settled) after this many
+# one-second polls without new bytes
+IDLE_POLLS = 5
+
+MONITOR_MODE = os.getenv("MONITOR_MODE", "rows")
+MODEL_LOG_ENABLED = os.getenv("MODEL_LOG_ENABLED", "0") == "1"
+
+
+class ModeConfig(NamedTuple):
+    segment_folder: Optional[str]           # None: no segment files (pull mode)
+    detect_window_seconds: Optional[float]  # None: check each row as it arrives
+    rules: str                              # rule set in the detector rules file
+    cooldown_minutes: float                 # shared by all alerts; 0 sends every one
+    require_email_mode: bool                # only send while the pipeline API's email mode is on
+    journal_events: bool                    # append detections to device_events.jsonl
+    messages: dict                          # rule name -> (subject, body), over the rules' own texts
+
+
+MODES = {
+    "rows": ModeConfig(
+        segment_folder="D:/24EIc/Test/Data",
+        detect_window_seconds=None,
+        rules="default",
+        cooldown_minutes=5,
+        require_email_mode=False,
+        journal_events=True,
+        messages={"drop": ("Oximeter Drop Detected", "Oximeter Drop detected. Please check the device."),
+                  "noise": ("Data Noise Detected", "Data noise detected. Please check the device.")},
+    ),
+    "windows": ModeConfig(
+        segment_folder="D:/Data/Test",
+        detect_window_seconds=10,
+        # Drop needs 4 rows of the 10 second window; noise alerts are disabled for now
+        rules="windows",
+        cooldown_minutes=0,
+        require_email_mode=True,
+        journal_events=False,
+        messages={"drop": ("Oximeter Drop Detected", "Please check the patient"),
+                  "noise": ("Data Noise Detected", "Please check the device")},
+    ),
+    "pull": ModeConfig(
+        segment_folder=None,
+        detect_window_seconds=None,
+        rules="default",
+        cooldown_minutes=0,
+        require_email_mode=False,
+        journal_events=False,
+        messages={"drop": ("Oximeter Drop Detected", "Please check the patient"),
+                  "noise": ("Noise Detected", "Please check the patient")},
+    ),
+}
+
+
+# ----------------------------------------------------------------------
+# File names and local paths
+# ----------------------------------------------------------------------
+def organize_file_path(filename: str, source_folder: str = PHONE_FOLDER, base_path: str = PC_FOLDER) -> str:
+    """
+    Local path for a file from the phone.
+
+    StreamModel files go to <base_path>/StreamModel; recordings named
+    SmartCareCsv_<study_code>_<DD.MM.YYYY...>_... go to
+    <base_path>/<study_code> <DDMMYYYY>/.
+    """
+    if STREAM_MODEL_FOLDER in source_folder:
+        stream_path = os.path.join(base_path, "StreamModel")
+        os.makedirs(stream_path, exist_ok=True)
+        return os.path.join(stream_path, filename)
+
+    parts = filename.split('_')
+    if len(parts) >= 3:
+        study_code = parts[1]  # 24EIc-003-0011
+        date_parts = parts[2].split('.')  # [02, 12, 2024]
+        # Format date without dots (DDMMYYYY)
+        folder_name = f"{study_code} {''.join(date_parts[:3])}"
+        study_path = os.path.join(base_path, folder_name)
+        os.makedirs(study_path, exist_ok=True)
+        return os.path.join(study_path, filename)
+    return os.path.join(base_path, filename)
+
+
+def extract_research_code(filename):
+    """Extract research code from filename like SmartCareCsv_24EIc-003-001U_26.12.2024.17.14.02_26.12.2024.17.18.43.csv"""
+    match = re.search(r'SmartCareCsv_([^_]+)_', filename)
+    if match:
+        return match.group(1)
+    return None
+
+
+def extract_starttime(filename):
+    """Recording date from the start time in the file name (second to last part), or None."""
+    parts = filename.split('_')
+    if len(parts) < 3:
+        return None
+    try:
+        return datetime.strptime(parts[-2][:10], "%d.%m.%Y").date()
+    except ValueError:
+        logger.error(f"Invalid date format in filename: {filename}")
+        return None
+
+
+def is_temp_file(filename):
+    return "temp" in filename.lower()
+
+
+def is_current_date_file(filename):
+    return extract_starttime(filename) == datetime.now().date()
+
+
+def _log_row_error(line_num, line, e):
+    logger.error(f"Error parsing row {line_num}: {e}")
+
+
+def parse_lines(lines, filename):
+    """Parse a batch of raw lines into SmartCareRows, skipping the header and malformed rows."""
+    records = []
+    start = time.perf_counter()
+    for line in lines:
+        if is_header(line):
+            continue
+        try:
+            records.append(parse_row(line))
+        except ValueError as e:
+            logger.error(f"Skipping malformed row in {filename}: {e}")
+    if records:
+        PARSE_SECONDS.observe((time.perf_counter() - start) / len(records), len(records))
+    return records
+
+
+# ----------------------------------------------------------------------
+# Alerts
+# ----------------------------------------------------------------------
+class Alerter:
+    """
+    Alert stage: records detections and queues alert emails.
+
+    Parameters
+    ----------
+    dispatcher : AlertDispatcher
+        Sends the emails from its own worker thread.
+    messages : dict
+        Alert kind (detector rule name) -> (subject, body).
+    cooldown_minutes : float, default=0
+        After an email is sent, further alerts of any kind are not emailed
+        for this long. 0 emails every alert.
+    journal : EventJournal, optional
+        Every alert is appended to it, emailed or not.
+    require_email_mode : bool, default=False
+        Only email while the pipeline API reports email mode on (get_mode()).
+    """
+
+    def __init__(self, dispatcher, messages, cooldown_minutes=0, journal=None, require_email_mode=False):
+        self.dispatcher = dispatcher
+        self.messages = messages
+        self.cooldown = timedelta(minutes=cooldown_minutes)
+        self.journal = journal
+        self.require_email_mode = require_email_mode
+        self._last_sent = datetime.min
+        self._lock = threading.Lock()  # recordings are ingested concurrently and share the cooldown
+
+    def alert(self, kind, value=None):
+        """Handle one detection. Returns True if an email was queued."""
+        subject, body = self.messages[kind]
+        if self.journal is not None:
+            self._record(kind, body, value)
+        if self.require_email_mode and not get_mode():
+            return False
+        if not self._claim_slot():
+            return False
+        # Queued and sent by the dispatcher's worker over its kept-alive transport
+        self.dispatcher.send(subject, body)
+        return True
+
+    def _claim_slot(self):
+        if not self.cooldown:
+            return True
+        with self._lock:
+            now = datetime.now()
+            if now - self._last_sent > self.cooldown:
+                self._last_sent = now
+                return True
+            return False
+
+    def _record(self, kind, msg, value):
+        entry = {
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "type": kind,
+            "message": msg,
+            "value": value,
+        }
+        try:
+            self.journal.append(entry)
+            logger.debug(f"Event logged: {kind} - {msg}")
+        except Exception as e:
+            logger.error(f"Failed to log event: {e}")
+
+
+# ----------------------------------------------------------------------
+# Checks on a tailed recording
+# ----------------------------------------------------------------------
+class _RowChecks:
+    """rows mode: the rules run over each batch of new rows, alerting per row an alerting rule flags."""
+
+    def __init__(self, monitor, filename):
+        self.filename = filename
+        self.alerter = monitor.alerter
+        self.rules = monitor.rules
+        # Segment files, with a summary line (and the 3 minute verdict) per segment
+        self.segments = WindowStage(SEGMENT_SECONDS, consumers=[
+            SegmentWriter(monitor.segment_folder, extract_research_code(filename), fmt=monitor.segment_format),
+            WindowDetector(self.rules),
+            WindowSummary(filename),
+        ])
+        self.sample_row = RowSampler()
+
+    def replay(self, records):
+        # Refill the open segment; these rows were checked already
+        for record in records:
+            self._push(record)
+
+    def start(self):
+        pass
+
+    def ingest(self, records):
+        # Every rule over all the new rows in one vectorized pass
+        start = time.perf_counter()
+        verdict = self.rules.evaluate_rows(records)
+        DETECT_SECONDS.observe(time.perf_counter() - start)
+        DETECTION_LAG_SECONDS.observe(max(time.time() - datetime.fromisoformat(records[-1].timestamp).timestamp(), 0))
+        flagged = [(rule, verdict[rule.name].rows) for rule in self.rules.alerting]
+
+        for i, record in enumerate(records):
+            # Writes the finished segment file whenever a window boundary is crossed
+            self._push(record)
+            for rule, rows in flagged:
+                if rows[i]:
+                    value = getattr(record, rule.signal)
+                    self.alerter.alert(rule.name, value=value.tolist() if hasattr(value, "tolist") else value)
+            if self.sample_row():
+                logger.debug(f"{self.filename}: row {record.timestamp} hr={record.hr} o2={record.o2}")
+
+    def close(self):
+        # Save the last, partial segment
+        self.segments.close()
+
+    def _push(self, record):
+        try:
+            self.segments.push(record)
+        except ValueError as e:
+            logger.error(f"Row left out of segment in {self.filename}: {e}")
+
+
+class _WindowChecks:
+    """windows mode: rows go into one ring buffer shared by the detection windows and the segments."""
+
+    def __init__(self, monitor, filename):
+        self.monitor = monitor
+        self.filename = filename
+        research_code = extract_research_code(filename)
+        self.patient_id = get_patients().get(research_code) if MODEL_LOG_ENABLED else None
+        # Fixed-size waveform history for this recording, shared by two window stages:
+        # short windows for the checks, 3 minute ones for the segment files
+        self.history = SessionBuffer(SESSION_HISTORY_ROWS)
+        self.segments = WindowStage(SEGMENT_SECONDS, consumers=[
+            SegmentWriter(monitor.segment_folder, research_code, fmt=monitor.segment_format),
+            WindowSummary(filename),
+        ], history=self.history)
+        self.stages = [self.segments]
+        self.sample_row = RowSampler()
+
+    def replay(self, records):
+        # Refill the open segment. The detection stage is created afterwards, so
+        # these rows (checked before the restart) do not raise alerts again.
+        for record in records:
+            if self._append(record):
+                self.segments.update()
+
+    def start(self):
+        alerter = self.monitor.alerter
+        consumers = [WindowDetector(self.monitor.rules, on_alert=lambda rule, window: alerter.alert(rule.name))]
+        if MODEL_LOG_ENABLED:
+            consumers.append(ModelLogWriter(self.patient_id))
+        # Rows are logged as one line per window rather than one line each
+        consumers.append(WindowSummary(self.filename, level="DEBUG"))
+        self.stages.insert(0, WindowStage(self.monitor.config.detect_window_seconds, consumers=consumers,
+                                          history=self.history))
+
+    def ingest(self, records):
+        for record in records:
+            if not self._append(record):
+                continue
+            for stage in self.stages:
+                stage.update()
+            if self.sample_row():
+                logger.debug(f"{self.filename}: row {record.timestamp} hr={record.hr} o2={record.o2}")
+
+    def close(self):
+        # Check and save the last, partial windows
+        for stage in self.stages:
+            stage.close()
+
+    def _append(self, record):
+        """Add a row to the history. False if it was left out (malformed, or older than the last row)."""
+        try:
+            if not self.history.append_row(record):
+                logger.debug(f"Late row {record.timestamp} left out of the history of {self.filename}")
+                return False
+            return True
+        except ValueError as e:
+            logger.error(f"Row left out of the history of {self.filename}: {e}")
+            return False
+
+
+# ----------------------------------------------------------------------
+# Monitor
+# ----------------------------------------------------------------------
+class Monitor:
+    """
+    The monitor pipeline for every attached phone, in one of the MODES.
+
+    Parameters
+    ----------
+    mode : str, default=MONITOR_MODE
+        "rows", "windows" or "pull" (see the module docstring).
+    adb_path : str, default=ADB_PATH
+        adb executable.
+    base_path : str, default=PC_FOLDER
+        Local archive root.
+    segment_folder : str, optional
+        Where segment files go. Defaults to SEGMENT_FOLDER from the
+        environment, then to the mode's own folder.
+    segment_format : str, default=SEGMENT_FORMAT
+        "csv" or "npy".
+    dispatcher : AlertDispatcher, optional
+        Alert sender. By default one is created (see alert_dispatcher.py for
+        choosing the backend).
+    checkpoints : CheckpointStore, optional
+        Ingestion checkpoints. By default CHECKPOINT_DB is used.
+    rules : detector.RuleSet, optional
+        Detector rules. By default the mode's rule set from the rules file.
+    """
+
+    def __init__(self, mode=MONITOR_MODE, adb_path=ADB_PATH, base_path=PC_FOLDER, segment_folder=None,
+                 segment_format=SEGMENT_FORMAT, dispatcher=None, checkpoints=None, rules=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown monitor mode: {mode} (use {', '.join(MODES)})")
+        self.mode = mode
+        self.config = MODES[mode]
+        self.adb_path = adb_path
+        self.base_path = base_path
+        self.segment_folder = segment_folder or os.getenv("SEGMENT_FOLDER") or self.config.segment_folder
+        self.segment_format = segment_format
+        # Compiled once and shared by every recording's checks
+        self.rules = rules if rules is not None else load_rules(self.config.rules)
+
+        # Shared ADB client, resolves the device serial once and reuses the adb server
+        self.adb = AdbClient(adb_path)
+        # Used when the methods below are called without a specific device
+        self.default_device = Device(self.adb)
+        # Byte offset, row count and window position of every recording, kept across restarts
+        self.checkpoints = checkpoints or CheckpointStore()
+        # Alert emails are sent from a queue by one long-lived sender
+        self.dispatcher = dispatcher or AlertDispatcher(use_banana_style=True)
+        ALERT_QUEUE_DEPTH.set_function(lambda: self.dispatcher.queue_depth)
+        # Device events are appended to a JSON Lines journal; `python event_journal.py`
+        # prints the old {"events": [...]} view of it
+        journal = EventJournal("device_events.jsonl") if self.config.journal_events else None
+        messages = {rule.name: (rule.subject or f"{rule.name.replace('_', ' ').capitalize()} detected",
+                                rule.body or "Please check the patient") for rule in self.rules}
+        messages.update(self.config.messages)
+        self.alerter = Alerter(self.dispatcher, messages, self.config.cooldown_minutes, journal,
+                               self.config.require_email_mode)
+        # (device, annotation file) -> FileStat when it was last pulled
+        self.pulled_annotations = {}
+        # Set by run()
+        self.manager = None
+
+    # Transport ---------------------------------------------------------
+    def run_adb_command(self, command, device=None):
+        return (device or self.default_device).client.run(command)
+
+    def local_path(self, filename, source_folder=PHONE_FOLDER):
+        return organize_file_path(filename, source_folder, self.base_path)
+
+    def pull_file(self, filename, source_folder=PHONE_FOLDER, device=None):
+        return self.run_adb_command(["pull", f"{source_folder}/{filename}", self.local_path(filename, source_folder)],
+                                    device)
+
+    def pull_annotation_file(self, device=None, folder=ANNOTATION_FOLDER):
+        """Pull the new or changed .csv files of an annotation folder."""
+        device = device or self.default_device
+        # Names, sizes and mtimes in one call; only new or changed files are pulled
+        files = device.client.stat_files(folder)
+        if files is None:
+            return
+        for filename, stat in files.items():
+            if not filename.endswith(".csv"):
+                continue
+            key = (device.serial, folder, filename)
+            if self.pulled_annotations.get(key) == stat and os.path.exists(self.local_path(filename)):
+                continue
+            if self.pull_file(filename, folder, device) is not None:
+                self.pulled_annotations[key] = stat
+
+    # Tail modes --------------------------------------------------------
+    def read_new_data(self, filename, device=None):
+        """Tail one recording until it stops growing, checking and segmenting the rows."""
+        device = device or self.default_device
+        file_path = self.local_path(filename)
+        # Pick up where the last run left this recording, if it got that far
+        checkpoint = self.checkpoints.get(filename) or Checkpoint()
+        # Only fetch the bytes appended since the last tick
+        tailer = FileTailer(device.client, f"{PHONE_FOLDER}/{filename}", file_path, offset=checkpoint.byte_offset)
+        if tailer.offset != checkpoint.byte_offset:
+            checkpoint = Checkpoint()
+        rows_read = checkpoint.rows
+        rows_counter = ROWS_TOTAL.labels(device.serial or "default")
+
+        checks = (_WindowChecks if self.config.detect_window_seconds else _RowChecks)(self, filename)
+        if checkpoint.byte_offset:
+            replayed = replay_rows(file_path, checkpoint)
+            checks.replay(replayed)
+            logger.info(f"Resuming {filename} at byte {checkpoint.byte_offset} "
+                        f"({checkpoint.rows} rows read before, {len(replayed)} replayed into the open segment)")
+        checks.start()
+        # A stale checkpoint can make the replay complete a window; the open one then starts later
+        window_offset = checkpoint.window_offset
+        window_end = checks.segments.last_end if checks.segments.last_end is not None else checkpoint.window_end
+
+        idle_polls = 0
+        try:
+            while True:
+                batch_start = tailer.consumed
+                new_lines = tailer.poll()
+                if new_lines is None:
+                    logger.error(f"Unexpected error reading file {filename} from device.")
+                    break
+                device.stats.add_bytes(tailer.last_bytes)
+
+                if tailer.last_bytes > 0:
+                    idle_polls = 0
+                    records = parse_lines(new_lines, filename)
+                    if records:
+                        checks.ingest(records)
+                        device.stats.add_rows(len(records))
+                        rows_counter.inc(len(records))
+                        rows_read += len(records)
+                    if new_lines:
+                        # The open segment's rows all come from this batch or later ones
+                        if checks.segments.last_end != window_end:
+                            window_offset, window_end = batch_start, checks.segments.last_end
+                        self.checkpoints.update(filename, Checkpoint(tailer.consumed, rows_read,
+                                                                     window_offset, window_end))
+                else:
+                    # Finish the worker once the recording stops growing
+                    idle_polls += 1
+                    if idle_polls >= IDLE_POLLS:
+                        logger.info(f"File {filename} completed. Total lines read: {rows_read}")
+                        self.checkpoints.update(filename, Checkpoint(tailer.consumed, rows_read,
+                                                                     window_offset, window_end, done=True))
+                        break
+
+                if device.stop_event.wait(1):  # Check every second for new data
+                    break
+        finally:
+            checks.close()
+
+    def process_recording(self, filename, device=None):
+        """Ingestion worker: tail one recording until it stops growing, then clean up"""
+        device = device or self.default_device
+        device.stats.add_file()
+        self.read_new_data(filename, device)
+        # After reading the file, delete the files with "temp" in the name
+        directory = os.path.dirname(self.local_path(filename))
+        for name in os.listdir(directory):
+            if "temp" in name:
+                os.remove(os.path.join(directory, name))
+        self.pull_annotation_file(device)
+
+    # Pull mode ---------------------------------------------------------
+    def wait_until_settled(self, filename, source_folder, device):
+        """
+        List the folder once a second until the file's size and mtime stop changing.
+
+        Returns the settled FileStat, or None if the file went away, the folder
+        could not be listed or the device is stopping.
+        """
+        stat, unchanged = None, 0
+        while True:
+            current = (device.client.stat_files(source_folder) or {}).get(filename)
+            if current is None:
+                return None
+            unchanged = unchanged + 1 if current == stat else 0
+            stat = current
+            if unchanged >= IDLE_POLLS:
+                return stat
+            if device.stop_event.wait(1):
+                return None
+
+    def process_data_file(self, filename, source_folder, device=None, remote_stat=None):
+        """Pull a file once it is complete and, for StreamModel files, check it (remote_stat: its FileStat from the listing)"""
+        device = device or self.default_device
+        key = f"{source_folder}/{filename}"
+        checkpoint = self.checkpoints.get(key)
+
+        def processed(stat):
+            # Already processed at this size by an earlier run: no pull, no repeated alerts
+            return checkpoint is not None and checkpoint.done and stat is not None and checkpoint.byte_offset == stat.size
+
+        if processed(remote_stat):
+            logger.info(f"Skipping {filename}, already processed")
+            return True
+        # New files are reported as soon as they are created (inotify) or listed,
+        # possibly half written: only pull once the writer is done with them
+        remote_stat = self.wait_until_settled(filename, source_folder, device)
+        if remote_stat is None:
+            logger.info(f"Not pulling {filename}: it is gone or the device is stopping")
+            return False
+        if processed(remote_stat):
+            logger.info(f"Skipping {filename}, already processed")
+            return True
+
+        try:
+            filepath = self.local_path(filename, source_folder)
+            # A local copy matching the size from the listing is not pulled again
+            if remote_stat is not None and os.path.exists(filepath) and os.path.getsize(filepath) == remote_stat.size:
+                logger.debug(f"{filename} unchanged on the device, using the local copy")
+            else:
+                self.pull_file(filename, source_folder, device)
+                if os.path.exists(filepath):
+                    device.stats.add_bytes(os.path.getsize(filepath))
+            device.stats.add_file()
+
+            if STREAM_MODEL_FOLDER in source_folder:
+                records = list(read_rows(filepath, on_error=_log_row_error))
+                device.stats.add_rows(len(records))
+                ROWS_TOTAL.labels(device.serial or "default").inc(len(records))
+                with DETECT_SECONDS.time():
+                    verdict = self.rules.evaluate_rows(records)
+                logger.debug(f"{filename}: flagged rows {verdict.summary()}")
+                for rule in verdict.fired:
+                    logger.info(f"{rule.name} detected in file {filename}")
+                    if rule.alert:
+                        self.alerter.alert(rule.name)
+
+            self.checkpoints.update(key, Checkpoint(byte_offset=os.path.getsize(filepath), done=True))
+            logger.info(f"Processing completed for file: {filename}")
+            return True
+        except Exception as e:
+            logger.error(f"Error processing file {filename}: {e}")
+            return False
+
+    # Pipeline ----------------------------------------------------------
+    def monitor_folders(self, device=None):
+        """Per-device pipeline: hand every new recording of today to a worker until the device goes away."""
+        device = device or self.default_device
+        pull = self.mode == "pull"
+        folders = [PHONE_FOLDER, STREAM_MODEL_FOLDER] if pull else [PHONE_FOLDER]
+        # Each new file gets its own worker so discovery keeps running
+        scheduler = IngestScheduler(max_workers=MAX_INGEST_WORKERS, stop_event=device.stop_event)
+        # New files are streamed from one persistent adb shell on the phone, or
+        # polled faster while files are being ingested (see folder_watcher.py)
+        watcher = FolderWatcher(device.client, folders)
+
+        try:
+            for folder, filename in watcher.watch(device.stop_event, busy=scheduler.active_keys):
+                if not filename.endswith(".csv"):
+                    continue
+                if pull and folder == PHONE_FOLDER and is_temp_file(filename):
+                    logger.info(f"Skipping temp file: {filename}")
+                    continue
+                if not is_current_date_file(filename):
+                    logger.info(f"Skipping file from different date: {filename}")
+                    continue
+                logger.info(f"New CSV file detected in {folder}: {filename}")
+                if pull:
+                    scheduler.submit((folder, filename), self.process_data_file, filename, folder, device,
+                                     watcher.file_stat(folder, filename))
+                else:
+                    scheduler.submit(filename, self.process_recording, filename, device)
+        finally:
+            # Device went away or the monitor is stopping: stop the workers (their
+            # checkpoints let the next run resume) and wait for them to exit
+            scheduler.shutdown(wait=True)
+
+    def run(self, network_devices=NETWORK_DEVICES):
+        """Run a pipeline per attached phone, started and stopped on hot-plug, until interrupted."""
+        # Prometheus text on http://127.0.0.1:9108/metrics unless METRICS_PORT=0
+        serve_from_env()
+        if MODEL_LOG_ENABLED or self.config.require_email_mode:
+            # Starts fetching the patient map and email mode, so they are cached
+            # by the time the first recording looks them up
+            get_client()
+        self.manager = DeviceManager(self.adb_path, self.monitor_folders, network_devices=network_devices)
+        self.manager.run()
+
+    def stop(self, timeout=None):
+        """Stop every device pipeline (waiting up to `timeout` seconds for each), then send the queued alerts."""
+        if self.manager is not None:
+            self.manager.stop()
+            self.manager.stop_all(timeout)
+        # Delivers what the pipelines queued and closes the kept-alive transport
+        self.dispatcher.close()
+
+
+def main(argv=None, default_mode=None):
+    parser = argparse.ArgumentParser(description="Monitor SmartCare oximeter recordings on attached phones")
+    parser.add_argument("--mode", choices=list(MODES), default=default_mode or MONITOR_MODE)
+    parser.add_argument("--log-file", default="file_watch.log")
+    args = parser.parse_args(argv)
+
+    # Console and file sinks, enqueued and written by loguru's own thread
+    configure_logging(args.log_file)
+    monitor = None
+    try:
+        monitor = Monitor(args.mode)
+        logger.info(f"Starting ADB Monitor ({args.mode} mode)...")
+        logger.info(f"Log file will be saved as: {args.log_file}")
+        logger.info(f"Monitoring folders: {', '.join([PHONE_FOLDER, STREAM_MODEL_FOLDER] if args.mode == 'pull' else [PHONE_FOLDER])}")
+        monitor.run()
+    except KeyboardInterrupt:
+        logger.info("Script stopped by user")
+        if monitor is not None:
+            monitor.stop()
+    except Exception as e:
+        logger.exception(f"Unexpected error occurred: {e}")
+
+
+if __name__ == "__main__":
+    main()
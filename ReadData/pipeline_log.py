@@ -1,40 +1,435 @@
-import requests
-from datetime import datetime, date,time
+import atexit
+import collections
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime, date
 import json
 
-def get_mode(): 
-    # API request 
-    r = requests.get('http://localhost:8080/api/logs/system_log/') 
-    data = r.json() 
-    return data['email_mode']
-# Get list patient code and id
-def get_patients(): 
-    # API request 
-    r = requests.get('http://localhost:8080/api/patients/') 
-    data = r.json() 
-    # print(data)
-    # Create a dictionary to map reasons to their IDs
-    patients_dict = {item['study_code']: item['id'] for item in data}
-    # print(patients_dict)
-    return patients_dict
-# Post model log
-def post_pipeline_log(patient_id, content, raw_content):
-    # Prepare the JSON data with proper date and time objects
-    log_data = {
+from loguru import logger
+
+from metrics import MODEL_LOG_QUEUE_DEPTH
+
+# Base URL of the local pipeline API
+API_BASE_URL = os.getenv("PIPELINE_API_URL", "http://localhost:8080/api")
+# Where queued model logs are spilled while the API is unreachable
+MODEL_LOG_SPOOL = os.getenv("MODEL_LOG_SPOOL", "model_log_spool.jsonl")
+
+
+def _to_json(value):
+    # DataFrames / numpy values that json.dumps can't handle on its own
+    if hasattr(value, "to_dict"):
+        return value.to_dict(orient="list")
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+
+def make_log_entry(patient_id, content, raw_content):
+    """Build the model_log payload. raw_content is serialized later, by whoever sends it."""
+    now = datetime.now()
+    return {
         "patient_id": int(patient_id),
         "content": str(content),
-        "raw_content": json.dumps(raw_content),  # JSON-serialized data
-        "date": datetime.now().date().isoformat(),  # Format: YYYY-MM-DD
-        "time": datetime.now().time().strftime("%H:%M:%S")  # Format: HH:MM:SS
+        "raw_content": raw_content,
+        "date": now.date().isoformat(),  # Format: YYYY-MM-DD
+        "time": now.time().strftime("%H:%M:%S")  # Format: HH:MM:SS
     }
-    header = {"Content-Type": "application/json"}
-    # API request
-    r = requests.post('http://localhost:8080/api/logs/model_log/', json=log_data, headers=header)
-    if r.status_code == 200:
-        print("Post model log successfully")
-    else:
-        print("Error post model log")
+
+
+def serialize_entry(entry):
+    """Return the payload for an entry, with raw_content JSON-serialized as the API expects."""
+    return dict(entry, raw_content=json.dumps(entry["raw_content"], default=_to_json))
+
+
+class PipelineLogClient:
+    """
+    Keep-alive client for the local pipeline API.
+
+    All requests go through one pooled requests.Session, so repeated calls reuse
+    the same TCP connection. The `study_code -> id` patient map and the
+    `email_mode` flag are fetched by a background thread, started with the
+    client, and cached for `ttl` seconds, so callers get the last known value
+    without waiting on the API. Until the first fetch succeeds (or while the
+    API is down and nothing was fetched yet) lookups return an empty default.
+
+    Parameters
+    ----------
+    base_url : str
+        API root, e.g. "http://localhost:8080/api".
+    ttl : float, default=60
+        Seconds after which cached values are refreshed.
+    timeout : float, default=5
+        Request timeout in seconds.
+    """
+
+    def __init__(self, base_url=API_BASE_URL, ttl=60, timeout=5):
+        self.base_url = base_url.rstrip('/')
+        self.ttl = ttl
+        self.timeout = timeout
+
+        # requests (with urllib3 and certifi) is only loaded once a client is needed
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._cache = {}        # name -> (value, fetched_at)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+        self._refresher = None
+        # Fetch everything right away, in the background
+        self._wake.set()
+        self._ensure_refresher()
+
+    # ------------------------------------------------------------------
+    # Direct API calls
+    # ------------------------------------------------------------------
+    def fetch_mode(self):
+        r = self.session.get(f"{self.base_url}/logs/system_log/", timeout=self.timeout)
+        r.raise_for_status()
+        return r.json()['email_mode']
+
+    def fetch_patients(self):
+        r = self.session.get(f"{self.base_url}/patients/", timeout=self.timeout)
+        r.raise_for_status()
+        # Create a dictionary to map study codes to their IDs
+        return {item['study_code']: item['id'] for item in r.json()}
+
+    def post_pipeline_log(self, patient_id, content, raw_content):
+        return self.post_entry(serialize_entry(make_log_entry(patient_id, content, raw_content))) == 200
+
+    def post_entry(self, log_data):
+        """POST one serialized model log payload. Returns the HTTP status code."""
+        header = {"Content-Type": "application/json"}
+        r = self.session.post(f"{self.base_url}/logs/model_log/", json=log_data, headers=header, timeout=self.timeout)
+        return r.status_code
+
+    # ------------------------------------------------------------------
+    # Cached lookups
+    # ------------------------------------------------------------------
+    def get_mode(self):
+        return self._cached("email_mode", default=False)
+
+    def get_patients(self):
+        return self._cached("patients", default={})
+
+    def _cached(self, name, default):
+        # Never waits for the API: a missing or expired value is left to the background thread
+        with self._lock:
+            entry = self._cache.get(name)
+        if entry is None or time.monotonic() - entry[1] > self.ttl:
+            self._ensure_refresher()
+            self._wake.set()
+        return default if entry is None else entry[0]
+
+    def _refresh(self, name, fetch):
+        import requests
+
+        try:
+            value = fetch()
+        except (requests.RequestException, ValueError, KeyError) as e:
+            logger.error(f"Failed to refresh {name}: {e}")
+            return None
+        with self._lock:
+            self._cache[name] = (value, time.monotonic())
+        return value
+
+    def _ensure_refresher(self):
+        with self._lock:
+            if self._refresher is None or not self._refresher.is_alive():
+                self._refresher = threading.Thread(target=self._refresh_loop, name="pipeline-api-refresh", daemon=True)
+                self._refresher.start()
+
+    def _refresh_loop(self):
+        fetchers = {"email_mode": self.fetch_mode, "patients": self.fetch_patients}
+        while not self._closed.is_set():
+            self._wake.wait(self.ttl)
+            self._wake.clear()
+            if self._closed.is_set():
+                break
+            now = time.monotonic()
+            for name, fetch in fetchers.items():
+                with self._lock:
+                    entry = self._cache.get(name)
+                if entry is None or now - entry[1] > self.ttl:
+                    self._refresh(name, fetch)
+            # Don't hammer an API that is down when lookups keep waking us
+            self._closed.wait(self.timeout)
+
+    def close(self):
+        self._closed.set()
+        self._wake.set()
+        self.session.close()
+
+
+class ModelLogUploader:
+    """
+    Background uploader for model logs.
+
+    submit() only timestamps the entry and queues it; a worker thread
+    serializes raw_content and POSTs the entries in batches of up to
+    `batch_size` over the client's keep-alive session. Failed sends (network
+    errors, 5xx, 408/429) are retried with exponential backoff and jitter;
+    other 4xx responses are logged and dropped. At most `max_pending` entries
+    are kept in memory: the rest are serialized and appended to a JSON Lines
+    spool file, which is drained once the in-memory backlog has been sent and
+    is picked up again on the next start.
+
+    Parameters
+    ----------
+    client : PipelineLogClient, optional
+        Client used to send. Defaults to the shared client.
+    spool_path : str, default=MODEL_LOG_SPOOL
+        Spill file for entries that don't fit in memory.
+    batch_size : int, default=50
+        Entries sent per wake-up of the worker.
+    flush_interval : float, default=2.0
+        Seconds a partial batch may wait before being sent.
+    max_pending : int, default=1000
+        In-memory cap on queued entries.
+    backoff : float, default=1.0
+        First retry delay in seconds, doubled after each failed attempt.
+    max_backoff : float, default=60.0
+        Upper bound on the retry delay.
+    """
+
+    def __init__(self, client=None, spool_path=MODEL_LOG_SPOOL, batch_size=50, flush_interval=2.0,
+                 max_pending=1000, backoff=1.0, max_backoff=60.0):
+        self.client = client
+        self.spool_path = spool_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self._inbox = queue.SimpleQueue()
+        self._pending = collections.deque()
+        self._spooled = self._count_spooled()
+        self._spool_offset = 0
+        self._failures = 0
+        self._retry_at = 0.0
+        self._worker = None
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.dropped = 0
+        atexit.register(self.close)
+
+    @property
+    def queue_depth(self):
+        """Entries waiting to be sent: queued, in memory and spilled to disk."""
+        return self._inbox.qsize() + len(self._pending) + self._spooled
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue_depth,
+            "in_memory": self._inbox.qsize() + len(self._pending),
+            "spooled": self._spooled,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "consecutive_failures": self._failures,
+        }
+
+    def submit(self, patient_id, content, raw_content):
+        """Queue one model log. Never blocks on the API."""
+        self._inbox.put(make_log_entry(patient_id, content, raw_content))
+        self._ensure_worker()
+
+    def close(self, timeout=10):
+        """Try to send what is queued, then spill the rest to disk and stop the worker."""
+        with self._lock:
+            worker = self._worker
+            self._worker = None
+        if worker is not None:
+            self._inbox.put(None)
+            worker.join(timeout)
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="model-log-uploader", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        client = self.client or get_client()
+        last_send = time.monotonic()
+        closing = False
+        while not closing:
+            # Wait for new entries until the next batch is due
+            if self._retry_at:
+                wait = self._retry_at - time.monotonic()
+            else:
+                wait = last_send + self.flush_interval - time.monotonic()
+            try:
+                item = self._inbox.get(timeout=max(wait, 0.01))
+                closing = item is None
+                while not closing:
+                    self._accept(item)
+                    try:
+                        item = self._inbox.get_nowait()
+                    except queue.Empty:
+                        break
+                    closing = item is None
+            except queue.Empty:
+                pass
+            self._spill_excess()
+
+            now = time.monotonic()
+            if self._retry_at and now < self._retry_at and not closing:
+                continue
+            if closing or len(self._pending) >= self.batch_size or now - last_send >= self.flush_interval:
+                if not self._pending and self._spooled:
+                    self._load_spooled()
+                self._send_batch(client)
+                last_send = time.monotonic()
+
+        # Whatever could not be delivered is kept for the next run
+        self._compact_spool()
+        self._spill(list(self._pending))
+        self._pending.clear()
+
+    def _accept(self, entry):
+        try:
+            self._pending.append(serialize_entry(entry))
+        except (TypeError, ValueError) as e:
+            self.dropped += 1
+            logger.error(f"Cannot serialize model log '{entry['content']}': {e}")
+
+    def _send_batch(self, client):
+        import requests
+
+        for _ in range(min(self.batch_size, len(self._pending))):
+            entry = self._pending[0]
+            try:
+                status = client.post_entry(entry)
+            except (requests.RequestException, OSError) as e:
+                self._schedule_retry(f"Failed to post model log: {e}")
+                return
+            if 200 <= status < 300:
+                self.sent += 1
+            elif status >= 500 or status in (408, 429):
+                self._schedule_retry(f"Model log API returned {status}")
+                return
+            else:
+                self.dropped += 1
+                logger.error(f"Model log rejected with status {status}, dropping it")
+            self._pending.popleft()
+        self._failures = 0
+        self._retry_at = 0.0
+
+    def _schedule_retry(self, message):
+        delay = min(self.max_backoff, self.backoff * (2 ** self._failures))
+        delay *= random.uniform(0.5, 1.0)
+        self._failures += 1
+        self._retry_at = time.monotonic() + delay
+        logger.error(f"{message}; {self.queue_depth} pending, retrying in {delay:.1f}s")
+
+    def _spill_excess(self):
+        excess = len(self._pending) - self.max_pending
+        if excess > 0:
+            # Keep the oldest entries in memory; newer ones go to disk
+            self._spill([self._pending.pop() for _ in range(excess)][::-1])
+
+    def _spill(self, entries):
+        if not entries:
+            return
+        try:
+            with open(self.spool_path, "a", encoding="utf-8") as f:
+                for entry in entries:
+                    f.write(json.dumps(entry) + "\n")
+        except (OSError, TypeError, ValueError) as e:
+            self.dropped += len(entries)
+            logger.error(f"Failed to spill {len(entries)} model logs to {self.spool_path}: {e}")
+            return
+        self._spooled += len(entries)
+
+    def _count_spooled(self):
+        try:
+            with open(self.spool_path, "r", encoding="utf-8") as f:
+                return sum(1 for line in f if line.strip())
+        except FileNotFoundError:
+            return 0
+
+    def _load_spooled(self):
+        """Move the next batch of spilled entries back into memory."""
+        try:
+            with open(self.spool_path, "r", encoding="utf-8") as f:
+                f.seek(self._spool_offset)
+                for _ in range(self.batch_size):
+                    line = f.readline()
+                    if not line:
+                        break
+                    if line.strip():
+                        self._pending.append(json.loads(line))
+                        self._spooled -= 1
+                self._spool_offset = f.tell()
+                exhausted = not f.readline()
+        except FileNotFoundError:
+            self._spooled = 0
+            self._spool_offset = 0
+            return
+        if exhausted:
+            os.remove(self.spool_path)
+            self._spooled = 0
+            self._spool_offset = 0
+
+    def _compact_spool(self):
+        """Drop the already reloaded head of the spool file so it is not sent twice."""
+        if not self._spool_offset:
+            return
+        try:
+            with open(self.spool_path, "r", encoding="utf-8") as f:
+                f.seek(self._spool_offset)
+                rest = f.read()
+            with open(self.spool_path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(rest)
+            os.replace(self.spool_path + ".tmp", self.spool_path)
+        except OSError as e:
+            logger.error(f"Failed to compact {self.spool_path}: {e}")
+        self._spool_offset = 0
+
+
+# Shared client and uploader used by the module-level helpers below
+_default_client = None
+_default_uploader = None
+_default_client_lock = threading.Lock()
+
+
+def get_client():
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = PipelineLogClient()
+        return _default_client
+
+
+def get_uploader():
+    global _default_uploader
+    with _default_client_lock:
+        if _default_uploader is None:
+            _default_uploader = ModelLogUploader()
+            MODEL_LOG_QUEUE_DEPTH.set_function(lambda: _default_uploader.queue_depth)
+        return _default_uploader
+
+
+def get_mode():
+    # Cached, refreshed in the background
+    return get_client().get_mode()
+# Get list patient code and id
+def get_patients():
+    # Cached, refreshed in the background
+    return get_client().get_patients()
+# Post model log (queued, sent in the background by the shared uploader)
+def post_pipeline_log(patient_id, content, raw_content):
+    get_uploader().submit(patient_id, content, raw_content)
 
 
 if __name__ == "__main__":
-    print("This is the pipeline log module")
\ No newline at end of file
+    print("This is the pipeline log module")
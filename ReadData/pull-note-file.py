@@ -1,27 +1,24 @@
-from adb_monitor_script import (
-    organize_file_path,
-    pull_file,
-    read_lines_excluding_last,
-    extract_starttime
-)
+"""
+Pull the note files from the phone's Annotate folder into the local archive.
 
+Only new or changed .csv files are pulled (see Monitor.pull_annotation_file).
+"""
+import os
 
-sys.path.append("D:\SetUp\ReadData\platform-tools")
-print(sys.path)
+from loguru import logger
 
-# Path to the ADB executable
-ADB_PATH = "./ReadData/platform-tools/adb.exe"
+from monitor import Monitor
 
-# Path to the folder on the phone where the CSV file will be created
+# Path to the ADB executable
+ADB_PATH = os.getenv("ADB_PATH", "./ReadData/platform-tools/adb.exe")  # benchmarks/adb for offline runs
 
+# Path to the folder on the phone where the note files are created
 PHONE_FOLDER = "/sdcard/Download/OximeterData/Annotate"
 
-
 # Path to save files on your computer
-PC_FOLDER = r"D:/24EIc"
-
-# Dictionary to track data read from each file
-file_data_count = defaultdict(int)
+PC_FOLDER = "D:\\24EIc"
 
-# Dictionary to store the line number where we left off
-file_line_count = defaultdict(int)
\ No newline at end of file
+if __name__ == "__main__":
+    monitor = Monitor(adb_path=ADB_PATH, base_path=PC_FOLDER)
+    logger.info(f"Pulling note files from {PHONE_FOLDER}")
+    monitor.pull_annotation_file(folder=PHONE_FOLDER)
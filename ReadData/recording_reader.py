@@ -0,0 +1,127 @@
+"""
+Memory-mapped access to archived recordings for offline review and training.
+
+Bundles written by recording_store.py live in the same folders as the raw
+CSVs, i.e. <base_path>/<study_code> <DDMMYYYY>/ (see organize_file_path).
+Columns are opened with np.load(mmap_mode="r"), and a time range is located
+with a binary search on the timestamp column, so a query only touches the
+pages it returns. The returned arrays are read-only views into the files.
+"""
+import glob
+import os
+from datetime import date, datetime, time, timedelta, timezone
+
+import numpy as np
+
+from recording_store import ARRAY_COLUMNS, BUNDLE_SUFFIX, SCALAR_COLUMNS, read_meta, timestamp_to_us
+
+DEFAULT_BASE_PATH = "D:\\24EIc"
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def study_folder(study_code, day, base_path=DEFAULT_BASE_PATH):
+    """Folder that organize_file_path uses for a study code and recording date."""
+    return os.path.join(base_path, f"{study_code} {day:%d%m%Y}")
+
+
+def _to_us(value, utc_offset_seconds):
+    """Convert a datetime/ISO string to epoch microseconds. Naive values are taken as device local time."""
+    if value is None or isinstance(value, (int, np.integer)):
+        return value
+    if isinstance(value, str):
+        return timestamp_to_us(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone(timedelta(seconds=utc_offset_seconds)))
+    return (value - _EPOCH) // timedelta(microseconds=1)
+
+
+class Recording:
+    """
+    One recording session stored as a bundle, opened lazily with memory maps.
+
+    Columns are only mapped when first accessed, and nothing is read from disk
+    until the returned views are used.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.meta = read_meta(path)
+        self._columns = {}
+
+    def __len__(self):
+        return self.meta["rows"]
+
+    def column(self, name):
+        if name not in SCALAR_COLUMNS and name not in ARRAY_COLUMNS:
+            raise KeyError(name)
+        if name not in self._columns:
+            self._columns[name] = np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+        return self._columns[name]
+
+    @property
+    def timestamps(self):
+        return self.column("timestamp")
+
+    def time_bounds(self):
+        """(first, last) timestamp in epoch microseconds, or None for an empty recording."""
+        ts = self.timestamps
+        if len(ts) == 0:
+            return None
+        return int(ts[0]), int(ts[-1])
+
+    def index_range(self, start=None, end=None):
+        """Row slice [lo, hi) whose timestamps fall within [start, end]."""
+        offset = self.meta.get("utc_offset_seconds", 0)
+        ts = self.timestamps
+        lo = 0 if start is None else int(np.searchsorted(ts, _to_us(start, offset), side="left"))
+        hi = len(ts) if end is None else int(np.searchsorted(ts, _to_us(end, offset), side="right"))
+        return lo, max(lo, hi)
+
+    def read(self, start=None, end=None, columns=None):
+        """
+        Return {column: view} for rows within [start, end].
+
+        The arrays are zero-copy, read-only views on the memory-mapped files.
+        """
+        lo, hi = self.index_range(start, end)
+        names = columns or list(SCALAR_COLUMNS) + list(ARRAY_COLUMNS)
+        return {name: self.column(name)[lo:hi] for name in names}
+
+
+def list_recordings(study_code, day, base_path=DEFAULT_BASE_PATH):
+    """Bundle paths for one study code and recording date, in file name (start time) order."""
+    return sorted(glob.glob(os.path.join(glob.escape(study_folder(study_code, day, base_path)), f"*{BUNDLE_SUFFIX}")))
+
+
+def read_range(study_code, start, end, columns=None, base_path=DEFAULT_BASE_PATH):
+    """
+    Return [(Recording, {column: view}), ...] for every session of a patient that
+    overlaps [start, end]. Sessions outside the range are skipped after reading
+    only their metadata and first/last timestamp.
+    """
+    if not isinstance(start, date) or not isinstance(end, date):
+        raise TypeError("start and end must be dates or datetimes")
+    # Whole days when plain dates are given
+    if not isinstance(start, datetime):
+        start = datetime.combine(start, time.min)
+    if not isinstance(end, datetime):
+        end = datetime.combine(end, time.max)
+    start_day, end_day = start.date(), end.date()
+
+    results = []
+    day = start_day - timedelta(days=1)  # a session may start the day before and run past midnight
+    while day <= end_day:
+        for path in list_recordings(study_code, day, base_path):
+            recording = Recording(path)
+            bounds = recording.time_bounds()
+            if bounds is None:
+                continue
+            offset = recording.meta.get("utc_offset_seconds", 0)
+            if bounds[1] < _to_us(start, offset) or bounds[0] > _to_us(end, offset):
+                continue
+            views = recording.read(start, end, columns)
+            if len(views[next(iter(views))]):
+                results.append((recording, views))
+        day += timedelta(days=1)
+    return results
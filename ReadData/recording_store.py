@@ -0,0 +1,280 @@
+"""
+Compact columnar storage for SmartCare oximeter recordings.
+
+A recording is stored as a directory bundle (`<name>.rec/`) holding one `.npy`
+file per column plus a `meta.json`:
+
+    meta.json          {"format": "smartcare-npy", "version": 1, "rows": N,
+                        "samples_per_row": W, "device_ids": [...],
+                        "utc_offset_seconds": ..., "source": ...}
+    timestamp.npy      int64 (N,)      microseconds since the Unix epoch (UTC)
+    device.npy         uint8 (N,)      index into meta["device_ids"]
+    battery.npy        int16 (N,)
+    hr.npy             int16 (N,)
+    o2.npy             int16 (N,)
+    spo2_status.npy    uint8 (N, W)
+    pleth.npy          int32 (N, W)
+    red.npy            int32 (N, W)
+    ir.npy             int32 (N, W)
+    perfusion.npy      float64 (N, W)   exactly the parsed values (version 1: float32)
+
+Every column is a plain .npy file, so it can be opened with
+np.load(..., mmap_mode="r") and sliced without reading the rest of the bundle.
+"""
+import glob
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from row_parser import is_header, parse_row
+
+FORMAT_NAME = "smartcare-npy"
+FORMAT_VERSION = 2
+BUNDLE_SUFFIX = ".rec"
+
+SCALAR_COLUMNS = {
+    "timestamp": np.int64,
+    "device": np.uint8,
+    "battery": np.int16,
+    "hr": np.int16,
+    "o2": np.int16,
+}
+ARRAY_COLUMNS = {
+    "spo2_status": np.uint8,
+    "pleth": np.int32,
+    "red": np.int32,
+    "ir": np.int32,
+    "perfusion": np.float64,
+}
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def timestamp_to_us(text):
+    """Convert a SmartCare timestamp ("2025-02-11 14:59:00.455000+07:00") to epoch microseconds."""
+    dt = datetime.fromisoformat(text)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - _EPOCH) // timedelta(microseconds=1)
+
+
+def bundle_path(csv_path):
+    """Return the bundle path that sits next to a SmartCareCsv file."""
+    return os.path.splitext(csv_path)[0] + BUNDLE_SUFFIX
+
+
+class RecordingWriter:
+    """
+    Accumulate parsed rows (SmartCareRow) and write them as a bundle on close().
+
+    Columns are kept in preallocated arrays that grow by doubling, so appending
+    a row copies its values into place without creating Python lists.
+    """
+
+    def __init__(self, path, source=None, capacity=256):
+        self.path = path
+        self.source = source
+        self.rows = 0
+        self.samples_per_row = None
+        self.utc_offset_seconds = None
+        self._capacity = capacity
+        self._device_ids = {}
+        self._columns = None
+
+    def _allocate(self, width):
+        self.samples_per_row = width
+        self._columns = {name: np.empty(self._capacity, dtype) for name, dtype in SCALAR_COLUMNS.items()}
+        self._columns.update({name: np.empty((self._capacity, width), dtype) for name, dtype in ARRAY_COLUMNS.items()})
+
+    def _grow(self):
+        self._capacity *= 2
+        for name, column in self._columns.items():
+            grown = np.empty((self._capacity,) + column.shape[1:], column.dtype)
+            grown[:self.rows] = column[:self.rows]
+            self._columns[name] = grown
+
+    def append(self, row):
+        """Append one SmartCareRow. Raises ValueError if its arrays do not match the bundle width."""
+        if self._columns is None:
+            self._allocate(len(row.pleth))
+        width = self.samples_per_row
+        for name in ARRAY_COLUMNS:
+            if len(getattr(row, name)) != width:
+                raise ValueError(f"{name} has {len(getattr(row, name))} samples, expected {width}")
+        if row.spo2_status.size and (row.spo2_status.min() < 0 or row.spo2_status.max() > 255):
+            raise ValueError("spo2_status code out of range")
+
+        if self.rows == self._capacity:
+            self._grow()
+        i = self.rows
+        cols = self._columns
+        cols["timestamp"][i] = timestamp_to_us(row.timestamp)
+        if self.utc_offset_seconds is None:
+            offset = datetime.fromisoformat(row.timestamp).utcoffset()
+            self.utc_offset_seconds = int(offset.total_seconds()) if offset is not None else 0
+        cols["device"][i] = self._device_ids.setdefault(row.device_id, len(self._device_ids))
+        cols["battery"][i] = row.battery
+        cols["hr"][i] = row.hr
+        cols["o2"][i] = row.o2
+        for name in ARRAY_COLUMNS:
+            cols[name][i] = getattr(row, name)
+        self.rows += 1
+
+    def close(self):
+        """Write the bundle atomically (to a temporary directory that is then renamed)."""
+        if self._columns is None:
+            self._allocate(0)
+        columns = {name: column[:self.rows] for name, column in self._columns.items()}
+        device_ids = sorted(self._device_ids, key=self._device_ids.get)
+        return write_bundle(self.path, columns, device_ids, self.utc_offset_seconds or 0, self.source)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+
+
+def write_bundle(path, columns, device_ids, utc_offset_seconds=0, source=None):
+    """
+    Write {column: array} as a bundle at `path`, atomically.
+
+    Columns are cast to the bundle dtypes; every column must have the same
+    number of rows.
+    """
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    rows = len(columns["timestamp"])
+    width = columns["pleth"].shape[1] if columns["pleth"].ndim == 2 else 0
+    for name, dtype in list(SCALAR_COLUMNS.items()) + list(ARRAY_COLUMNS.items()):
+        np.save(os.path.join(tmp_path, f"{name}.npy"), np.asarray(columns[name]).astype(dtype, copy=False))
+    meta = {
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "rows": rows,
+        "samples_per_row": width if rows else None,
+        "device_ids": list(device_ids),
+        "utc_offset_seconds": utc_offset_seconds,
+        "source": source,
+    }
+    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=4)
+
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def join_bundles(path, parts, source=None):
+    """
+    Write the rows of several bundles, in order, as one bundle at `path`.
+
+    Device indices are remapped onto the joined device_ids; the UTC offset is
+    that of the first part holding rows.
+    """
+    loaded = [load_recording(part, mmap_mode="r") for part in parts]
+    holding = [(meta, columns) for meta, columns in loaded if meta["rows"]] or loaded[:1]
+    device_ids = {}
+    pieces = {name: [] for name in list(SCALAR_COLUMNS) + list(ARRAY_COLUMNS)}
+    for meta, columns in holding:
+        remap = np.array([device_ids.setdefault(d, len(device_ids)) for d in meta["device_ids"]], np.uint8)
+        for name, column in columns.items():
+            pieces[name].append(remap[column] if name == "device" and len(remap) else column)
+    joined = {name: np.concatenate(arrays) for name, arrays in pieces.items()}
+    return write_bundle(path, joined, sorted(device_ids, key=device_ids.get),
+                        holding[0][0]["utc_offset_seconds"], source)
+
+
+def read_meta(path):
+    with open(os.path.join(path, "meta.json"), "r") as f:
+        meta = json.load(f)
+    if meta.get("format") != FORMAT_NAME:
+        raise ValueError(f"{path} is not a {FORMAT_NAME} bundle")
+    return meta
+
+
+def load_recording(path, mmap_mode=None):
+    """
+    Load a bundle. Returns (meta, columns) where columns maps column name to array.
+
+    Pass mmap_mode="r" to memory-map the columns instead of reading them.
+    """
+    meta = read_meta(path)
+    columns = {}
+    for name in list(SCALAR_COLUMNS) + list(ARRAY_COLUMNS):
+        columns[name] = np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+    return meta, columns
+
+
+def convert_csv(csv_path, out_path=None, logger=None):
+    """Convert an existing SmartCareCsv file into a bundle. Malformed rows are skipped."""
+    out_path = out_path or bundle_path(csv_path)
+    skipped = 0
+    with open(csv_path, "r") as f, RecordingWriter(out_path, source=os.path.basename(csv_path)) as writer:
+        for line_num, line in enumerate(f, start=1):
+            if not line.strip() or is_header(line):
+                continue
+            try:
+                writer.append(parse_row(line))
+            except (ValueError, IndexError) as e:
+                skipped += 1
+                if logger is not None:
+                    logger.error(f"Skipping row {line_num} of {csv_path}: {e}")
+    return out_path, skipped
+
+
+def _dir_size(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def _benchmark(pattern, repeat=20):
+    import ast
+    import tempfile
+
+    import pandas as pd
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for csv_path in sorted(glob.glob(pattern)):
+            out_path = os.path.join(tmp, os.path.basename(bundle_path(csv_path)))
+            convert_csv(csv_path, out_path)
+
+            start = time.perf_counter()
+            for _ in range(repeat):
+                df = pd.read_csv(csv_path)
+                for name in ARRAY_COLUMNS:
+                    df[name] = df[name].apply(ast.literal_eval)
+            csv_time = (time.perf_counter() - start) / repeat
+
+            start = time.perf_counter()
+            for _ in range(repeat):
+                _, columns = load_recording(out_path)
+            npy_time = (time.perf_counter() - start) / repeat
+
+            csv_size = os.path.getsize(csv_path)
+            npy_size = _dir_size(out_path)
+            print(f"{os.path.basename(csv_path)}: {len(columns['timestamp'])} rows")
+            print(f"  size: csv {csv_size / 1024:7.1f} KiB, bundle {npy_size / 1024:7.1f} KiB "
+                  f"({csv_size / npy_size:.1f}x smaller)")
+            print(f"  load: csv+literal_eval {csv_time * 1e3:7.2f} ms, bundle {npy_time * 1e3:7.2f} ms "
+                  f"({csv_time / npy_time:.0f}x faster)")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1:
+        # python recording_store.py file.csv [file.csv ...] converts CSVs next to themselves
+        for csv_file in sys.argv[1:]:
+            path, skipped = convert_csv(csv_file)
+            print(f"{csv_file} -> {path} ({skipped} rows skipped)")
+    else:
+        _benchmark(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sampledata", "*.csv"))
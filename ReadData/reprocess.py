@@ -0,0 +1,456 @@
+"""
+Bulk re-processing of archived recordings across a process pool.
+
+Walks the organized archive (<base_path>/<study_code> <DDMMYYYY>/, see
+organize_file_path) and, for every SmartCareCsv recording, parses each row
+once, runs the detector rules (detector_rules.json) over its segment windows
+and writes the columnar .rec bundle next to the CSV (recording_store.py).
+
+Files are packed into work units of about `chunk_mb` megabytes, largest
+first, so a worker process gets a handful of small recordings per round trip
+and the pool stays evenly loaded. A recording larger than that is cut into
+byte ranges of about `chunk_mb`, each a work unit of its own; every range
+starts on a segment window boundary, so the ranges are checked on their own
+and their part bundles and results are joined into those of the whole file.
+
+A manifest (reprocess_manifest.json in the archive root) records the sha256
+of every file processed, with its row count and detection results. A file
+whose size and mtime match its entry is skipped without being read; one
+that was touched but hashes the same is not processed again either. Entries
+made with different rules are processed again.
+
+    python reprocess.py D:/24EIc --workers 8
+    python reprocess.py D:/24EIc --study 24EIc-003-0011 --force
+    python reprocess.py D:/24EIc --rules windows
+"""
+import argparse
+import glob
+import hashlib
+import json
+import math
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+
+from loguru import logger
+
+from detector import DEFAULT_RULE_SET, load_rules
+from recording_store import RecordingWriter, bundle_path, join_bundles, timestamp_to_us
+from row_parser import is_header, parse_row, split_fields
+from window_stage import WindowStage
+
+DEFAULT_BASE_PATH = "D:\\24EIc"
+MANIFEST_NAME = "reprocess_manifest.json"
+MANIFEST_VERSION = 1
+SEGMENT_SECONDS = 180
+FORMATS = ("npy", "none")
+
+# Completed work units between manifest writes, so an interrupted run keeps its progress
+SAVE_EVERY = 8
+
+
+class _WindowTally:
+    """Window consumer collecting, per rule, the start of every window the rule fired on."""
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.windows = 0
+        self.fired = {rule.name: [] for rule in rules}
+
+    def __call__(self, window):
+        verdict = self.rules.evaluate(window.columns)
+        self.windows += 1
+        for rule in verdict.fired:
+            self.fired[rule.name].append(window.start.isoformat())
+
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def find_recordings(base_path, study_code=None):
+    """SmartCareCsv files in the study folders of the archive, as absolute paths."""
+    folder = f"{glob.escape(study_code)} *" if study_code else "* *"
+    pattern = os.path.join(glob.escape(os.path.abspath(base_path)), folder, "SmartCareCsv_*.csv")
+    return sorted(path for path in glob.glob(pattern) if os.path.isfile(path))
+
+
+def plan_chunks(paths, chunk_bytes):
+    """
+    Pack files into work units of about `chunk_bytes`, largest files first.
+
+    Returns the units as lists of (path, start, end) byte ranges, where a
+    whole file is (path, 0, None). A file larger than chunk_bytes is cut into
+    ranges of about chunk_bytes, each a unit of its own (the last one ends at
+    None, the end of the file); process_range moves the cuts to window
+    boundaries.
+    """
+    sized = sorted(((os.path.getsize(path), path) for path in paths), reverse=True)
+    chunks, current, current_size = [], [], 0
+    for size, path in sized:
+        if size > chunk_bytes:
+            pieces = math.ceil(size / chunk_bytes)
+            cuts = [size * i // pieces for i in range(pieces)] + [None]
+            chunks.extend([(path, start, end)] for start, end in zip(cuts, cuts[1:]))
+            continue
+        if current and current_size + size > chunk_bytes:
+            chunks.append(current)
+            current, current_size = [], 0
+        current.append((path, 0, None))
+        current_size += size
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _window_boundary(f, offset, segment_seconds):
+    """
+    Byte offset in binary file `f` of the first row after `offset` that is in
+    a later segment window than the first row at or after `offset`, or of the
+    end of the file.
+
+    Windows are aligned like WindowStage aligns them, so with the rows in time
+    order the rows of a range from one boundary to the next make up whole
+    windows. Headers and malformed lines never start a range.
+    """
+    if offset == 0:
+        return 0
+    size_us = int(segment_seconds * 1e6)
+    f.seek(offset - 1)
+    f.readline()
+    window = None
+    while True:
+        position = f.tell()
+        line = f.readline()
+        if not line:
+            return position
+        try:
+            text = split_fields(line.decode())[0]
+            utc_offset = datetime.fromisoformat(text).utcoffset()
+        except ValueError:
+            continue
+        local = timestamp_to_us(text) + (int(utc_offset.total_seconds() * 1e6) if utc_offset is not None else 0)
+        if window is None:
+            window = local // size_us
+        elif local // size_us > window:
+            return position
+
+
+def _check_lines(lines, segment_seconds, rules, writer):
+    """Parse and check rows, appending them to `writer` (if any). Returns (rows, skipped, tally)."""
+    tally = _WindowTally(rules)
+    stage = WindowStage(segment_seconds, consumers=[tally], capacity=4096)
+    rows = skipped = 0
+    for line in lines:
+        if not line.strip() or is_header(line):
+            continue
+        try:
+            row = parse_row(line)
+            if writer is not None:
+                writer.append(row)
+            stage.push(row)
+        except (ValueError, IndexError):
+            skipped += 1
+            continue
+        rows += 1
+    stage.close()
+    if writer is not None:
+        writer.close()
+    return rows, skipped, tally
+
+
+def process_recording(path, fmt="npy", segment_seconds=SEGMENT_SECONDS, known_sha256=None, rules=None):
+    """
+    Parse, check and convert one recording. Returns its manifest entry.
+
+    When the file hashes to `known_sha256` it is not processed again and the
+    entry only carries the hash, size and mtime (with "unchanged": True).
+    """
+    stat = os.stat(path)
+    entry = {"sha256": file_sha256(path), "size": stat.st_size, "mtime": stat.st_mtime}
+    if known_sha256 is not None and entry["sha256"] == known_sha256:
+        entry["unchanged"] = True
+        return entry
+
+    rules = rules if rules is not None else load_rules()
+    writer = RecordingWriter(bundle_path(path), source=os.path.basename(path)) if fmt == "npy" else None
+    with open(path, "r") as f:
+        rows, skipped, tally = _check_lines(f, segment_seconds, rules, writer)
+
+    entry.update(
+        rows=rows,
+        skipped=skipped,
+        windows=tally.windows,
+        rules=rules.digest,
+        fired_windows=tally.fired,
+        outputs=[os.path.basename(writer.path)] if writer is not None else [],
+        format=fmt,
+        processed=time.time(),
+    )
+    return entry
+
+
+def _part_path(path, start):
+    return f"{bundle_path(path)}.part{start}"
+
+
+def process_range(path, start, end, fmt="npy", segment_seconds=SEGMENT_SECONDS, rules=None):
+    """
+    Parse, check and convert the rows of one byte range of a recording (see plan_chunks).
+
+    `start` and `end` are first moved to window boundaries. Returns the
+    range's results for merge_ranges; with fmt "npy" its rows are written to
+    a part bundle next to the recording, named in "output".
+    """
+    rules = rules if rules is not None else load_rules()
+    writer = RecordingWriter(_part_path(path, start), source=os.path.basename(path)) if fmt == "npy" else None
+    with open(path, "rb") as f:
+        first = _window_boundary(f, start, segment_seconds)
+        last = _window_boundary(f, end, segment_seconds) if end is not None else None
+        f.seek(first)
+
+        def lines():
+            position = first
+            for line in f:
+                if last is not None and position >= last:
+                    return
+                position += len(line)
+                yield line.decode()
+
+        rows, skipped, tally = _check_lines(lines(), segment_seconds, rules, writer)
+    return {
+        "rows": rows,
+        "skipped": skipped,
+        "windows": tally.windows,
+        "rules": rules.digest,
+        "fired_windows": tally.fired,
+        "output": writer.path if writer is not None else None,
+    }
+
+
+def merge_ranges(path, parts, fmt="npy"):
+    """
+    Join the results of process_range for every range of a recording, in file
+    order, into its manifest entry. The part bundles are joined into the
+    recording's bundle and removed.
+    """
+    stat = os.stat(path)
+    entry = {"sha256": file_sha256(path), "size": stat.st_size, "mtime": stat.st_mtime}
+    fired = {}
+    for part in parts:
+        for name, starts in part["fired_windows"].items():
+            fired.setdefault(name, []).extend(starts)
+    outputs = []
+    try:
+        if fmt == "npy":
+            joined = join_bundles(bundle_path(path), [part["output"] for part in parts], source=os.path.basename(path))
+            outputs.append(os.path.basename(joined))
+    finally:
+        _remove_parts(parts)
+    entry.update(
+        rows=sum(part["rows"] for part in parts),
+        skipped=sum(part["skipped"] for part in parts),
+        windows=sum(part["windows"] for part in parts),
+        rules=parts[0]["rules"],
+        fired_windows=fired,
+        outputs=outputs,
+        format=fmt,
+        processed=time.time(),
+    )
+    return entry
+
+
+def _run_chunk(jobs, fmt, segment_seconds, rule_set):
+    """
+    Worker entry point: process (path, start, end, known_sha256) jobs from
+    plan_chunks, returning (path, start, end, entry or range results, error).
+    """
+    # Compiled in the worker (once per process); compiled rules are not sent between processes
+    rules = load_rules(rule_set)
+    results = []
+    for path, start, end, known_sha256 in jobs:
+        try:
+            if start == 0 and end is None:
+                result = process_recording(path, fmt, segment_seconds, known_sha256, rules)
+            else:
+                result = process_range(path, start, end, fmt, segment_seconds, rules)
+            results.append((path, start, end, result, None))
+        except Exception as e:
+            results.append((path, start, end, None, f"{type(e).__name__}: {e}"))
+    return results
+
+
+def _run_merge(path, parts, fmt):
+    """Worker entry point for merge_ranges, returning its result like _run_chunk."""
+    try:
+        return [(path, 0, None, merge_ranges(path, parts, fmt), None)]
+    except Exception as e:
+        return [(path, 0, None, None, f"{type(e).__name__}: {e}")]
+
+
+def _remove_parts(parts):
+    for part in parts:
+        if part is not None and part["output"] is not None:
+            shutil.rmtree(part["output"], ignore_errors=True)
+
+
+def load_manifest(path):
+    try:
+        with open(path, "r") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return {"version": MANIFEST_VERSION, "files": {}}
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"{path} has manifest version {manifest.get('version')}, expected {MANIFEST_VERSION}")
+    return manifest
+
+
+def save_manifest(path, manifest):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def _outputs_present(base_path, key, entry):
+    folder = os.path.dirname(os.path.join(base_path, key))
+    return all(os.path.exists(os.path.join(folder, name)) for name in entry.get("outputs", []))
+
+
+def reprocess(base_path=DEFAULT_BASE_PATH, workers=None, chunk_mb=64, fmt="npy", study_code=None,
+              force=False, segment_seconds=SEGMENT_SECONDS, rule_set=DEFAULT_RULE_SET):
+    """
+    Re-process the archive. Returns a summary dict (files found, processed,
+    skipped, failed, rows, seconds).
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt}")
+    base_path = os.path.abspath(base_path)
+    manifest_path = os.path.join(base_path, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    files = manifest["files"]
+    rules = load_rules(rule_set)
+
+    start = time.perf_counter()
+    summary = {"found": 0, "processed": 0, "unchanged": 0, "skipped": 0, "failed": 0, "rows": 0}
+    jobs = {}
+    for path in find_recordings(base_path, study_code):
+        summary["found"] += 1
+        key = os.path.relpath(path, base_path).replace(os.sep, "/")
+        entry = files.get(key)
+        usable = (not force and entry is not None and entry.get("format") == fmt
+                  and entry.get("rules") == rules.digest and _outputs_present(base_path, key, entry))
+        if usable:
+            stat = os.stat(path)
+            if stat.st_size == entry["size"] and stat.st_mtime == entry["mtime"]:
+                summary["skipped"] += 1
+                continue
+        jobs[path] = entry["sha256"] if usable else None
+
+    chunk_bytes = chunk_mb * 1024 * 1024
+    for path, known_sha256 in list(jobs.items()):
+        # A file processed in ranges is hashed whole here first, so an unchanged one is not processed
+        if known_sha256 is not None and os.path.getsize(path) > chunk_bytes:
+            key = os.path.relpath(path, base_path).replace(os.sep, "/")
+            stat = os.stat(path)
+            if file_sha256(path) == known_sha256:
+                summary["unchanged"] += 1
+                files[key].update(size=stat.st_size, mtime=stat.st_mtime)
+                del jobs[path]
+            else:
+                jobs[path] = None
+
+    chunks = plan_chunks(jobs, chunk_bytes)
+    # Results of the ranges of each split file, by range start (None once one failed)
+    ranges = {}
+    for chunk in chunks:
+        for path, range_start, range_end in chunk:
+            if range_start or range_end is not None:
+                ranges.setdefault(path, {})[range_start] = None
+    logger.info(f"{summary['found']} recordings, {summary['skipped']} already done, "
+                f"{len(jobs)} to check in {len(chunks)} work units ({len(ranges)} split into ranges)")
+
+    completed = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = {pool.submit(_run_chunk, [(path, range_start, range_end, jobs[path])
+                                            for path, range_start, range_end in chunk], fmt, segment_seconds, rule_set)
+                   for chunk in chunks}
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for path, range_start, range_end, entry, error in future.result():
+                        key = os.path.relpath(path, base_path).replace(os.sep, "/")
+                        if range_start or range_end is not None:
+                            parts = ranges[path]
+                            if error is not None or parts is None:
+                                if parts is not None:
+                                    summary["failed"] += 1
+                                    logger.error(f"Failed to process {key} (bytes {range_start}-{range_end}): {error}")
+                                    _remove_parts(parts.values())
+                                    ranges[path] = None
+                                _remove_parts([entry])
+                                continue
+                            parts[range_start] = entry
+                            if all(part is not None for part in parts.values()):
+                                pending.add(pool.submit(_run_merge, path, [parts[s] for s in sorted(parts)], fmt))
+                        elif error is not None:
+                            summary["failed"] += 1
+                            logger.error(f"Failed to process {key}: {error}")
+                        elif entry.pop("unchanged", False):
+                            summary["unchanged"] += 1
+                            files[key].update(entry)
+                        else:
+                            summary["processed"] += 1
+                            summary["rows"] += entry["rows"]
+                            files[key] = entry
+                            fired = {name: len(starts) for name, starts in entry["fired_windows"].items() if starts}
+                            if fired:
+                                logger.info(f"{key}: " + ", ".join(f"{count} {name} windows"
+                                                                   for name, count in fired.items()))
+                    completed += 1
+                    if completed % SAVE_EVERY == 0:
+                        save_manifest(manifest_path, manifest)
+        except KeyboardInterrupt:
+            for future in pending:
+                future.cancel()
+            raise
+        finally:
+            save_manifest(manifest_path, manifest)
+
+    summary["seconds"] = time.perf_counter() - start
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-process archived SmartCareCsv recordings in parallel")
+    parser.add_argument("base_path", nargs="?", default=DEFAULT_BASE_PATH, help="archive root (default D:\\24EIc)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--chunk-mb", type=float, default=64,
+                        help="approximate size of a work unit; larger recordings are split into ranges of this size")
+    parser.add_argument("--format", choices=FORMATS, default="npy",
+                        help="npy writes a .rec bundle next to each CSV, none only runs the checks")
+    parser.add_argument("--study", help="only this study code")
+    parser.add_argument("--segment-seconds", type=float, default=SEGMENT_SECONDS)
+    parser.add_argument("--rules", default=DEFAULT_RULE_SET, help="rule set in the detector rules file")
+    parser.add_argument("--force", action="store_true", help="ignore the manifest and process every file")
+    args = parser.parse_args(argv)
+
+    logger.remove()
+    logger.add(sys.stderr, level="INFO")
+    summary = reprocess(args.base_path, args.workers, args.chunk_mb, args.format, args.study, args.force,
+                        args.segment_seconds, args.rules)
+    logger.info(f"{summary['processed']} processed ({summary['rows']} rows), {summary['unchanged']} unchanged, "
+                f"{summary['skipped']} skipped, {summary['failed']} failed in {summary['seconds']:.1f} s")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
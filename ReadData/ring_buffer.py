@@ -0,0 +1,134 @@
+"""
+Fixed-capacity, array-backed ring buffers for live recordings.
+
+Every column is allocated once with room for 2 x capacity rows and each row
+is written twice, at slot i and at slot i + capacity. Any run of up to
+`capacity` consecutive rows is therefore contiguous somewhere in the array,
+so reading a window is a plain slice (a zero-copy view) even when it wraps
+around the end of the ring. Memory stays constant however long a recording
+runs, and appending a row only copies its values into place.
+"""
+from datetime import datetime
+
+import numpy as np
+
+from recording_store import ARRAY_COLUMNS, SCALAR_COLUMNS, timestamp_to_us
+
+# Columns held for a session. Perfusion stays float64 so values written back
+# to CSV keep the text they were read with.
+SESSION_COLUMNS = dict(SCALAR_COLUMNS, **ARRAY_COLUMNS)
+SESSION_COLUMNS["perfusion"] = np.float64
+
+
+class RingBuffer:
+    """
+    Columnar ring buffer addressed by absolute row index.
+
+    Rows are numbered from 0 in append order; the buffer holds the rows
+    [total - len(self), total). view(start, stop) returns {column: view} for
+    any held range.
+
+    Parameters
+    ----------
+    capacity : int
+        Number of rows kept.
+    columns : dict
+        Column name -> (dtype, width). width is None for a scalar column and
+        the number of samples per row for an array column.
+    """
+
+    def __init__(self, capacity, columns):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self.total = 0
+        self._data = {}
+        for name, (dtype, width) in columns.items():
+            shape = (2 * capacity,) if width is None else (2 * capacity, width)
+            self._data[name] = np.zeros(shape, dtype)
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    @property
+    def first(self):
+        """Absolute index of the oldest row still held."""
+        return self.total - len(self)
+
+    def append(self, values):
+        """Append one row given as {column: value}. Overwrites the oldest row when full."""
+        i = self.total % self.capacity
+        j = i + self.capacity
+        for name, value in values.items():
+            column = self._data[name]
+            column[i] = value
+            column[j] = value
+        self.total += 1
+
+    def view(self, start=None, stop=None):
+        """Zero-copy {column: view} of rows [start, stop). Defaults to every held row."""
+        start = self.first if start is None else start
+        stop = self.total if stop is None else stop
+        if start < self.first or stop > self.total or start > stop:
+            raise IndexError(f"rows [{start}, {stop}) not in buffer [{self.first}, {self.total})")
+        lo = start % self.capacity
+        hi = lo + (stop - start)
+        return {name: column[lo:hi] for name, column in self._data.items()}
+
+    def latest(self, n):
+        """Views of the last n rows (fewer if the buffer holds less)."""
+        return self.view(self.total - min(n, len(self)), self.total)
+
+    def clear(self):
+        self.total = 0
+
+
+class SessionBuffer(RingBuffer):
+    """
+    Ring buffer of parsed rows (SmartCareRow) for one recording session.
+
+    Holds the columns of a recording bundle (timestamps as epoch
+    microseconds, device as an index into `device_ids`) plus the 100-sample
+    arrays. Rows must arrive in timestamp order; older rows are counted in
+    `late_rows` and skipped.
+    """
+
+    def __init__(self, capacity=1024, width=100):
+        columns = {name: (dtype, width if name in ARRAY_COLUMNS else None)
+                   for name, dtype in SESSION_COLUMNS.items()}
+        super().__init__(capacity, columns)
+        self.width = width
+        self.utc_offset_us = None
+        self.late_rows = 0
+        self._device_ids = {}
+        self._row = {}
+        self._last_ts = None
+
+    @property
+    def device_ids(self):
+        return sorted(self._device_ids, key=self._device_ids.get)
+
+    def append_row(self, row):
+        """Append a SmartCareRow. Returns False (and skips it) if it is older than the last row."""
+        ts = timestamp_to_us(row.timestamp)
+        if self._last_ts is not None and ts < self._last_ts:
+            self.late_rows += 1
+            return False
+        for name in ARRAY_COLUMNS:
+            if len(getattr(row, name)) != self.width:
+                raise ValueError(f"{name} has {len(getattr(row, name))} samples, expected {self.width}")
+        if self.utc_offset_us is None:
+            offset = datetime.fromisoformat(row.timestamp).utcoffset()
+            self.utc_offset_us = int(offset.total_seconds() * 1e6) if offset is not None else 0
+
+        values = self._row
+        values["timestamp"] = ts
+        values["device"] = self._device_ids.setdefault(row.device_id, len(self._device_ids))
+        values["battery"] = row.battery
+        values["hr"] = row.hr
+        values["o2"] = row.o2
+        for name in ARRAY_COLUMNS:
+            values[name] = getattr(row, name)
+        self.append(values)
+        self._last_ts = ts
+        return True
@@ -0,0 +1,133 @@
+"""
+Generator pipeline for SmartCareCsv files: byte chunks -> lines -> rows -> sinks.
+
+    with open(path, "rb") as f, open(out, "w", newline="") as g:
+        drain(iter_rows(iter_lines(iter_chunks(f))), CsvRowSink(g))
+
+Each stage pulls from the one before it, so only one chunk and the row being
+parsed are held at a time and memory does not grow with the file. Every row
+is split and converted once (row_parser.parse_row); there is no csv module
+pass in front of it.
+
+A file that is still being written usually ends in a line without its
+newline. iter_lines() holds such a line back (final="drop") or, for a file
+known to be complete, yields it like the others (final="keep"). LineSplitter
+does the same for data that arrives in pieces over time (see tailer.py).
+"""
+import csv
+
+from row_parser import HEADERS, is_header, parse_row
+
+CHUNK_SIZE = 1 << 16
+
+
+class LineSplitter:
+    """
+    Split bytes that arrive in arbitrary pieces into complete lines.
+
+    feed() returns the lines completed by a piece, decoded and without line
+    endings. A trailing line without a newline is kept in `partial` until the
+    rest of it arrives.
+    """
+
+    def __init__(self, encoding="utf-8"):
+        self.encoding = encoding
+        self.partial = b""
+
+    def feed(self, data):
+        buf = self.partial + data if self.partial else data
+        end = buf.rfind(b"\n")
+        if end < 0:
+            self.partial = buf
+            return []
+        self.partial = buf[end + 1:]
+        return [line.rstrip(b"\r").decode(self.encoding, errors="replace") for line in buf[:end].split(b"\n")]
+
+    def finish(self):
+        """Return the held-back final line (or None) and reset."""
+        line, self.partial = self.partial, b""
+        return line.rstrip(b"\r").decode(self.encoding, errors="replace") if line else None
+
+
+def iter_chunks(f, chunk_size=CHUNK_SIZE):
+    """Yield chunks of a binary file object until EOF."""
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_lines(chunks, final="drop", start_line=0):
+    """
+    Yield the complete lines of a stream of byte chunks.
+
+    `final` says what to do with a last line that has no newline: "drop" it
+    (the file is still being written) or "keep" it (the file is complete).
+    Lines before `start_line` (0-based, header included) are skipped.
+    """
+    if final not in ("drop", "keep"):
+        raise ValueError(f"final must be 'drop' or 'keep', not {final!r}")
+    splitter = LineSplitter()
+    line_num = 0
+    for chunk in chunks:
+        for line in splitter.feed(chunk):
+            if line_num >= start_line:
+                yield line
+            line_num += 1
+    last = splitter.finish()
+    if final == "keep" and last is not None and line_num >= start_line:
+        yield last
+
+
+def iter_rows(lines, on_error=None):
+    """
+    Yield a SmartCareRow per data line, skipping the header and blank lines.
+
+    Malformed lines are skipped; on_error(line_num, line, exc) is called for
+    each one (line_num counts from 1).
+    """
+    for line_num, line in enumerate(lines, start=1):
+        if not line.strip() or is_header(line):
+            continue
+        try:
+            yield parse_row(line)
+        except (ValueError, IndexError) as e:
+            if on_error is not None:
+                on_error(line_num, line, e)
+
+
+def read_rows(path, final="keep", on_error=None, chunk_size=CHUNK_SIZE):
+    """Yield the rows of a SmartCareCsv file, streamed in chunks."""
+    with open(path, "rb") as f:
+        yield from iter_rows(iter_lines(iter_chunks(f, chunk_size), final), on_error)
+
+
+class CsvRowSink:
+    """
+    Row sink writing the parsed CSV layout (HEADERS, arrays as Python lists).
+
+    Writes the header on construction; append() writes one row straight
+    through to the file object.
+    """
+
+    def __init__(self, f):
+        self._writer = csv.writer(f)
+        self._writer.writerow(HEADERS)
+        self.rows = 0
+
+    def append(self, row):
+        self._writer.writerow([row.timestamp, row.device_id, row.battery, row.hr, row.o2,
+                               row.spo2_status.tolist(), row.pleth.tolist(), row.red.tolist(),
+                               row.ir.tolist(), row.perfusion.tolist()])
+        self.rows += 1
+
+
+def drain(rows, *sinks):
+    """Append every row to each sink (anything with append(row), e.g. RecordingWriter). Returns the row count."""
+    count = 0
+    for row in rows:
+        for sink in sinks:
+            sink.append(row)
+        count += 1
+    return count
@@ -0,0 +1,78 @@
+import os
+
+from loguru import logger
+
+from metrics import TAIL_BYTES, TAIL_BYTES_TOTAL
+from row_stream import LineSplitter
+
+
+class FileTailer:
+    """
+    Incrementally follow a growing file on the device.
+
+    Only the bytes past the stored offset are fetched on each poll (via
+    `tail -c +N` on the device), appended to the local copy, and split into
+    complete lines. A trailing line without a newline is kept back until the
+    rest of it arrives, so callers never see a half-written row.
+
+    Parameters
+    ----------
+    client : AdbClient
+        Client used to read from the device.
+    remote_path : str
+        Path of the file on the device.
+    local_path : str
+        Local mirror of the file. New bytes are appended to it.
+    offset : int, default=0
+        Byte offset to resume from. 0 starts a fresh local copy.
+    """
+
+    def __init__(self, client, remote_path, local_path, offset=0):
+        self.client = client
+        self.remote_path = remote_path
+        self.local_path = local_path
+        self.offset = offset
+        self.last_bytes = 0
+        self._lines = LineSplitter()
+
+        if offset and (not os.path.exists(local_path) or os.path.getsize(local_path) < offset):
+            # The local copy lost the bytes before the resume point: start over
+            logger.warning(f"{local_path} is shorter than the resume offset {offset}, reading from the start")
+            self.offset = offset = 0
+
+        if os.path.exists(local_path) and os.path.getsize(local_path) > offset:
+            # Drop anything past the resume point (or start from scratch for
+            # offset 0) so re-fetched bytes are not appended twice
+            with open(local_path, "r+b") as f:
+                f.truncate(offset)
+
+    @property
+    def consumed(self):
+        """Byte offset of the end of the last complete line handed out."""
+        return self.offset - len(self._lines.partial)
+
+    def poll(self):
+        """
+        Fetch new bytes and return the new complete lines (without line endings).
+
+        Returns None if the device could not be read.
+        """
+        data = self.client.read_from(self.remote_path, self.offset)
+        if data is None:
+            self.last_bytes = 0
+            return None
+
+        self.last_bytes = len(data)
+        TAIL_BYTES.observe(len(data))
+        TAIL_BYTES_TOTAL.inc(len(data))
+        if not data:
+            return []
+
+        self.offset += len(data)
+        try:
+            with open(self.local_path, "ab") as f:
+                f.write(data)
+        except IOError as e:
+            logger.error(f"Error writing file {self.local_path}: {e}")
+
+        return self._lines.feed(data)
@@ -0,0 +1,305 @@
+"""
+Streaming window stage for live oximeter rows.
+
+Parsed rows (SmartCareRow) are pushed into a WindowStage, which keeps the
+recent rows in a preallocated ring buffer and cuts them into windows keyed by
+the rows' own wall-clock timestamps:
+
+    tumbling  WindowStage(180)        [10:36:00, 10:39:00), [10:39:00, 10:42:00), ...
+    sliding   WindowStage(10, step=5) [10:36:00, 10:36:10), [10:36:05, 10:36:15), ...
+
+Windows are aligned to multiples of `step` in the device's local time. A
+window is emitted as soon as a row at or past its end arrives (or on close()),
+and is handed to each consumer in turn. Consumers are plain callables taking a
+Window; the ones used by the monitor scripts are defined below.
+"""
+import csv
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from loguru import logger
+
+from detector import load_rules
+from metrics import DETECT_SECONDS, DETECTION_LAG_SECONDS
+from pipeline_log import post_pipeline_log
+from recording_store import ARRAY_COLUMNS, write_bundle
+from ring_buffer import SessionBuffer
+from row_parser import HEADERS
+
+SEGMENT_TIME_FORMAT = "%d.%m.%Y.%H.%M.%S"
+
+
+class Window:
+    """
+    One window of rows, [start, end).
+
+    `columns` maps column name to a view on the session ring buffer; the views
+    are only valid while the consumers run, so consumers that keep data must copy
+    it. Consumers can leave results on the window for the ones after them
+    (WindowDetector sets `verdict`, a detector.RuleVerdict).
+    """
+
+    def __init__(self, start, end, columns, device_ids, complete=True):
+        self.start = start              # aware datetime in device local time
+        self.end = end
+        self.columns = columns
+        self.device_ids = device_ids
+        self.complete = complete        # False for the partial window flushed by close()
+        self.verdict = None
+
+    def __len__(self):
+        return len(self.columns["timestamp"])
+
+    def timestamps(self):
+        """Row timestamps as aware datetimes in device local time."""
+        tz = self.start.tzinfo
+        return [datetime.fromtimestamp(us / 1e6, tz) for us in self.columns["timestamp"].tolist()]
+
+
+class WindowStage:
+    """
+    Cut a stream of rows into tumbling or sliding windows.
+
+    Rows live in a SessionBuffer (ring_buffer.py), so memory is fixed by its
+    capacity and windows are zero-copy views on it. Several stages can share
+    one session buffer: append each row to the buffer once, then call
+    update() on every stage. push() does both for a stage with its own buffer.
+
+    Parameters
+    ----------
+    size : float
+        Window length in seconds.
+    step : float, optional
+        Seconds between window starts. Defaults to `size` (tumbling windows).
+    consumers : list of callable, optional
+        Called as consumer(window) for every emitted window, in order.
+    history : SessionBuffer, optional
+        Shared session buffer. By default the stage creates its own, sized
+        from the first row.
+    capacity : int, default=1024
+        Rows kept by the stage's own buffer. Windows holding more rows than
+        the buffer are cut short (with a warning).
+    """
+
+    def __init__(self, size, step=None, consumers=(), history=None, capacity=1024):
+        step = size if step is None else step
+        if size <= 0 or step <= 0:
+            raise ValueError("size and step must be positive")
+        self.size_us = int(size * 1e6)
+        self.step_us = int(step * 1e6)
+        self.consumers = list(consumers)
+        self.history = history
+        self.capacity = capacity
+        self.windows_emitted = 0
+        self.last_end = None            # end of the last complete window emitted (epoch us)
+        self._seen = history.total if history is not None else 0   # rows of history already looked at
+        self._first = self._seen        # oldest row a pending window can contain
+        self._next_end = None           # end of the oldest window not yet emitted (epoch us)
+        self._overrun_warned = False
+
+    def push(self, row):
+        """Add one SmartCareRow, emitting every window that ends at or before it."""
+        if self.history is None:
+            self.history = SessionBuffer(self.capacity, len(row.pleth))
+        self.history.append_row(row)
+        self.update()
+
+    def update(self):
+        """Look at the rows appended to the history since the last call."""
+        history = self.history
+        if self._seen < history.first:
+            logger.warning(f"{history.first - self._seen} rows left the history before the stage saw them")
+            self._seen = self._first = history.first
+            self._next_end = None
+        for ts in history.view(self._seen, history.total)["timestamp"].tolist():
+            self._emit_until(ts)
+            if self._next_end is None:
+                # Oldest window (aligned to `step`) that contains this row
+                offset = history.utc_offset_us
+                local = ts + offset
+                start = ((local - self.size_us) // self.step_us + 1) * self.step_us - offset
+                self._next_end = start + self.size_us
+                self._first = self._seen
+            self._seen += 1
+
+    def close(self):
+        """Emit the windows still holding rows, marked incomplete."""
+        while self._next_end is not None and self._first < self._seen:
+            self._emit(self._next_end, complete=False)
+            self._advance()
+        self._next_end = None
+
+    def _live_timestamps(self):
+        history = self.history
+        if self._first < history.first:
+            if not self._overrun_warned:
+                logger.warning(f"Window longer than the {history.capacity} row history, cutting it short")
+                self._overrun_warned = True
+            self._first = history.first
+        return history.view(self._first, self._seen)["timestamp"]
+
+    def _emit_until(self, ts):
+        while self._next_end is not None and ts >= self._next_end:
+            self._emit(self._next_end)
+            self._advance()
+
+    def _advance(self):
+        self._next_end += self.step_us
+        # Forget rows that no later window can contain
+        ts = self._live_timestamps()
+        self._first += int(np.searchsorted(ts, self._next_end - self.size_us, side="left"))
+        if self._first == self._seen:
+            # Nothing pending: the next row picks the next window, skipping gaps
+            self._next_end = None
+
+    def _emit(self, end, complete=True):
+        start = end - self.size_us
+        ts = self._live_timestamps()
+        lo = self._first + int(np.searchsorted(ts, start, side="left"))
+        hi = self._first + int(np.searchsorted(ts, end, side="left"))
+        if hi == lo:
+            return
+        tz = timezone(timedelta(microseconds=self.history.utc_offset_us))
+        window = Window(
+            datetime.fromtimestamp(start / 1e6, tz),
+            datetime.fromtimestamp(end / 1e6, tz),
+            self.history.view(lo, hi),
+            self.history.device_ids,
+            complete,
+        )
+        self.windows_emitted += 1
+        if complete:
+            self.last_end = end
+        for consumer in self.consumers:
+            try:
+                consumer(window)
+            except Exception as e:
+                logger.error(f"Window consumer {consumer!r} failed for {window.start}: {e}")
+
+
+def segment_filename(research_code, start, end, suffix=".csv"):
+    """SmartCareCsv_<code>_<start>_<end>.csv, with times formatted like the recordings on the phone."""
+    return f"SmartCareCsv_{research_code}_{start.strftime(SEGMENT_TIME_FORMAT)}_{end.strftime(SEGMENT_TIME_FORMAT)}{suffix}"
+
+
+class SegmentWriter:
+    """
+    Window consumer that saves each window as a segment file.
+
+    Files are named after the window bounds (segment_filename), so every
+    window gets its own file. `fmt` is "csv" (the layout row_stream.CsvRowSink
+    writes) or "npy" (a .rec bundle, see recording_store.py).
+    """
+
+    def __init__(self, output_dir, research_code, fmt="csv"):
+        if fmt not in ("csv", "npy"):
+            raise ValueError(f"Unknown segment format: {fmt}")
+        self.output_dir = output_dir
+        self.research_code = research_code
+        self.fmt = fmt
+        self.last_path = None
+
+    def __call__(self, window):
+        os.makedirs(self.output_dir, exist_ok=True)
+        name = segment_filename(self.research_code, window.start, window.end)
+        path = os.path.join(self.output_dir, name)
+        if self.fmt == "npy":
+            path = write_bundle(os.path.splitext(path)[0] + ".rec", window.columns, window.device_ids,
+                                int(window.start.utcoffset().total_seconds()), source=name)
+        else:
+            self._write_csv(path, window)
+        self.last_path = path
+        logger.debug(f"Saved {len(window)} row segment {path}")
+
+    def _write_csv(self, path, window):
+        cols = window.columns
+        scalars = zip(
+            (ts.isoformat(sep=" ", timespec="microseconds") for ts in window.timestamps()),
+            (window.device_ids[i] for i in cols["device"].tolist()),
+            cols["battery"].tolist(), cols["hr"].tolist(), cols["o2"].tolist(),
+        )
+        arrays = zip(*(cols[name].tolist() for name in ARRAY_COLUMNS))
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(HEADERS)
+            for scalar, array in zip(scalars, arrays):
+                writer.writerow(scalar + array)
+        os.replace(tmp_path, path)
+
+
+class WindowDetector:
+    """
+    Window consumer running the detector rules (detector.RuleSet) over each window.
+
+    The RuleVerdict is stored on the window; `on_alert` is called as
+    callback(rule, window) for every alerting rule that fired.
+    """
+
+    def __init__(self, rules=None, on_alert=None):
+        self.rules = rules if rules is not None else load_rules()
+        self.on_alert = on_alert
+
+    def __call__(self, window):
+        start = time.perf_counter()
+        verdict = self.rules.evaluate(window.columns)
+        DETECT_SECONDS.observe(time.perf_counter() - start)
+        # Lag of the newest row in the window
+        DETECTION_LAG_SECONDS.observe(max(time.time() - window.columns["timestamp"][-1] / 1e6, 0))
+        window.verdict = verdict
+        if self.on_alert is not None:
+            for rule in verdict.fired:
+                if rule.alert:
+                    self.on_alert(rule, window)
+
+
+class ModelLogWriter:
+    """
+    Window consumer posting a model log for every rule that fired on a window.
+
+    Only a small summary is copied out of the window; the upload itself runs
+    on the pipeline_log uploader's thread.
+    """
+
+    def __init__(self, patient_id, post=post_pipeline_log):
+        self.patient_id = patient_id
+        self.post = post
+
+    def __call__(self, window):
+        verdict = window.verdict
+        fired = verdict.fired if verdict is not None else []
+        if self.patient_id is None or not fired:
+            return
+        summary = {
+            "start": window.start.isoformat(),
+            "end": window.end.isoformat(),
+            "rows": len(window),
+            **{f"{name}_count": count for name, count in verdict.summary().items()},
+            "hr": window.columns["hr"].tolist(),
+            "o2": window.columns["o2"].tolist(),
+        }
+        for rule in fired:
+            self.post(self.patient_id, f"{rule.name.replace('_', ' ').capitalize()} detected", summary)
+
+
+class WindowSummary:
+    """
+    Window consumer logging one line per window (rows, hr/o2 range and, after a
+    WindowDetector, the rows each rule flagged) instead of one line per row.
+    """
+
+    def __init__(self, label, level="INFO"):
+        self.label = label
+        self.level = level
+
+    def __call__(self, window):
+        hr, o2 = window.columns["hr"], window.columns["o2"]
+        parts = [f"{self.label} {window.start:%H:%M:%S}-{window.end:%H:%M:%S}: {len(window)} rows",
+                 f"hr {hr.min()}-{hr.max()}", f"o2 {o2.min()}-{o2.max()}"]
+        if window.verdict is not None:
+            parts.append(" ".join(f"{name}={count}" for name, count in window.verdict.summary().items()))
+        if not window.complete:
+            parts.append("partial")
+        logger.log(self.level, ", ".join(parts))
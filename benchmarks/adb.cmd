@@ -0,0 +1 @@
+@python "%~dp0fake_adb.py" %*
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the `adb` executable that serves a local directory as the phone.
+
+Device paths are mapped under FAKE_ADB_ROOT, so /sdcard/Download/OximeterData
+is FAKE_ADB_ROOT/sdcard/Download/OximeterData. Only what the monitor uses is
+implemented: `devices`, `connect`, `start-server`/`kill-server`, `pull`, and
+`shell`/`exec-out` running ls, cat, stat, tail -c +N and true, with `*`
+globs and `a || b`.
+
+Point ADB_PATH at benchmarks/adb (benchmarks\\adb.cmd on Windows) to run the
+monitor scripts without a phone. AdbClient talks to a running adb server
+first; use AdbClient(..., use_server=False), or set ADB_SERVER_PORT to a port
+nothing listens on, so it falls back to this executable.
+
+FakeAdbServer serves the same device tree over the adb server protocol
+(host:devices, host:connect, host:transport, shell:, exec: and sync: RECV),
+for running AdbClient in its default server mode:
+
+    python fake_adb.py server 5038
+
+Environment:
+    FAKE_ADB_ROOT      directory served as the device filesystem (default: cwd)
+    FAKE_ADB_SERIALS   comma-separated device serials (default FAKE0001). With
+                       several serials, FAKE_ADB_ROOT/<serial> is used as each
+                       device's root when it exists.
+    FAKE_ADB_LATENCY   seconds to sleep per command, to mimic the USB round trip
+"""
+import glob
+import io
+import os
+import shlex
+import shutil
+import socketserver
+import struct
+import sys
+import threading
+import time
+
+ROOT = os.path.abspath(os.getenv("FAKE_ADB_ROOT", "."))
+SERIALS = [s for s in os.getenv("FAKE_ADB_SERIALS", "FAKE0001").split(",") if s]
+LATENCY = float(os.getenv("FAKE_ADB_LATENCY", "0") or 0)
+
+
+class CommandError(Exception):
+    pass
+
+
+def device_root(serial):
+    root = os.path.join(ROOT, serial)
+    return root if len(SERIALS) > 1 and os.path.isdir(root) else ROOT
+
+
+def local_path(root, remote_path):
+    return os.path.join(root, *[part for part in remote_path.split("/") if part])
+
+
+def expand(root, args):
+    """Expand device path globs like the device shell would (unmatched patterns stay as they are)."""
+    expanded = []
+    for arg in args:
+        matches = sorted(glob.glob(local_path(root, arg))) if "*" in arg else []
+        if not matches:
+            expanded.append(arg)
+            continue
+        for match in matches:
+            expanded.append("/" + os.path.relpath(match, root).replace(os.sep, "/"))
+    return expanded
+
+
+def _ls(root, args, out):
+    paths = [a for a in args if not a.startswith("-")] or ["/"]
+    for path in paths:
+        target = local_path(root, path)
+        if os.path.isdir(target):
+            names = sorted(os.listdir(target))
+        elif os.path.exists(target):
+            names = [path]
+        else:
+            raise CommandError(f"ls: {path}: No such file or directory")
+        if names:
+            out.write(("\n".join(names) + "\n").encode())
+
+
+def _cat(root, args, out):
+    for path in args:
+        try:
+            with open(local_path(root, path), "rb") as f:
+                shutil.copyfileobj(f, out)
+        except OSError:
+            raise CommandError(f"cat: {path}: No such file or directory")
+
+
+def _tail(root, args, out):
+    # Only the form the tailer uses: tail -c +N path (1-based byte offset)
+    if len(args) != 3 or args[0] != "-c" or not args[1].startswith("+"):
+        raise CommandError(f"tail: unsupported arguments {' '.join(args)}")
+    offset = max(int(args[1][1:]) - 1, 0)
+    try:
+        with open(local_path(root, args[2]), "rb") as f:
+            f.seek(offset)
+            shutil.copyfileobj(f, out)
+    except OSError:
+        raise CommandError(f"tail: {args[2]}: No such file or directory")
+
+
+def _stat(root, args, out):
+    # stat -c FORMAT path... with %n (name), %s (size) and %Y (mtime, seconds)
+    if len(args) < 3 or args[0] != "-c":
+        raise CommandError(f"stat: unsupported arguments {' '.join(args)}")
+    fmt, failed = args[1], False
+    for path in args[2:]:
+        try:
+            st = os.stat(local_path(root, path))
+        except OSError:
+            sys.stderr.write(f"stat: '{path}': No such file or directory\n")
+            failed = True
+            continue
+        line = fmt.replace("%n", path).replace("%s", str(st.st_size)).replace("%Y", str(int(st.st_mtime)))
+        out.write((line + "\n").encode())
+    if failed:
+        raise CommandError("")
+
+
+def _true(root, args, out):
+    pass
+
+
+COMMANDS = {"ls": _ls, "cat": _cat, "tail": _tail, "stat": _stat, "true": _true}
+
+
+def run_shell(root, command, out):
+    """Run a device shell command line. Returns the exit status."""
+    status = 0
+    for alternative in command.split("||"):
+        status = _run_simple(root, alternative, out)
+        if status == 0:
+            break
+    return status
+
+
+def _run_simple(root, command, out):
+    words = [w for w in shlex.split(command) if w not in ("2>/dev/null", ">/dev/null")]
+    if not words:
+        return 0
+    words = words[:1] + expand(root, words[1:])
+    handler = COMMANDS.get(words[0])
+    if handler is None:
+        sys.stderr.write(f"/system/bin/sh: {words[0]}: not found\n")
+        return 127
+    try:
+        handler(root, words[1:], out)
+    except CommandError as e:
+        if str(e) and "2>/dev/null" not in command:
+            sys.stderr.write(f"{e}\n")
+        return 1
+    return 0
+
+
+class _AdbServerHandler(socketserver.BaseRequestHandler):
+    """One client connection: host requests, or a transport followed by one device service."""
+
+    def handle(self):
+        sock = self.request
+        serial = None
+        while True:
+            request = self._read_request()
+            if request is None:
+                return
+            if LATENCY:
+                time.sleep(LATENCY)
+            if request in self.server.fail_requests:
+                self._fail(f"{request} refused")
+                return
+            if request == "host:devices":
+                self._reply("".join(f"{s}\tdevice\n" for s in SERIALS).encode())
+                return
+            if request.startswith("host:connect:"):
+                self._reply(f"connected to {request[len('host:connect:'):]}".encode())
+                return
+            if request.startswith("host:transport:"):
+                serial = request[len("host:transport:"):]
+                if serial not in SERIALS:
+                    self._fail(f"device '{serial}' not found")
+                    return
+                sock.sendall(b"OKAY")
+                continue
+            if serial is None:
+                self._fail(f"unsupported request {request}")
+                return
+            root = device_root(serial)
+            if request.startswith(("shell:", "exec:")):
+                out = io.BytesIO()
+                run_shell(root, request.split(":", 1)[1], out)
+                sock.sendall(b"OKAY" + out.getvalue())
+                return
+            if request == "sync:":
+                sock.sendall(b"OKAY")
+                self._sync(root)
+                return
+            self._fail(f"unsupported service {request}")
+            return
+
+    def _read_request(self):
+        header = self._recv(4)
+        if header is None:
+            return None
+        return self._recv(int(header, 16)).decode()
+
+    def _recv(self, size):
+        buf = b""
+        while len(buf) < size:
+            chunk = self.request.recv(size - len(buf))
+            if not chunk:
+                return None
+            buf += chunk
+        return buf
+
+    def _reply(self, payload):
+        self.request.sendall(b"OKAY" + b"%04x" % len(payload) + payload)
+
+    def _fail(self, message):
+        self.request.sendall(b"FAIL" + b"%04x" % len(message) + message.encode())
+
+    def _sync(self, root):
+        header = self._recv(8)
+        if header is None or header[:4] != b"RECV":
+            return
+        path = self._recv(struct.unpack("<I", header[4:])[0]).decode()
+        try:
+            with open(local_path(root, path), "rb") as f:
+                for block in iter(lambda: f.read(64 * 1024), b""):
+                    self.request.sendall(b"DATA" + struct.pack("<I", len(block)) + block)
+        except OSError:
+            message = b"No such file or directory"
+            self.request.sendall(b"FAIL" + struct.pack("<I", len(message)) + message)
+            return
+        self.request.sendall(b"DONE" + struct.pack("<I", 0))
+        self._recv(8)  # QUIT
+
+
+class FakeAdbServer(socketserver.ThreadingTCPServer):
+    """
+    Stand-in for the adb server on 127.0.0.1:`port` (0 picks a free port),
+    serving FAKE_ADB_ROOT like the fake executable does.
+
+    `connections` counts the client connections accepted. Requests listed in
+    `fail_requests` (e.g. "host:devices") are answered with FAIL.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port=0):
+        super().__init__(("127.0.0.1", port), _AdbServerHandler)
+        self.port = self.server_address[1]
+        self.connections = 0
+        self.fail_requests = set()
+        self._thread = None
+
+    def verify_request(self, request, client_address):
+        self.connections += 1
+        return True
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-adb-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+def main(argv):
+    if LATENCY:
+        time.sleep(LATENCY)
+    serial = None
+    if len(argv) >= 2 and argv[0] == "-s":
+        serial, argv = argv[1], argv[2:]
+    if not argv:
+        sys.stderr.write("usage: adb [-s SERIAL] devices|connect|pull|shell|exec-out ...\n")
+        return 1
+
+    command, args = argv[0], argv[1:]
+    if command == "server":
+        server = FakeAdbServer(int(args[0]) if args else 5037)
+        print(f"fake adb server on 127.0.0.1:{server.port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
+        return 0
+    if command == "devices":
+        print("List of devices attached")
+        for s in SERIALS:
+            print(f"{s}\tdevice")
+        print()
+        return 0
+    if command == "connect":
+        print(f"connected to {args[0] if args else ''}")
+        return 0
+    if command in ("start-server", "kill-server"):
+        return 0
+
+    serial = serial or SERIALS[0]
+    if serial not in SERIALS:
+        sys.stderr.write(f"adb: device '{serial}' not found\n")
+        return 1
+    root = device_root(serial)
+
+    if command in ("shell", "exec-out"):
+        status = run_shell(root, " ".join(args), sys.stdout.buffer)
+        sys.stdout.flush()
+        return status
+    if command == "pull" and len(args) == 2:
+        source = local_path(root, args[0])
+        if not os.path.isfile(source):
+            sys.stderr.write(f"adb: error: failed to stat remote object '{args[0]}': No such file or directory\n")
+            return 1
+        shutil.copyfile(source, os.path.join(args[1], os.path.basename(args[0])) if os.path.isdir(args[1]) else args[1])
+        print(f"{args[0]}: 1 file pulled.")
+        return 0
+    sys.stderr.write(f"fake adb: unsupported command {' '.join(argv)}\n")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
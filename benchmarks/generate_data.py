@@ -0,0 +1,246 @@
+"""
+Synthetic SmartCare recordings for the benchmarks.
+
+Writes SmartCareCsv_<code>_<start>_<end>.csv files laid out like the ones in
+sampledata/: a quoted header, then one row per reading with the scalar
+columns and five 100-sample arrays. Each patient gets its own device and
+research code; the waveforms follow the heart rate and a few drop and noise
+episodes are mixed in so the detector has something to find.
+
+    python generate_data.py out/ --patients 4 --minutes 30 --rate 1
+    python generate_data.py out/ --live --rate 5      # keep appending rows in real time
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ReadData"))
+
+from row_parser import HEADERS  # noqa: E402
+from window_stage import segment_filename  # noqa: E402
+
+SAMPLES_PER_ROW = 100
+LOCAL_TZ = timezone(timedelta(hours=7))
+DEFAULT_START = datetime(2025, 2, 11, 14, 59, 0, tzinfo=LOCAL_TZ)
+
+# Ranges seen in sampledata/
+PLETH_MAX = 62258
+STATUS_CODES = (0, 8)           # normal readings
+DROP_CODES = (1, 16)            # codes the detector counts as a drop
+
+
+class PatientStream:
+    """
+    Endless stream of synthetic rows for one patient.
+
+    Parameters
+    ----------
+    device_id : str
+        Device MAC written in every row.
+    start : datetime
+        Aware timestamp of the first row.
+    rate : float, default=1.0
+        Rows per second (the oximeter writes about one).
+    seed : int, optional
+        Seed for the random generator, so runs are repeatable.
+    drop_probability : float, default=0.01
+        Chance per row of starting a drop episode (status 1/16, hr 255).
+    noise_probability : float, default=0.005
+        Chance per row of starting a noisy episode (perfusion above 6).
+    """
+
+    def __init__(self, device_id, start=DEFAULT_START, rate=1.0, seed=None,
+                 drop_probability=0.01, noise_probability=0.005):
+        self.device_id = device_id
+        self.time = start
+        self.interval = 1.0 / rate
+        self.rng = np.random.default_rng(seed)
+        self.drop_probability = drop_probability
+        self.noise_probability = noise_probability
+        self.battery = int(self.rng.integers(60, 100))
+        self.hr = float(self.rng.uniform(70, 95))
+        self.o2 = 98
+        self.perfusion = float(self.rng.uniform(3, 5))
+        self.red_base = float(self.rng.uniform(400000, 560000))
+        self.ir_base = float(self.rng.uniform(170000, 290000))
+        self.phase = 0.0
+        self._drop_left = 0
+        self._noise_left = 0
+
+    def next_fields(self):
+        """Return the next row as a list of field strings."""
+        rng = self.rng
+        if self._drop_left == 0 and rng.random() < self.drop_probability:
+            self._drop_left = int(rng.integers(3, 15))
+        if self._noise_left == 0 and rng.random() < self.noise_probability:
+            self._noise_left = int(rng.integers(30, 120))
+
+        self.hr = float(np.clip(self.hr + rng.normal(0, 0.8), 55, 130))
+        self.o2 = int(np.clip(self.o2 + rng.integers(-1, 2), 95, 99))
+        if rng.random() < 0.001:
+            self.battery = max(self.battery - 1, 1)
+
+        status = rng.choice(STATUS_CODES, size=SAMPLES_PER_ROW, p=(0.98, 0.02))
+        hr = round(self.hr)
+        if self._drop_left:
+            status[rng.integers(0, SAMPLES_PER_ROW, size=4)] = rng.choice(DROP_CODES)
+            hr = 255
+            self._drop_left -= 1
+
+        # One beat every 60/hr seconds over the row's `interval` seconds
+        t = self.phase + np.arange(SAMPLES_PER_ROW) * (self.hr / 60.0) * self.interval / SAMPLES_PER_ROW
+        self.phase = float(t[-1] + (self.hr / 60.0) * self.interval / SAMPLES_PER_ROW) % 1.0
+        wave = np.sin(2 * np.pi * t)
+        pleth = np.clip(31000 + 30000 * wave + rng.normal(0, 300, SAMPLES_PER_ROW), 0, PLETH_MAX).astype(np.int64)
+        red = (self.red_base + 4000 * wave + rng.normal(0, 150, SAMPLES_PER_ROW)).astype(np.int64)
+        ir = (self.ir_base + 3000 * wave + rng.normal(0, 120, SAMPLES_PER_ROW)).astype(np.int64)
+
+        self.perfusion = float(np.clip(self.perfusion + rng.normal(0, 0.05), 0.5, 5.5))
+        level = self.perfusion
+        if self._noise_left:
+            level = float(rng.uniform(8, 20))
+            self._noise_left -= 1
+        perfusion = np.full(SAMPLES_PER_ROW, round(level, 1))
+
+        # The oximeter timestamps drift by a few tens of milliseconds
+        jitter = timedelta(milliseconds=int(rng.integers(-30, 60)))
+        timestamp = (self.time + jitter).isoformat(sep=" ", timespec="microseconds")
+        self.time += timedelta(seconds=self.interval)
+        return [
+            timestamp, self.device_id, str(self.battery), str(hr), str(self.o2),
+            _format_array(status), _format_array(pleth), _format_array(red), _format_array(ir),
+            _format_array(perfusion),
+        ]
+
+    def next_line(self):
+        return format_line(self.next_fields())
+
+
+def _format_array(values):
+    return "[" + ", ".join(map(str, values.tolist())) + "]"
+
+
+def format_line(fields):
+    return ",".join(f'"{field}"' for field in fields) + "\n"
+
+
+def device_id_for(index):
+    return "00:A0:50:%02X:%02X:%02X" % (0x3B, index >> 8 & 0xFF, index & 0xFF)
+
+
+def research_code_for(index, prefix="BM"):
+    return f"{prefix}{index + 1:02d}"
+
+
+def write_recording(output_dir, stream, rows, research_code):
+    """Write `rows` rows of `stream` to a SmartCareCsv file named after its first and last row."""
+    os.makedirs(output_dir, exist_ok=True)
+    start = stream.time
+    tmp_path = os.path.join(output_dir, f".{research_code}.tmp")
+    with open(tmp_path, "w", newline="") as f:
+        f.write(format_line(HEADERS))
+        for _ in range(rows):
+            f.write(stream.next_line())
+    end = stream.time - timedelta(seconds=stream.interval)
+    path = os.path.join(output_dir, segment_filename(research_code, start, end))
+    os.replace(tmp_path, path)
+    return path
+
+
+def generate(output_dir, patients=1, seconds=60, rate=1.0, files_per_patient=1,
+             start=DEFAULT_START, seed=0, code_prefix="BM"):
+    """
+    Write `files_per_patient` recordings of `seconds` seconds for each patient.
+
+    Returns the paths written. The same arguments always produce the same files.
+    """
+    paths = []
+    rows = max(int(seconds * rate), 1)
+    for patient in range(patients):
+        stream = PatientStream(device_id_for(patient), start, rate, seed=seed + patient)
+        for _ in range(files_per_patient):
+            paths.append(write_recording(output_dir, stream, rows, research_code_for(patient, code_prefix)))
+            # Recordings are restarted a little later
+            stream.time += timedelta(seconds=30)
+    return paths
+
+
+def append_live(path, stream, rate, seconds=None, stop=None, on_row=None):
+    """
+    Append rows to `path` at `rate` rows per second, like the oximeter app does.
+
+    Runs for `seconds` seconds, or until stop() returns True, or forever.
+    on_row() is called after each row is flushed. Returns the number of rows written.
+    """
+    written = 0
+    next_at = time.monotonic()
+    deadline = None if seconds is None else next_at + seconds
+    with open(path, "a", newline="") as f:
+        if f.tell() == 0:
+            f.write(format_line(HEADERS))
+        while (deadline is None or time.monotonic() < deadline) and not (stop and stop()):
+            f.write(stream.next_line())
+            f.flush()
+            if on_row is not None:
+                on_row()
+            written += 1
+            next_at += 1.0 / rate
+            time.sleep(max(next_at - time.monotonic(), 0))
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic SmartCareCsv recordings")
+    parser.add_argument("output_dir")
+    parser.add_argument("--patients", type=int, default=1)
+    parser.add_argument("--minutes", type=float, default=1.0, help="length of each recording")
+    parser.add_argument("--rate", type=float, default=1.0, help="rows per second")
+    parser.add_argument("--files", type=int, default=1, help="recordings per patient")
+    parser.add_argument("--start", help="local time (UTC+7) of the first row, YYYY-MM-DD HH:MM:SS; "
+                                          "defaults to 2025-02-11 14:59:00, or now with --live")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--code-prefix", default="BM")
+    parser.add_argument("--live", action="store_true",
+                        help="append rows in real time to one recording per patient (Ctrl+C to stop)")
+    args = parser.parse_args(argv)
+
+    if args.start:
+        start = datetime.strptime(args.start, "%Y-%m-%d %H:%M:%S").replace(tzinfo=LOCAL_TZ)
+    else:
+        start = datetime.now(LOCAL_TZ).replace(microsecond=0) if args.live else DEFAULT_START
+    if not args.live:
+        paths = generate(args.output_dir, args.patients, args.minutes * 60, args.rate, args.files,
+                         start, args.seed, args.code_prefix)
+        print(f"Wrote {len(paths)} recordings to {args.output_dir}")
+        return
+
+    import threading
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    stop = threading.Event()
+    threads = []
+    for patient in range(args.patients):
+        stream = PatientStream(device_id_for(patient), start, args.rate, seed=args.seed + patient)
+        # The app names a live recording after its start; the end is filled in when it is closed
+        name = segment_filename(research_code_for(patient, args.code_prefix), start, start)
+        path = os.path.join(args.output_dir, name)
+        thread = threading.Thread(target=append_live, args=(path, stream, args.rate), kwargs={"stop": stop.is_set},
+                                  daemon=True)
+        thread.start()
+        threads.append(thread)
+        print(f"Appending to {path}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+
+if __name__ == "__main__":
+    main()
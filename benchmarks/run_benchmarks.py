@@ -0,0 +1,462 @@
+"""
+Offline benchmarks for the monitor pipeline.
+
+Every scenario runs on synthetic recordings (generate_data.py) served by the
+fake adb (fake_adb.py), so no phone is needed and runs are repeatable:
+
+    parse_throughput   parse_row over a long recording
+    tail_latency       time from a row being appended on the "device" to the
+                       FileTailer handing it out, polling like the scripts do
+    detection_cost     the compiled detector rules per 180-row window, and the
+                       window stage with a WindowDetector per row pushed
+    multi_file         tail + parse + detect through the IngestScheduler with
+                       one worker and with several: the detection lag of
+                       recordings written at the same time (live_speedup), and
+                       the time for a backlog of finished ones, which is
+                       CPU-bound and does not gain from more threads
+    reprocess          bulk re-processing (reprocess.py) of a synthetic
+                       archive with one worker process and with several, and
+                       of an archive holding one recording of the same size,
+                       which is processed in ranges (one_file_speedup)
+    startup            cold start of the monitor (imports, logging setup and
+                       the Monitor with its clients, up to the device loop) in
+                       a fresh interpreter, checked against --startup-budget-ms
+
+Results are written as JSON. Pass --compare with an earlier results file to
+flag metrics that got worse by more than --tolerance; the exit status is 1
+when something regressed, so the run can gate a change:
+
+    python run_benchmarks.py --output baseline.json
+    python run_benchmarks.py --compare baseline.json --tolerance 0.2
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+READ_DATA_DIR = os.path.abspath(os.path.join(BENCH_DIR, "..", "ReadData"))
+sys.path.insert(0, READ_DATA_DIR)
+
+from loguru import logger  # noqa: E402
+
+from adb_client import AdbClient  # noqa: E402
+from detector import load_rules  # noqa: E402
+from generate_data import (DEFAULT_START, PatientStream, append_live, device_id_for, format_line,  # noqa: E402
+                           generate, research_code_for)
+from ingest_scheduler import IngestScheduler  # noqa: E402
+from reprocess import MANIFEST_NAME, reprocess  # noqa: E402
+from row_parser import HEADERS, is_header, parse_row  # noqa: E402
+from tailer import FileTailer  # noqa: E402
+from window_stage import WindowDetector, WindowStage, segment_filename  # noqa: E402
+
+FAKE_ADB = os.path.join(BENCH_DIR, "adb.cmd" if os.name == "nt" else "adb")
+PHONE_FOLDER = "/sdcard/Download/OximeterData"
+# Agreed cold start budget for the monitor scripts' own imports and setup
+STARTUP_BUDGET_MS = 400
+
+
+def _percentile(values, q):
+    return float(np.percentile(values, q)) if len(values) else None
+
+
+def _device(tmp):
+    """A fake device rooted at tmp/device, and a client talking to it through the fake adb."""
+    root = os.path.join(tmp, "device")
+    folder = os.path.join(root, *PHONE_FOLDER.strip("/").split("/"))
+    os.makedirs(folder, exist_ok=True)
+    os.environ["FAKE_ADB_ROOT"] = root
+    return folder, AdbClient(FAKE_ADB, use_server=False)
+
+
+def bench_parse_throughput(tmp, rows=3000, repeat=5):
+    path, = generate(os.path.join(tmp, "parse"), seconds=rows)
+    with open(path) as f:
+        lines = [line for line in f if not is_header(line)]
+    size = sum(len(line) for line in lines)
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for line in lines:
+            parse_row(line)
+        best = min(best, time.perf_counter() - start)
+    return {
+        "rows": len(lines),
+        "rows_per_second": len(lines) / best,
+        "row_us": best * 1e6 / len(lines),
+        "mb_per_second": size / best / 1e6,
+    }
+
+
+def bench_tail_latency(tmp, seconds=10, rate=5.0, poll_interval=1.0):
+    folder, client = _device(tmp)
+    name = segment_filename(research_code_for(0), DEFAULT_START, DEFAULT_START)
+    path = os.path.join(folder, name)
+    with open(path, "w", newline="") as f:
+        f.write(format_line(HEADERS))
+
+    # The writer records when each row hit the file; the reader when it got it back
+    written_at = []
+    stream = PatientStream(device_id_for(0), rate=rate, seed=0)
+    writer = threading.Thread(target=append_live, args=(path, stream, rate, seconds),
+                              kwargs={"on_row": lambda: written_at.append(time.perf_counter())})
+    writer.start()
+
+    tailer = FileTailer(client, f"{PHONE_FOLDER}/{name}", os.path.join(tmp, "tail-local.csv"))
+    received_at, poll_times = [], []
+    while writer.is_alive() or len(received_at) < len(written_at):
+        start = time.perf_counter()
+        lines = tailer.poll() or []
+        now = time.perf_counter()
+        poll_times.append(now - start)
+        received_at.extend(now for line in lines if not is_header(line))
+        if not writer.is_alive() and not lines and len(received_at) >= len(written_at):
+            break
+        time.sleep(poll_interval)
+    writer.join()
+
+    latencies = np.array(received_at) - np.array(written_at[:len(received_at)])
+    return {
+        "rows": len(received_at),
+        "rate": rate,
+        "poll_interval": poll_interval,
+        "latency_p50_ms": _percentile(latencies, 50) * 1e3,
+        "latency_p95_ms": _percentile(latencies, 95) * 1e3,
+        "latency_max_ms": float(latencies.max()) * 1e3,
+        "poll_p50_ms": _percentile(poll_times, 50) * 1e3,
+    }
+
+
+def bench_detection_cost(window_rows=180, windows=200, stage_rows=3600, repeat=5):
+    rules = load_rules()
+    stream = PatientStream(device_id_for(0), seed=0)
+    rows = [parse_row(stream.next_line()) for _ in range(stage_rows)]
+    # The columns of one window, as the ring buffer hands them to WindowDetector
+    window = rows[:window_rows]
+    columns = {name: np.array([getattr(row, name) for row in window])
+               for name in ("battery", "hr", "o2", "spo2_status", "pleth", "red", "ir", "perfusion")}
+    columns["timestamp"] = np.arange(window_rows, dtype=np.int64) * 1_000_000
+    window_time = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(windows):
+            rules.evaluate(columns)
+        window_time = min(window_time, (time.perf_counter() - start) / windows)
+
+    stage_time = float("inf")
+    for _ in range(repeat):
+        stage = WindowStage(10, step=5, consumers=[WindowDetector()])
+        start = time.perf_counter()
+        for row in rows:
+            stage.push(row)
+        stage.close()
+        stage_time = min(stage_time, time.perf_counter() - start)
+    return {
+        "rules": len(rules),
+        "window_rows": window_rows,
+        "window_ms": window_time * 1e3,
+        "windows_per_second": 1 / window_time,
+        "stage_row_us": stage_time * 1e6 / stage_rows,
+        "stage_windows": stage.windows_emitted,
+    }
+
+
+def _ingest(client, remote_path, local_path, counts):
+    """What a monitor worker does with a finished recording: tail it, parse, detect."""
+    tailer = FileTailer(client, remote_path, local_path)
+    stage = WindowStage(180, consumers=[WindowDetector()])
+    rows = 0
+    while True:
+        lines = tailer.poll()
+        if not lines:
+            break
+        for line in lines:
+            row = parse_row(line)
+            if row is not None:
+                stage.push(row)
+                rows += 1
+    stage.close()
+    counts.append(rows)
+
+
+def _follow(client, remote_path, local_path, received, poll_interval, idle_polls=3):
+    """What a monitor worker does with a live recording: tail it until it stops growing, parse, detect."""
+    tailer = FileTailer(client, remote_path, local_path)
+    stage = WindowStage(180, consumers=[WindowDetector()])
+    idle = 0
+    while idle < idle_polls:
+        lines = tailer.poll() or []
+        idle = 0 if lines else idle + 1
+        for line in lines:
+            row = parse_row(line)
+            if row is not None:
+                stage.push(row)
+                received.append(time.perf_counter())
+        time.sleep(poll_interval)
+    stage.close()
+
+
+def bench_multi_file(tmp, patients=8, seconds=600, workers=(1, 4), live_seconds=5.0, rate=5.0, poll_interval=0.2):
+    folder, client = _device(tmp)
+    generate(folder, patients=patients, seconds=seconds)
+    names = client.shell(f"ls {PHONE_FOLDER}").split()
+
+    # Backlog: finished recordings, ingested as fast as the CPU allows. Parsing
+    # and detection hold the GIL, so extra worker threads do not make this faster
+    # (reprocess.py uses processes for bulk work); it is measured to catch
+    # contention between the workers.
+    result = {"files": len(names)}
+    for n in workers:
+        out_dir = os.path.join(tmp, f"ingest-{n}")
+        os.makedirs(out_dir, exist_ok=True)
+        counts = []
+        scheduler = IngestScheduler(max_workers=n, name=f"bench-{n}")
+        start = time.perf_counter()
+        for name in names:
+            scheduler.submit(name, _ingest, client, f"{PHONE_FOLDER}/{name}", os.path.join(out_dir, name), counts)
+        scheduler.shutdown(wait=True)
+        elapsed = time.perf_counter() - start
+        result[f"backlog_workers_{n}_seconds"] = elapsed
+        result[f"backlog_workers_{n}_rows_per_second"] = sum(counts) / elapsed
+
+    # Live: as many recordings as the largest pool, written at the same time.
+    # A worker mostly waits for the next poll, so with one worker the later
+    # recordings are only read once the earlier ones have finished; the
+    # detection lag (row written -> row parsed) is what the workers cut.
+    recordings = workers[-1]
+    result["live_recordings"] = recordings
+    for n in workers:
+        written = [[] for _ in range(recordings)]
+        received = [[] for _ in range(recordings)]
+        writers = []
+        scheduler = IngestScheduler(max_workers=n, name=f"bench-live-{n}")
+        for i in range(recordings):
+            name = f"live-{n}-{i}.csv"
+            with open(os.path.join(folder, name), "w", newline="") as f:
+                f.write(format_line(HEADERS))
+            stream = PatientStream(device_id_for(i), rate=rate, seed=i)
+            on_row = (lambda times=written[i]: times.append(time.perf_counter()))
+            writers.append(threading.Thread(target=append_live, kwargs={"on_row": on_row},
+                                            args=(os.path.join(folder, name), stream, rate, live_seconds)))
+            scheduler.submit(name, _follow, client, f"{PHONE_FOLDER}/{name}", os.path.join(tmp, f"local-{name}"),
+                             received[i], poll_interval)
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            writer.join()
+        scheduler.shutdown(wait=True)
+        lags = np.concatenate([np.array(got) - np.array(sent[:len(got)]) for sent, got in zip(written, received)])
+        result[f"live_workers_{n}_lag_p50_ms"] = _percentile(lags, 50) * 1e3
+        result[f"live_workers_{n}_lag_p95_ms"] = _percentile(lags, 95) * 1e3
+    if len(workers) > 1:
+        result["live_speedup"] = result[f"live_workers_{workers[0]}_lag_p95_ms"] / \
+            result[f"live_workers_{workers[-1]}_lag_p95_ms"]
+    return result
+
+
+def _archive(root, patients, seconds, files_per_patient, rate):
+    """Synthetic recordings sorted into <study_code> <DDMMYYYY> folders like organize_file_path does. Returns their size."""
+    flat = os.path.join(root, "generated")
+    paths = generate(flat, patients=patients, seconds=seconds, rate=rate, files_per_patient=files_per_patient)
+    size = sum(os.path.getsize(path) for path in paths)
+    for path in paths:
+        parts = os.path.basename(path).split("_")
+        folder = os.path.join(root, f"{parts[1]} {''.join(parts[2].split('.')[:3])}")
+        os.makedirs(folder, exist_ok=True)
+        shutil.move(path, folder)
+    os.rmdir(flat)
+    return size
+
+
+def bench_reprocess(tmp, patients=8, seconds=1800, files_per_patient=2, rate=1.0, workers=(1, os.cpu_count() or 1)):
+    archive = os.path.join(tmp, "archive")
+    size_mb = _archive(archive, patients, seconds, files_per_patient, rate) / 1e6
+    manifest = os.path.join(archive, MANIFEST_NAME)
+    result = {"files": patients * files_per_patient, "archive_mb": size_mb}
+    for n in dict.fromkeys(workers):
+        if os.path.exists(manifest):
+            os.remove(manifest)
+        # About four work units per worker process
+        elapsed = reprocess(archive, workers=n, chunk_mb=max(size_mb / (4 * n), 1))["seconds"]
+        result[f"workers_{n}_seconds"] = elapsed
+        result[f"workers_{n}_mb_per_second"] = size_mb / elapsed
+    # Nothing changed, so a second run only compares sizes and mtimes
+    result["rerun_seconds"] = reprocess(archive, workers=workers[-1])["seconds"]
+    if workers[0] != workers[-1]:
+        result["speedup"] = result[f"workers_{workers[0]}_seconds"] / result[f"workers_{workers[-1]}_seconds"]
+
+    # The same amount of data as a single recording, cut into byte ranges
+    one_file = os.path.join(tmp, "one_file")
+    _archive(one_file, 1, seconds * patients * files_per_patient, 1, rate)
+    for n in dict.fromkeys(workers):
+        if os.path.exists(os.path.join(one_file, MANIFEST_NAME)):
+            os.remove(os.path.join(one_file, MANIFEST_NAME))
+        elapsed = reprocess(one_file, workers=n, chunk_mb=max(size_mb / (4 * n), 1))["seconds"]
+        result[f"one_file_workers_{n}_seconds"] = elapsed
+    if workers[0] != workers[-1]:
+        result["one_file_speedup"] = result[f"one_file_workers_{workers[0]}_seconds"] / \
+            result[f"one_file_workers_{workers[-1]}_seconds"]
+    return result
+
+
+# What monitor.main() does before it starts watching for devices
+_STARTUP_CODE = ("import sys, time; sys.path.insert(0, {path!r}); start = time.perf_counter(); "
+                 "import monitor; monitor.configure_logging('file_watch.log'); monitor.Monitor({mode!r}); "
+                 "print(time.perf_counter() - start)")
+
+
+def bench_startup(tmp, mode="rows", repeat=5):
+    code = _STARTUP_CODE.format(path=READ_DATA_DIR, mode=mode)
+    env = dict(os.environ, METRICS_PORT="0")
+    imports, totals = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", code], cwd=tmp, env=env, capture_output=True, text=True,
+                             check=True).stdout
+        totals.append(time.perf_counter() - start)
+        imports.append(float(out.strip().splitlines()[-1]))
+
+    # One more run with -X importtime to name the most expensive top-level imports
+    err = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=tmp, env=env,
+                         capture_output=True, text=True, check=True).stderr
+    top_level = []
+    for line in err.splitlines():
+        parts = line.split("|")
+        if line.startswith("import time:") and len(parts) == 3 and parts[1].strip().isdigit() \
+                and not parts[2].startswith("  "):
+            top_level.append((int(parts[1]), parts[2].strip()))
+    slowest = sorted(top_level, reverse=True)[:5]
+    return {
+        "mode": mode,
+        "import_ms": float(np.median(imports)) * 1e3,
+        "process_ms": float(np.median(totals)) * 1e3,
+        "slowest_imports": ", ".join(f"{name} {us / 1e3:.0f} ms" for us, name in slowest),
+    }
+
+
+# Metric names say which way is better: durations end in _ms, _us or
+# _seconds, throughputs in _per_second. Anything else (counts, settings) is
+# reported but not compared.
+def _lower_is_better(metric):
+    return metric.endswith(("_ms", "_us", "_seconds"))
+
+
+def _higher_is_better(metric):
+    return metric.endswith(("_per_second", "speedup"))
+
+
+def compare(results, baseline, tolerance):
+    """Return a line per metric that is worse than the baseline by more than `tolerance` (a fraction)."""
+    regressions = []
+    for scenario, metrics in results["scenarios"].items():
+        old_metrics = baseline.get("scenarios", {}).get(scenario, {})
+        for metric, value in metrics.items():
+            old = old_metrics.get(metric)
+            if not isinstance(old, (int, float)) or not isinstance(value, (int, float)) or not old:
+                continue
+            change = (value - old) / old
+            if (_lower_is_better(metric) and change > tolerance) or (_higher_is_better(metric) and change < -tolerance):
+                regressions.append(f"{scenario}.{metric}: {old:.4g} -> {value:.4g} ({change:+.0%})")
+    return regressions
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the offline monitor benchmarks")
+    parser.add_argument("scenarios", nargs="*",
+                        help="parse_throughput, tail_latency, detection_cost, multi_file, reprocess, startup "
+                             "(default: all)")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="earlier results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed slowdown as a fraction (default 0.2)")
+    parser.add_argument("--quick", action="store_true", help="smaller inputs, for a smoke run")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="tail poll interval, as in the scripts")
+    parser.add_argument("--startup-budget-ms", type=float, default=STARTUP_BUDGET_MS,
+                        help=f"fail when the startup scenario's import_ms exceeds this (default {STARTUP_BUDGET_MS})")
+    args = parser.parse_args(argv)
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    quick = args.quick
+    scenarios = {
+        "parse_throughput": lambda tmp: bench_parse_throughput(tmp, rows=500 if quick else 3000),
+        "tail_latency": lambda tmp: bench_tail_latency(tmp, seconds=3 if quick else 10,
+                                                       poll_interval=args.poll_interval),
+        "detection_cost": lambda tmp: bench_detection_cost(windows=20 if quick else 200,
+                                                           stage_rows=600 if quick else 3600),
+        "multi_file": lambda tmp: bench_multi_file(tmp, patients=4 if quick else 8,
+                                                   seconds=120 if quick else 600,
+                                                   live_seconds=2 if quick else 5),
+        "reprocess": lambda tmp: bench_reprocess(tmp, patients=4 if quick else 8,
+                                                 seconds=300 if quick else 1800),
+        "startup": lambda tmp: bench_startup(tmp, repeat=3 if quick else 5),
+    }
+    selected = args.scenarios or list(scenarios)
+    unknown = set(selected) - set(scenarios)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "quick": quick,
+        },
+        "scenarios": {},
+    }
+    for name in selected:
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            results["scenarios"][name] = scenarios[name](tmp)
+        print(f"{name} ({time.perf_counter() - start:.1f} s)")
+        for metric, value in results["scenarios"][name].items():
+            print(f"  {metric:<28} {value:.4g}" if isinstance(value, float) else f"  {metric:<28} {value}")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=4)
+    print(f"Results written to {args.output}")
+
+    status = 0
+    startup = results["scenarios"].get("startup")
+    if startup is not None and startup["import_ms"] > args.startup_budget_ms:
+        print(f"Startup over budget: {startup['import_ms']:.0f} ms > {args.startup_budget_ms:.0f} ms "
+              f"(slowest: {startup['slowest_imports']})")
+        status = 1
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"Regressions against {args.compare} (tolerance {args.tolerance:.0%}):")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"No regressions against {args.compare}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,9 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The monitor modules are flat files in ReadData/; the fake adb lives in benchmarks/
+sys.path.insert(0, os.path.join(ROOT, "ReadData"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+FAKE_ADB = os.path.join(ROOT, "benchmarks", "adb.cmd" if os.name == "nt" else "adb")
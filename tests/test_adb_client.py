@@ -0,0 +1,113 @@
+"""The poll loop against the fake adb: no per-tick process spawns when the adb server is used."""
+import subprocess
+import time
+
+import pytest
+
+import adb_client
+import fake_adb
+from adb_client import AdbClient
+from conftest import FAKE_ADB
+from tailer import FileTailer
+
+FOLDER = "/sdcard/Download/OximeterData"
+NAME = "SmartCareCsv_T-001_01.01.2025.10.00.00_01.01.2025.10.05.00.csv"
+TICKS = 5
+
+
+@pytest.fixture
+def device(tmp_path, monkeypatch):
+    root = tmp_path / "device"
+    folder = root.joinpath(*FOLDER.strip("/").split("/"))
+    folder.mkdir(parents=True)
+    (folder / NAME).write_bytes(b"timestamp,device_id\n")
+    # The executable reads FAKE_ADB_ROOT; the in-process server uses the module's ROOT
+    monkeypatch.setenv("FAKE_ADB_ROOT", str(root))
+    monkeypatch.setattr(fake_adb, "ROOT", str(root))
+    return folder / NAME
+
+
+@pytest.fixture
+def spawns(monkeypatch):
+    """Command lines of every process started (subprocess.run goes through Popen too)."""
+    calls = []
+    real_popen = subprocess.Popen
+
+    class Popen(real_popen):
+        def __init__(self, args, *a, **kw):
+            calls.append(list(args))
+            super().__init__(args, *a, **kw)
+
+    monkeypatch.setattr(subprocess, "Popen", Popen)
+    return calls
+
+
+def _poll_loop(client, path, tmp_path):
+    """What a monitor worker does every second: tail the recording and list the folder."""
+    tailer = FileTailer(client, f"{FOLDER}/{NAME}", str(tmp_path / "local.csv"))
+    lines = []
+    for tick in range(TICKS):
+        with open(path, "ab") as f:
+            f.write(f"2025-01-01 10:00:0{tick}.000000+07:00,dev\n".encode())
+        lines.extend(tailer.poll())
+        assert NAME in client.stat_files(FOLDER)
+    return lines
+
+
+def test_server_mode_spawns_no_processes(device, spawns, tmp_path):
+    with fake_adb.FakeAdbServer() as server:
+        client = AdbClient(FAKE_ADB, port=server.port)
+        lines = _poll_loop(client, device, tmp_path)
+
+    assert len(lines) == TICKS + 1
+    assert spawns == []
+    # host:devices once for the serial, then one connection per command
+    assert server.connections == 1 + 2 * TICKS
+
+
+def test_executable_fallback_resolves_serial_once(device, spawns, tmp_path):
+    client = AdbClient(FAKE_ADB, use_server=False)
+    lines = _poll_loop(client, device, tmp_path)
+
+    assert len(lines) == TICKS + 1
+    assert [args[1:] for args in spawns].count(["devices"]) == 1
+    # One process per command and none for the serial lookup
+    assert len(spawns) == 1 + 2 * TICKS
+
+
+def test_server_pull(device, tmp_path):
+    with fake_adb.FakeAdbServer() as server:
+        client = AdbClient(FAKE_ADB, port=server.port)
+        assert client.pull(f"{FOLDER}/{NAME}", str(tmp_path)) == ""
+    assert (tmp_path / NAME).read_bytes() == device.read_bytes()
+
+
+def test_fail_reply_falls_back_to_the_executable(device, spawns):
+    with fake_adb.FakeAdbServer() as server:
+        server.fail_requests.add("host:devices")
+        client = AdbClient(FAKE_ADB, port=server.port)
+        assert client.list_devices() == [fake_adb.SERIALS[0]]
+
+    assert [args[1:] for args in spawns] == [["devices"]]
+
+
+def test_server_is_retried_after_a_restart(device, spawns, tmp_path, monkeypatch):
+    monkeypatch.setattr(adb_client, "ADB_SERVER_RETRY_SECONDS", 0.2)
+    monkeypatch.setattr(adb_client, "ADB_SERVER_RETRY_MAX_SECONDS", 0.2)
+    server = fake_adb.FakeAdbServer()
+    port = server.port
+    server.server_close()
+    client = AdbClient(FAKE_ADB, port=port)
+
+    # Nothing listening: the executable is used until the backoff runs out
+    assert NAME in client.stat_files(FOLDER)
+    assert NAME in client.stat_files(FOLDER)
+    spawned = len(spawns)
+    assert spawned >= 2
+
+    with fake_adb.FakeAdbServer(port) as server:
+        time.sleep(0.3)
+        _poll_loop(client, device, tmp_path)
+
+    assert len(spawns) == spawned
+    assert server.connections == 2 * TICKS
@@ -0,0 +1,178 @@
+"""CheckpointStore across flushes and reopens, and a monitor stopped and resumed from its checkpoints."""
+import os
+import threading
+import time
+
+import pytest
+
+import monitor
+from adb_client import AdbClient
+from alert_dispatcher import AlertDispatcher
+from checkpoint_store import Checkpoint, CheckpointStore, replay_rows
+from conftest import FAKE_ADB
+from device_manager import Device
+from generate_data import generate
+from recording_store import timestamp_to_us
+
+FOLDER = "/sdcard/Download/OximeterData"
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoints.sqlite3"), flush_interval=60)
+    yield store
+    store.close()
+
+
+def test_update_get_flush_reopen(store, tmp_path):
+    assert store.get("a.csv") is None
+    store.update("a.csv", Checkpoint(100, 2, 40, 1_000_000))
+    # Visible before and after it is written
+    assert store.get("a.csv") == Checkpoint(100, 2, 40, 1_000_000)
+    store.flush()
+    assert store.get("a.csv") == Checkpoint(100, 2, 40, 1_000_000)
+
+    store.update("a.csv", Checkpoint(250, 5, 40, 1_000_000, done=True))
+    store.update("b.csv", Checkpoint(10, 1))
+    store.close()
+
+    reopened = CheckpointStore(store.path, flush_interval=60)
+    try:
+        assert reopened.get("a.csv") == Checkpoint(250, 5, 40, 1_000_000, done=True)
+        assert reopened.get("b.csv") == Checkpoint(10, 1)
+    finally:
+        reopened.close()
+
+
+class _HeldDb:
+    """Wraps the store's connection so a test can hold a flush in the middle of its write."""
+
+    def __init__(self, db):
+        self._db = db
+        self.writing = threading.Event()
+        self.release = threading.Event()
+
+    def executemany(self, sql, rows):
+        self.writing.set()
+        self.release.wait(5)
+        return self._db.executemany(sql, rows)
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+    def __enter__(self):
+        return self._db.__enter__()
+
+    def __exit__(self, *exc):
+        return self._db.__exit__(*exc)
+
+
+def test_get_during_a_flush_sees_the_batch_being_written(store):
+    store.update("a.csv", Checkpoint(100, 1))
+    store.flush()
+    store.update("a.csv", Checkpoint(200, 2))
+    held = store._db = _HeldDb(store._connect())
+    flush = threading.Thread(target=store.flush)
+    flush.start()
+    assert held.writing.wait(5)
+
+    # Straight from memory: neither the older row in the database nor a wait for the write
+    start = time.monotonic()
+    assert store.get("a.csv") == Checkpoint(200, 2)
+    assert time.monotonic() - start < 1
+    store.update("a.csv", Checkpoint(300, 3))
+    held.release.set()
+    flush.join()
+
+    # The newer value that arrived during the write is kept for the next flush
+    assert store.get("a.csv") == Checkpoint(300, 3)
+    store.close()
+    reopened = CheckpointStore(store.path)
+    try:
+        assert reopened.get("a.csv") == Checkpoint(300, 3)
+    finally:
+        reopened.close()
+
+
+def test_replay_rows(tmp_path):
+    path, = generate(str(tmp_path), seconds=20)
+    with open(path, "rb") as f:
+        lines = f.read().splitlines(keepends=True)
+    header, rows = len(lines[0]), lines[1:]
+    end = header + sum(len(line) for line in rows[:15])
+
+    def timestamps(rows):
+        return [row.timestamp for row in rows]
+
+    # The rows from the pending window's offset up to the checkpoint
+    replayed = replay_rows(path, Checkpoint(end, 15, header + sum(len(line) for line in rows[:5])))
+    assert timestamps(replayed) == [line.split(b'","')[0].strip(b'"').decode() for line in rows[5:15]]
+    # Rows before the last complete window's end are left out
+    window_end = timestamp_to_us(replayed[3].timestamp)
+    assert timestamps(replay_rows(path, Checkpoint(end, 15, header, window_end))) == \
+        timestamps(replay_rows(path, Checkpoint(end, 15, header)))[8:]
+    assert replay_rows(path, Checkpoint(end, 15, end)) == []
+
+
+def _ingest(tmp_path, run, name, store, stop_after_rows=None):
+    """Tail one recording like a monitor worker; stop once `stop_after_rows` rows are checkpointed."""
+    mon = monitor.Monitor("windows", adb_path=FAKE_ADB, base_path=str(tmp_path / f"archive-{run}"),
+                          segment_folder=str(tmp_path / f"segments-{run}"), dispatcher=AlertDispatcher(method="log"),
+                          checkpoints=store)
+    device = Device(AdbClient(FAKE_ADB, use_server=False))
+    if stop_after_rows is not None:
+        def stop():
+            while not device.stop_event.wait(0.05):
+                checkpoint = store.get(name)
+                if checkpoint is not None and checkpoint.rows >= stop_after_rows:
+                    device.stop_event.set()
+        threading.Thread(target=stop, daemon=True).start()
+    mon.read_new_data(name, device)
+    mon.dispatcher.close()
+    return mon
+
+
+def _segments(folder):
+    names = sorted(os.listdir(folder))
+    contents = {}
+    for name in names:
+        with open(os.path.join(folder, name), "rb") as f:
+            contents[name] = f.read()
+    return contents
+
+
+def test_stop_and_resume_gives_the_same_segments(tmp_path, monkeypatch):
+    monkeypatch.setattr(monitor, "IDLE_POLLS", 1)
+    device_root = tmp_path / "device"
+    folder = device_root.joinpath(*FOLDER.strip("/").split("/"))
+    monkeypatch.setenv("FAKE_ADB_ROOT", str(device_root))
+    # 10 minutes at one row per second: three complete 3 minute segments and a partial one
+    path, = generate(str(tmp_path / "source"), seconds=600)
+    name = os.path.basename(path)
+    with open(path, "rb") as f:
+        data = f.read()
+    folder.mkdir(parents=True)
+
+    # Uninterrupted run
+    (folder / name).write_bytes(data)
+    store = CheckpointStore(str(tmp_path / "straight.sqlite3"), flush_interval=0.1)
+    _ingest(tmp_path, "straight", name, store)
+    store.close()
+
+    # Stopped part way (the recording still growing on the phone), then resumed
+    # by a new monitor with the checkpoints reopened from disk
+    cut = data.index(b"\n", len(data) * 2 // 5) + 1
+    (folder / name).write_bytes(data[:cut])
+    store = CheckpointStore(str(tmp_path / "resumed.sqlite3"), flush_interval=0.1)
+    _ingest(tmp_path, "resumed", name, store, stop_after_rows=data[:cut].count(b"\n") - 1)
+    store.close()
+    reopened = CheckpointStore(store.path, flush_interval=0.1)
+    assert not reopened.get(name).done
+    (folder / name).write_bytes(data)
+    _ingest(tmp_path, "resumed", name, reopened)
+    assert reopened.get(name).done
+    reopened.close()
+
+    straight = _segments(tmp_path / "segments-straight")
+    assert len(straight) == 4
+    assert _segments(tmp_path / "segments-resumed") == straight
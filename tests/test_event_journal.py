@@ -0,0 +1,73 @@
+"""EventJournal appends, fsyncs and rotates by size; read_events reads the rotated files back in order."""
+import json
+import os
+
+import pytest
+
+from event_journal import EventJournal, read_events
+
+
+@pytest.fixture
+def fsyncs(monkeypatch):
+    calls = []
+    real_fsync = os.fsync
+
+    def fsync(fd):
+        calls.append(fd)
+        real_fsync(fd)
+
+    monkeypatch.setattr(os, "fsync", fsync)
+    return calls
+
+
+def _event(i):
+    # Non-ASCII text takes more bytes than characters
+    return {"device": "FAKE0001", "event": "drop", "index": i, "note": "SpO₂ ลดลง"}
+
+
+def test_append_and_fsync(tmp_path, fsyncs):
+    path = tmp_path / "events.jsonl"
+    journal = EventJournal(str(path), flush_interval=60, fsync_interval=60)
+    journal.append(_event(0))
+    journal.append(_event(1))
+
+    journal.flush(fsync=True)
+    assert len(fsyncs) == 1
+    assert [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()] == [_event(0), _event(1)]
+
+    journal.append(_event(2))
+    journal.close()
+    assert len(fsyncs) == 2
+    assert read_events(str(path))["events"] == [_event(i) for i in range(3)]
+
+
+def test_rotates_at_max_bytes(tmp_path):
+    path = tmp_path / "events.jsonl"
+    line_bytes = len((json.dumps(_event(0)) + "\n").encode("utf-8"))
+    journal = EventJournal(str(path), max_bytes=3 * line_bytes, backup_count=2, flush_interval=60)
+    for i in range(10):
+        journal.append(_event(i))
+    journal.close()
+
+    files = [path, tmp_path / "events.jsonl.1", tmp_path / "events.jsonl.2"]
+    assert not (tmp_path / "events.jsonl.3").exists()
+    assert all(f.stat().st_size <= 3 * line_bytes for f in files)
+    # 10 events in files of 3: the oldest rotated file was dropped
+    assert [e["index"] for e in read_events(str(path))["events"]] == [3, 4, 5, 6, 7, 8, 9]
+
+
+def test_read_events_across_rotated_files(tmp_path):
+    path = tmp_path / "events.jsonl"
+    legacy = tmp_path / "events.json"
+    legacy.write_text(json.dumps({"events": [{"index": "legacy"}]}), encoding="utf-8")
+    journal = EventJournal(str(path), max_bytes=200, backup_count=10, flush_interval=60)
+    for i in range(8):
+        journal.append(_event(i))
+    journal.close()
+    assert (tmp_path / "events.jsonl.2").exists()
+    # A crash in the middle of a write leaves a partial last line
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"index": 8, "dev')
+
+    events = read_events(str(path), str(legacy))["events"]
+    assert [e["index"] for e in events] == ["legacy"] + list(range(8))
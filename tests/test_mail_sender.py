@@ -0,0 +1,143 @@
+"""MailSender's SMTP method against a local stand-in: one connection and login for a burst of alerts."""
+import shutil
+import socketserver
+import ssl
+import subprocess
+import threading
+
+import pytest
+
+from mail_sender import MailSender
+
+ALERTS = 5
+
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    """Just enough ESMTP for smtplib: EHLO, STARTTLS, AUTH PLAIN, MAIL/RCPT/DATA, NOOP, QUIT."""
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+            generation = server.generation
+        sock, rfile, wfile = self.request, self.rfile, self.wfile
+        tls = False
+
+        def reply(*lines):
+            for line in lines:
+                wfile.write(line.encode() + b"\r\n")
+            wfile.flush()
+
+        reply("220 localhost ESMTP stand-in")
+        while True:
+            line = rfile.readline()
+            if not line or server.generation != generation:
+                # drop() was called: hang up without answering, like an idle timeout
+                break
+            verb = line.decode().strip().split(" ", 1)[0].upper()
+            if verb in ("EHLO", "HELO"):
+                reply("250-localhost", *([] if tls else ["250-STARTTLS"]), "250 AUTH PLAIN")
+            elif verb == "STARTTLS":
+                reply("220 Ready to start TLS")
+                sock = server.context.wrap_socket(sock, server_side=True)
+                rfile, wfile = sock.makefile("rb"), sock.makefile("wb")
+                tls = True
+            elif verb == "AUTH":
+                with server.lock:
+                    server.logins += 1
+                reply("235 Authentication successful")
+            elif verb == "DATA":
+                reply("354 End data with <CR><LF>.<CR><LF>")
+                message = b"".join(iter(lambda: rfile.readline(), b".\r\n"))
+                with server.lock:
+                    server.messages.append(message)
+                reply("250 OK")
+            elif verb == "QUIT":
+                reply("221 Bye")
+                break
+            else:
+                reply("250 OK")
+        sock.close()
+
+
+class SmtpStandIn(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, certfile, keyfile):
+        super().__init__(("127.0.0.1", 0), _SmtpHandler)
+        self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self.context.load_cert_chain(certfile, keyfile)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.logins = 0
+        self.messages = []
+        self.generation = 0
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def drop(self):
+        """Make every open connection hang up on its next command."""
+        self.generation += 1
+
+
+@pytest.fixture(scope="module")
+def certificate(tmp_path_factory):
+    if shutil.which("openssl") is None:
+        pytest.skip("openssl is needed to make the stand-in's TLS certificate")
+    folder = tmp_path_factory.mktemp("tls")
+    cert, key = str(folder / "cert.pem"), str(folder / "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-subj", "/CN=localhost", "-keyout", key, "-out", cert],
+        check=True, capture_output=True,
+    )
+    return cert, key
+
+
+@pytest.fixture
+def smtp_server(certificate, monkeypatch):
+    server = SmtpStandIn(*certificate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("SMTP_SERVER", "127.0.0.1")
+    monkeypatch.setenv("SMTP_PORT", str(server.port))
+    monkeypatch.setenv("SMTP_USERNAME", "monitor@example.com")
+    monkeypatch.setenv("SMTP_PASSWORD", "secret")
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _send(sender, index):
+    return sender.send_mail("nurse@example.com", f"Alert {index}", "Oximeter drop detected", method="smtp")
+
+
+def test_alerts_share_one_connection(smtp_server):
+    sender = MailSender()
+    try:
+        results = [_send(sender, i) for i in range(ALERTS)]
+    finally:
+        sender.close()
+
+    assert results == ["Email sent successfully via SMTP."] * ALERTS
+    assert len(smtp_server.messages) == ALERTS
+    assert smtp_server.connections == 1
+    assert smtp_server.logins == 1
+
+
+def test_reconnects_after_the_server_drops_the_connection(smtp_server):
+    sender = MailSender()
+    try:
+        assert _send(sender, 0) == "Email sent successfully via SMTP."
+        smtp_server.drop()
+        results = [_send(sender, i) for i in range(1, ALERTS)]
+    finally:
+        sender.close()
+
+    assert results == ["Email sent successfully via SMTP."] * (ALERTS - 1)
+    assert len(smtp_server.messages) == ALERTS
+    # One reconnect (and login) after the drop, then the new connection is reused
+    assert smtp_server.connections == 2
+    assert smtp_server.logins == 2
@@ -0,0 +1,229 @@
+"""PipelineLogClient and ModelLogUploader against a local HTTP stand-in of the pipeline API."""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from pipeline_log import ModelLogUploader, PipelineLogClient
+
+
+class _ApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, as the uploader's session expects
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        server = self.server
+        time.sleep(server.delay)
+        with server.lock:
+            server.gets.append(self.path)
+            if server.down:
+                self._reply(503, {})
+            elif self.path == "/api/logs/system_log/":
+                self._reply(200, {"email_mode": server.email_mode})
+            elif self.path == "/api/patients/":
+                self._reply(200, [{"study_code": code, "id": i} for code, i in server.patients.items()])
+            else:
+                self._reply(404, {})
+
+    def do_POST(self):
+        entry = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server = self.server
+        with server.lock:
+            if server.failures:
+                server.failures -= 1
+                status = 503
+            elif entry["content"] in server.rejected:
+                status = 400
+            else:
+                status = 200
+            server.posts.append((entry["content"], status))
+        self._reply(status, {})
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ApiStandIn(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _ApiHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.posts = []          # (content, status) of every POST
+        self.failures = 0        # answer this many POSTs with 503
+        self.rejected = set()    # contents answered with 400
+        self.gets = []           # path of every GET
+        self.email_mode = True
+        self.patients = {"P-001": 1}
+        self.down = False        # answer GETs with 503
+        self.delay = 0.0         # seconds before a GET is answered
+
+    def delivered(self):
+        with self.lock:
+            return [content for content, status in self.posts if status == 200]
+
+
+@pytest.fixture
+def api():
+    server = ApiStandIn()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def make_client(api):
+    made = []
+
+    def make(**kwargs):
+        client = PipelineLogClient(f"http://127.0.0.1:{api.server_address[1]}/api", **kwargs)
+        made.append(client)
+        return client
+
+    yield make
+    for client in made:
+        client.close()
+
+
+@pytest.fixture
+def make_uploader(make_client, tmp_path):
+    made = []
+
+    def make(**kwargs):
+        client = make_client()
+        # Let the client's first background fetch finish, so it does not race the uploads
+        assert _wait_for(lambda: client.get_patients() and client.get_mode())
+        uploader = ModelLogUploader(client, spool_path=str(tmp_path / "spool.jsonl"), **kwargs)
+        made.append(uploader)
+        return uploader
+
+    yield make
+    for uploader in made:
+        uploader.close()
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def _timed(lookup):
+    start = time.perf_counter()
+    value = lookup()
+    return value, time.perf_counter() - start
+
+
+def test_lookups_are_cached_for_the_ttl(api, make_client):
+    client = make_client(ttl=60)
+    assert _wait_for(lambda: client.get_patients() == {"P-001": 1} and client.get_mode() is True)
+
+    for _ in range(10):
+        assert client.get_patients() == {"P-001": 1}
+        assert client.get_mode() is True
+    # One fetch of each, at startup, over one kept-alive connection
+    assert sorted(api.gets) == ["/api/logs/system_log/", "/api/patients/"]
+    assert api.connections == 1
+
+
+def test_expired_value_is_returned_while_it_is_refreshed(api, make_client):
+    # After each refresh pass the refresher pauses for `timeout` seconds
+    client = make_client(ttl=0.3, timeout=1.0)
+    assert _wait_for(lambda: client.get_patients() == {"P-001": 1})
+    api.patients = {"P-001": 1, "P-002": 2}
+    time.sleep(0.5)
+
+    value, elapsed = _timed(client.get_patients)
+    assert value == {"P-001": 1}
+    assert elapsed < 0.05
+    assert _wait_for(lambda: client.get_patients() == {"P-001": 1, "P-002": 2})
+    assert api.gets.count("/api/patients/") == 2
+    assert api.connections == 1
+
+
+def test_lookups_never_wait_for_the_api(api, make_client):
+    api.delay = 1.0
+    client = make_client(ttl=60)
+
+    # Nothing fetched yet and the API is slow: the defaults, straight away
+    for lookup, default in ((client.get_mode, False), (client.get_patients, {})):
+        value, elapsed = _timed(lookup)
+        assert value == default
+        assert elapsed < 0.05
+    assert _wait_for(lambda: client.get_mode() is True)
+
+
+def test_falls_back_to_the_default_while_the_api_is_down(api, make_client):
+    api.down = True
+    client = make_client(ttl=60, timeout=0.2)
+    assert _wait_for(lambda: len(api.gets) >= 2)
+    assert client.get_patients() == {}
+    assert client.get_mode() is False
+
+    # Each lookup wakes the background thread, which tries again at most once per `timeout`
+    api.down = False
+    assert _wait_for(lambda: client.get_patients() == {"P-001": 1})
+    assert api.gets.count("/api/patients/") >= 2
+
+
+def test_sends_full_batches_over_one_connection(api, make_uploader):
+    uploader = make_uploader(batch_size=3, flush_interval=30)
+    uploader.submit(1, "log 0", {})
+    uploader.submit(1, "log 1", {})
+    time.sleep(0.3)
+    # A partial batch waits for the flush interval
+    assert api.posts == []
+
+    uploader.submit(1, "log 2", {})
+    assert _wait_for(lambda: len(api.delivered()) == 3)
+    uploader.submit(1, "log 3", {})
+    uploader.close()
+
+    assert api.delivered() == ["log 0", "log 1", "log 2", "log 3"]
+    assert uploader.sent == 4
+    assert api.connections == 1
+
+
+def test_retries_when_the_api_fails(api, make_uploader):
+    api.failures = 2
+    uploader = make_uploader(batch_size=3, flush_interval=0.05, backoff=0.01)
+    for i in range(3):
+        uploader.submit(1, f"log {i}", {})
+
+    assert _wait_for(lambda: uploader.sent == 3)
+    # The first entry was tried three times, the others once, in order
+    assert [content for content, _ in api.posts] == ["log 0", "log 0", "log 0", "log 1", "log 2"]
+    assert uploader.stats()["consecutive_failures"] == 0
+    assert uploader.dropped == 0
+    assert api.connections == 1
+
+
+def test_drops_entries_the_api_rejects(api, make_uploader):
+    api.rejected = {"bad"}
+    uploader = make_uploader(batch_size=3, flush_interval=0.05, backoff=0.01)
+    for content in ("log 0", "bad", "log 1"):
+        uploader.submit(1, content, {})
+
+    assert _wait_for(lambda: uploader.sent + uploader.dropped == 3)
+    assert api.posts == [("log 0", 200), ("bad", 400), ("log 1", 200)]
+    assert uploader.dropped == 1
+    assert uploader.queue_depth == 0
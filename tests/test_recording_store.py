@@ -0,0 +1,96 @@
+"""SmartCareCsv -> .rec bundle -> arrays round trip on a sample recording, eagerly and through the mmap reader."""
+import os
+
+import numpy as np
+import pytest
+
+from conftest import ROOT
+from recording_reader import Recording
+from recording_store import ARRAY_COLUMNS, SCALAR_COLUMNS, convert_csv, join_bundles, load_recording, timestamp_to_us, write_bundle
+from row_parser import is_header, parse_row
+
+SAMPLE = os.path.join(ROOT, "sampledata", "SmartCareCsv__11.02.2025.14.59.00_11.02.2025.14.59.48.csv")
+
+
+@pytest.fixture(scope="module")
+def rows():
+    with open(SAMPLE, "r") as f:
+        return [parse_row(line) for line in f if line.strip() and not is_header(line)]
+
+
+def _assert_matches(columns, device_ids, rows):
+    assert len(columns["timestamp"]) == len(rows)
+    for i, row in enumerate(rows):
+        assert columns["timestamp"][i] == timestamp_to_us(row.timestamp)
+        assert device_ids[columns["device"][i]] == row.device_id
+        assert (columns["battery"][i], columns["hr"][i], columns["o2"][i]) == (row.battery, row.hr, row.o2)
+        for name in ARRAY_COLUMNS:
+            # Exact: the CSV written back from a bundle must show the same numbers
+            assert columns[name][i].tolist() == getattr(row, name).tolist(), name
+
+
+def test_convert_csv_round_trip(rows, tmp_path):
+    path, skipped = convert_csv(SAMPLE, str(tmp_path / "sample.rec"))
+    assert skipped == 0
+
+    meta, columns = load_recording(path)
+    assert meta["rows"] == len(rows)
+    assert meta["samples_per_row"] == len(rows[0].pleth)
+    assert meta["utc_offset_seconds"] == 7 * 3600
+    assert meta["source"] == os.path.basename(SAMPLE)
+    _assert_matches(columns, meta["device_ids"], rows)
+
+
+def test_mmap_reader(rows, tmp_path):
+    path, _ = convert_csv(SAMPLE, str(tmp_path / "sample.rec"))
+    recording = Recording(path)
+    assert len(recording) == len(rows)
+    assert recording.time_bounds() == (timestamp_to_us(rows[0].timestamp), timestamp_to_us(rows[-1].timestamp))
+
+    views = recording.read()
+    assert isinstance(views["pleth"].base, np.memmap)
+    _assert_matches(views, recording.meta["device_ids"], rows)
+
+    # A time range selects its rows without reading the others
+    start, end = rows[10].timestamp, rows[19].timestamp
+    part = recording.read(start, end, columns=["timestamp", "perfusion"])
+    assert set(part) == {"timestamp", "perfusion"}
+    assert part["timestamp"].tolist() == [timestamp_to_us(row.timestamp) for row in rows[10:20]]
+    assert part["perfusion"].tolist() == [row.perfusion.tolist() for row in rows[10:20]]
+
+
+def test_write_bundle_casts_and_replaces(rows, tmp_path):
+    _, columns = load_recording(convert_csv(SAMPLE, str(tmp_path / "sample.rec"))[0])
+    window = {name: np.asarray(column[:5]).astype(np.int64 if name in SCALAR_COLUMNS else column.dtype)
+              for name, column in columns.items()}
+    path = str(tmp_path / "window.rec")
+    write_bundle(path, window, ["dev"], utc_offset_seconds=3600)
+    # Writing again replaces the bundle
+    write_bundle(path, window, ["dev"], utc_offset_seconds=3600)
+
+    meta, loaded = load_recording(path, mmap_mode="r")
+    assert meta["rows"] == 5 and meta["device_ids"] == ["dev"]
+    assert not os.path.exists(path + ".tmp")
+    for name, dtype in {**SCALAR_COLUMNS, **ARRAY_COLUMNS}.items():
+        assert loaded[name].dtype == dtype
+        assert loaded[name].tolist() == window[name].tolist()
+
+
+def test_join_bundles(rows, tmp_path):
+    _, columns = load_recording(convert_csv(SAMPLE, str(tmp_path / "sample.rec"))[0])
+    # Parts with their own device indices, and an empty one
+    parts = []
+    for i, (lo, hi, device_ids) in enumerate(((0, 10, ["a", "b"]), (10, 10, []), (10, None, ["b", "a"]))):
+        part = {name: column[lo:hi] for name, column in columns.items()}
+        part["device"] = np.arange(len(part["timestamp"])) % 2 if device_ids else part["device"]
+        parts.append(write_bundle(str(tmp_path / f"part{i}.rec"), part, device_ids, utc_offset_seconds=3600))
+
+    meta, joined = load_recording(join_bundles(str(tmp_path / "joined.rec"), parts, source="sample.csv"))
+    assert meta["rows"] == len(rows)
+    assert meta["device_ids"] == ["a", "b"] and meta["utc_offset_seconds"] == 3600
+    assert meta["source"] == "sample.csv"
+    n = len(rows) - 10
+    assert joined["device"].tolist() == [i % 2 for i in range(10)] + [1 - i % 2 for i in range(n)]
+    for name, column in columns.items():
+        if name != "device":
+            assert joined[name].tolist() == column.tolist(), name
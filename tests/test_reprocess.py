@@ -0,0 +1,113 @@
+"""reprocess.py on a synthetic archive: work unit planning, and large recordings processed in ranges."""
+import json
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from generate_data import generate
+from recording_store import bundle_path, load_recording, timestamp_to_us
+from reprocess import MANIFEST_NAME, SEGMENT_SECONDS, _window_boundary, plan_chunks, reprocess
+from row_parser import parse_row
+
+
+def _archive(root, seconds=1500):
+    """One recording sorted into its <study_code> <DDMMYYYY> folder. Returns its path."""
+    path, = generate(os.path.join(root, "generated"), seconds=seconds)
+    parts = os.path.basename(path).split("_")
+    folder = os.path.join(root, f"{parts[1]} {''.join(parts[2].split('.')[:3])}")
+    os.makedirs(folder)
+    shutil.move(path, folder)
+    os.rmdir(os.path.join(root, "generated"))
+    return os.path.join(folder, os.path.basename(path))
+
+
+def _entry(root):
+    with open(os.path.join(root, MANIFEST_NAME)) as f:
+        entry, = json.load(f)["files"].values()
+    return entry
+
+
+@pytest.fixture(scope="module")
+def recording(tmp_path_factory):
+    return _archive(str(tmp_path_factory.mktemp("source")))
+
+
+def test_plan_chunks(tmp_path):
+    paths = []
+    for name, size in (("a", 300), ("b", 200), ("c", 100), ("d", 1000)):
+        paths.append(str(tmp_path / name))
+        with open(paths[-1], "wb") as f:
+            f.write(b"x" * size)
+    a, b, c, d = paths
+
+    # Small files are packed largest first, a large one is cut into ranges of its own
+    assert plan_chunks(paths, 400) == [
+        [(d, 0, 333)], [(d, 333, 666)], [(d, 666, None)],
+        [(a, 0, None)], [(b, 0, None), (c, 0, None)],
+    ]
+    assert plan_chunks(paths, 1000) == [[(d, 0, None)], [(a, 0, None), (b, 0, None), (c, 0, None)]]
+
+
+def test_ranges_start_on_window_boundaries(recording):
+    with open(recording, "rb") as f:
+        lines = f.read().splitlines(keepends=True)
+    offsets = np.cumsum([0] + [len(line) for line in lines])
+    # Offsets of the rows that start a window (in the recording's +07:00 local time)
+    local = [timestamp_to_us(parse_row(line.decode()).timestamp) + 7 * 3600 * 10 ** 6 for line in lines[1:]]
+    windows = [us // (SEGMENT_SECONDS * 10 ** 6) for us in local]
+    window_starts = {int(offsets[1 + row]) for row in range(1, len(windows)) if windows[row] != windows[row - 1]}
+    assert len(window_starts) > 5
+
+    with open(recording, "rb") as f:
+        assert _window_boundary(f, 0, SEGMENT_SECONDS) == 0
+        for offset in range(1, int(offsets[-1]), 99_991):
+            boundary = _window_boundary(f, offset, SEGMENT_SECONDS)
+            assert boundary in window_starts or boundary == offsets[-1]
+            # The nearest one at or after the offset (but never the row the search starts on)
+            assert not [start for start in window_starts if offset < start < boundary]
+        # Past the last window start: the end of the file
+        assert _window_boundary(f, max(window_starts) + 1, SEGMENT_SECONDS) == offsets[-1]
+
+
+def test_split_recording_matches_the_whole_file(recording, tmp_path):
+    folder, name = os.path.basename(os.path.dirname(recording)), os.path.basename(recording)
+    whole, split = str(tmp_path / "whole"), str(tmp_path / "split")
+    for root in (whole, split):
+        os.makedirs(os.path.join(root, folder))
+        shutil.copy2(recording, os.path.join(root, folder))
+
+    assert reprocess(whole, workers=1)["processed"] == 1
+    summary = reprocess(split, workers=2, chunk_mb=os.path.getsize(recording) / 5 / 2 ** 20)
+    assert summary["processed"] == 1 and summary["failed"] == 0
+
+    expected, entry = _entry(whole), _entry(split)
+    assert entry["windows"] > 1 and any(entry["fired_windows"].values())
+    for key in ("sha256", "size", "rows", "skipped", "windows", "rules", "fired_windows", "outputs"):
+        assert entry[key] == expected[key], key
+
+    # One bundle, the same as from the whole file, and no parts left behind
+    assert sorted(os.listdir(os.path.join(split, folder))) == [name, bundle_path(name)]
+    meta, columns = load_recording(bundle_path(os.path.join(split, folder, name)))
+    expected_meta, expected_columns = load_recording(bundle_path(os.path.join(whole, folder, name)))
+    assert meta == expected_meta
+    for column, values in expected_columns.items():
+        assert np.array_equal(columns[column], values), column
+
+
+def test_touched_split_recording_is_hashed_not_processed(recording, tmp_path):
+    root = str(tmp_path / "archive")
+    folder = os.path.join(root, os.path.basename(os.path.dirname(recording)))
+    os.makedirs(folder)
+    path = shutil.copy2(recording, folder)
+    chunk_mb = os.path.getsize(recording) / 3 / 2 ** 20
+    assert reprocess(root, workers=2, chunk_mb=chunk_mb)["processed"] == 1
+    processed = _entry(root)["processed"]
+
+    assert reprocess(root, workers=2, chunk_mb=chunk_mb)["skipped"] == 1
+    os.utime(path, (0, 12345))
+    summary = reprocess(root, workers=2, chunk_mb=chunk_mb)
+    assert (summary["unchanged"], summary["processed"]) == (1, 0)
+    entry = _entry(root)
+    assert entry["mtime"] == 12345 and entry["processed"] == processed
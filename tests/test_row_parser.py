@@ -0,0 +1,20 @@
+import pytest
+
+from row_parser import parse_row
+from row_stream import iter_rows
+
+GOOD = '"2025-02-11 14:59:00.455000+07:00","d1","90","80","97","[0, 0]","[1, 2]","[1, 2]","[1, 2]","[1.0, 2.0]"'
+TRUNCATED = GOOD.replace("14:59:00.455000+07:00", "14:5")
+
+
+def test_truncated_timestamp_is_malformed():
+    assert parse_row(GOOD).timestamp == "2025-02-11 14:59:00.455000+07:00"
+    with pytest.raises(ValueError, match="timestamp"):
+        parse_row(TRUNCATED)
+
+
+def test_rows_with_bad_timestamps_are_skipped_and_reported():
+    errors = []
+    rows = list(iter_rows([GOOD, TRUNCATED, GOOD], on_error=lambda num, line, e: errors.append(num)))
+    assert len(rows) == 2
+    assert errors == [2]